@@ -39,9 +39,12 @@ if [ ! -d "$OPENSSL_DIR" ]; then
   git checkout $OPENSSL_COMMIT_HASH
   
   # Build and install
+  # NOTE: zlib-dynamic enables TLS certificate compression (RFC 8879) with zlib loaded at runtime, so neither
+  # nginx nor the client has to link zlib against the static libcrypto
   ./Configure \
     --prefix=$FINAL_BUILD_DIR \
     no-ssl no-tls1 no-tls1_1 no-afalgeng \
+    zlib-dynamic \
     no-shared threads -lm
   make -j $(nproc)
   make -j $(nproc) install_sw install_ssldirs
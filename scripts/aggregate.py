@@ -0,0 +1,157 @@
+### --- Imports --- ###
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from results_store import DATA_DIR, META_FILE, iter_cell_paths, read_column, read_meta, tag_string
+
+### --- Config --- ###
+
+# Summary index persisted alongside the data, keyed on cell path and the mtime of the cell's meta.json
+# (cells are rewritten atomically, so a new mtime means new data)
+INDEX_FILE = 'summary_index.json'
+
+# Quantiles computed for each cell
+QUANTILES = {'median': 0.5, 'p90': 0.9}
+
+# Cells are padded into a (cells x samples) matrix for the vectorised quantiles, this many at a time
+CHUNK_CELLS = 512
+
+# Cell key fields, counts and quantile confidence intervals copied from meta.json into the summary (failure_rate /
+# mean_server_bytes / server_cpu_us_per_handshake / the intervals are None for cells written before those were
+# recorded)
+KEY_FIELDS = ('mode', 'value', 'latency', 'sig_alg', 'pkt_loss', 'tags', 'samples', 'failure_rate',
+              'mean_server_bytes', 'server_cpu_us_per_handshake', 'median_ci', 'p90_ci')
+
+def index_path(root=DATA_DIR):
+    return os.path.join(root, INDEX_FILE)
+
+def load_index(root=DATA_DIR):
+    """
+    Read the persisted summary index, or an empty one if it's missing or unreadable.
+    """
+
+    try:
+        with open(index_path(root), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_index(index, root=DATA_DIR):
+    tmp_path = index_path(root) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path(root))
+
+def compute_quantiles(timings_list):
+    """
+    Quantiles of many cells at once: cells are padded with NaN into one matrix and reduced along each row.
+    Returns {name: array with one value per cell}.
+    """
+
+    quantiles = {name: np.full(len(timings_list), np.nan) for name in QUANTILES}
+
+    for start in range(0, len(timings_list), CHUNK_CELLS):
+        chunk = timings_list[start:start + CHUNK_CELLS]
+        width = max((len(timings) for timings in chunk), default=0)
+        if width == 0:
+            continue
+
+        matrix = np.full((len(chunk), width), np.nan)
+        for row, timings in enumerate(chunk):
+            matrix[row, :len(timings)] = timings
+
+        # Rows that are entirely NaN (empty cells) stay NaN
+        nonempty = ~np.isnan(matrix).all(axis=1)
+        values = np.nanquantile(matrix[nonempty], list(QUANTILES.values()), axis=1)
+        for q_idx, name in enumerate(QUANTILES):
+            quantiles[name][start:start + len(chunk)][nonempty] = values[q_idx]
+
+    return quantiles
+
+def update_index(root=DATA_DIR, verbose=False):
+    """
+    Scan the data tree once and bring the summary index up to date, recomputing only the cells whose
+    meta.json mtime has changed (or which are new). Cells that no longer exist are dropped.
+    Returns the index as {cell path: summary}.
+    """
+
+    old_index = load_index(root)
+    index = {}
+    stale = []
+
+    for path in iter_cell_paths(root=root):
+        mtime = os.stat(os.path.join(path, META_FILE)).st_mtime_ns
+        entry = old_index.get(path)
+        if entry and entry['mtime'] == mtime and all(field in entry for field in KEY_FIELDS):
+            index[path] = entry
+        else:
+            stale.append((path, mtime))
+
+    if stale:
+        metas = [read_meta(path) for path, _ in stale]
+        timings_list = []
+        for meta in metas:
+            timings = read_column(meta, 'handshake_ms')
+            timings_list.append(np.asarray(timings) if timings is not None else np.empty(0))
+
+        quantiles = compute_quantiles(timings_list)
+        for cell_idx, ((path, mtime), meta) in enumerate(zip(stale, metas)):
+            entry = {field: meta.get(field) for field in KEY_FIELDS}
+            entry['tags'] = tag_string(meta.get('tags'))
+            entry['mtime'] = mtime
+            for name in QUANTILES:
+                value = quantiles[name][cell_idx]
+                entry[name] = None if np.isnan(value) else float(value)
+            index[path] = entry
+
+    if stale or len(index) != len(old_index):
+        save_index(index, root)
+    if verbose:
+        print(f"Summary index: {len(index)} cells, {len(stale)} recomputed")
+    return index
+
+def load_summary(mode=None, tags='', root=DATA_DIR, predicted=False):
+    """
+    Per-cell summary (cell key, samples, failure rate, mean bytes sent by the server, server CPU per handshake,
+    median and 90th percentile handshake time) as a pandas DataFrame, optionally only for one experiment mode.
+    Only cells with the given tag string are included: untagged cells by default, or every cell with tags=None.
+    With predicted, the cells the last active sampling run predicted rather than measured (see surrogate.py)
+    are included too, flagged by the 'predicted' column and with <quantile>_lo / _hi interval columns.
+    The 'value' column is converted to int.
+    """
+
+    import pandas as pd
+
+    index = update_index(root)
+    rows = [entry for entry in index.values()
+            if (mode is None or entry['mode'] == mode) and (tags is None or entry['tags'] == tags)]
+    columns = list(KEY_FIELDS) + list(QUANTILES)
+    if predicted:
+        from surrogate import load_predictions
+
+        rows = [{**entry, 'predicted': False} for entry in rows]
+        modes = [mode] if mode is not None else sorted({entry['mode'] for entry in index.values()})
+        for predicted_mode in modes:
+            rows.extend({**entry, 'predicted': True} for entry in load_predictions(predicted_mode, root)
+                        if tags is None or entry['tags'] == tags)
+        columns += ['predicted'] + [f'{name}_{end}' for name in QUANTILES for end in ('lo', 'hi')]
+    summary = pd.DataFrame(rows, columns=columns)
+    summary['value'] = summary['value'].astype(float).astype(int)
+    return summary.sort_values(by=['mode', 'sig_alg', 'latency', 'value', 'pkt_loss'], ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the cached per-cell summary index up to date")
+    parser.add_argument('--root', default=DATA_DIR, help="Data directory (default: %(default)s)")
+    parser.add_argument('--rebuild', action='store_true', help="Discard the cached index and recompute every cell")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(index_path(args.root)):
+        os.remove(index_path(args.root))
+    update_index(args.root, verbose=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+### --- Imports --- ###
+
+import argparse
+import json
+import subprocess
+
+import numpy as np
+
+from planner import SIG_ALGS
+from results_store import write_columns
+from time_handshakes import run_subprocess
+
+### --- Config --- ###
+
+# Crypto-only cells are stored as mode 'crypto' (value: timed iterations per operation), with no latency or loss
+CRYPTO_MODE = 'crypto'
+CRYPTO_LATENCY = '0ms'
+
+# Iterations of each operation timed, after the untimed warm-up ones
+CRYPTO_ITERATIONS = 1000
+CRYPTO_WARMUP = 50
+
+def bench_alg(sig_alg, iterations=CRYPTO_ITERATIONS, warmup=CRYPTO_WARMUP, cpu=None):
+    """
+    Run the C executable 'crypto_bench' for one signature algorithm. Returns one dict per operation (keygen,
+    sign, verify and, if the algorithm's certificates have been generated, chain_verify) with its ops/sec,
+    latency percentiles and the latency of every iteration.
+    """
+
+    command = ['./src/build/crypto_bench', '-n', str(iterations), '-w', str(warmup), sig_alg]
+    if cpu is not None:
+        command[-1:-1] = ['-c', str(cpu)]
+    print(" > " + " ".join(command))
+    result = run_subprocess(command)
+    return [json.loads(line) for line in result.splitlines() if line.strip()]
+
+def store_ops(sig_alg, ops, iterations, cpu=None):
+    """
+    Write an algorithm's operations to the results store as one cell: a '<op>_ms' column per operation, with
+    their ops/sec and percentiles in the cell's metadata. Pinned runs are tagged with their CPU.
+    """
+
+    columns = {f"{op['op']}_ms": np.asarray(op['latencies_ms'], dtype=np.float64) for op in ops}
+    meta = {
+        'warmup': ops[0]['warmup'],
+        'ops': {op['op']: {field: op[field] for field in ('ops_per_sec', 'median_ms', 'p90_ms', 'p99_ms')}
+                for op in ops},
+    }
+    tags = {'cpu': cpu} if cpu is not None else None
+    return write_columns(CRYPTO_MODE, iterations, CRYPTO_LATENCY, sig_alg, 0, columns, meta, tags=tags)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time keygen / sign / verify / chain verification per algorithm")
+    parser.add_argument('--algs', type=lambda algs: algs.split(','), default=SIG_ALGS,
+                        help="Comma-separated signature algorithms (default: every algorithm in planner.py)")
+    parser.add_argument('--iterations', type=int, default=CRYPTO_ITERATIONS,
+                        help="Timed iterations of each operation (default: %(default)s)")
+    parser.add_argument('--warmup', type=int, default=CRYPTO_WARMUP,
+                        help="Untimed warm-up iterations before each operation (default: %(default)s)")
+    parser.add_argument('--cpu', type=int, default=None,
+                        help="Pin the benchmark to this CPU, and tag the cells with it (default: unpinned)")
+    args = parser.parse_args()
+
+    print(f"{'sig_alg':<24} {'op':<13} {'ops/sec':>10} {'median (ms)':>12} {'p99 (ms)':>10}")
+    for sig_alg in args.algs:
+        try:
+            ops = bench_alg(sig_alg, args.iterations, args.warmup, args.cpu)
+        except subprocess.CalledProcessError:
+            print(f"{sig_alg}: benchmark failed, skipping")
+            continue
+
+        store_ops(sig_alg, ops, args.iterations, args.cpu)
+        for op in ops:
+            print(f"{sig_alg:<24} {op['op']:<13} {op['ops_per_sec']:>10.1f} {op['median_ms']:>12.4f} "
+                  f"{op['p99_ms']:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,22 @@ set -ex
 
 rm -rf src/build
 
-### --- Remove namespaces --- ###
+### --- Stop nginx lanes --- ###
 
-ip netns del client_namespace
-ip netns del server_namespace
+NGINX_APP="$(pwd)/provider_build/nginx/sbin/nginx"
+NGINX_CONF_DIR="$(pwd)/provider_build/nginx/conf"
+
+for CONF in "${NGINX_CONF_DIR}"/nginx_lane*.conf; do
+    [ -e "${CONF}" ] || continue
+    LANE=$(basename "${CONF}" .conf)
+    LANE=${LANE#nginx_lane}
+    if [ "${LANE}" -eq 0 ]; then SUFFIX=""; else SUFFIX="_${LANE}"; fi
+    ip netns exec "server_namespace${SUFFIX}" "${NGINX_APP}" -c "${CONF}" -s stop || true
+    rm "${CONF}"
+done
+
+### --- Remove namespaces (every lane created by setup_namespaces.sh) --- ###
+
+for NS in $(ip netns list | awk '/^(client|server)_namespace/ {print $1}'); do
+    ip netns del "${NS}"
+done
@@ -0,0 +1,108 @@
+### --- Imports --- ###
+
+import argparse
+import json
+import os
+import re
+
+from results_store import DATA_DIR, META_FILE, cell_dir, write_cell
+
+# Converts results written in the old format (data/<mode>=X/latency=Y/<sig_alg>.csv, one row per packet loss
+# holding every timing, plus the optional <sig_alg>.jsonl per-handshake records) into the columnar results store.
+
+def extract_number(text, prefix):
+    match = re.search(rf'{prefix}([\d.]+)', text)
+    return match.group(1) if match else None
+
+def read_csv_rows(filename):
+    """
+    Parse a wide results CSV into {pkt_loss: [timings]}. Malformed rows are skipped.
+    """
+
+    rows = {}
+    with open(filename, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            parts = line.strip().split(',')
+            try:
+                pkt_loss = float(parts[0])
+                rows.setdefault(pkt_loss, []).extend(float(x) for x in parts[1:] if x.strip())
+            except ValueError:
+                continue
+    return rows
+
+def read_record_rows(filename):
+    """
+    Parse a per-handshake records file into {pkt_loss: [records]}.
+    """
+
+    rows = {}
+    if not os.path.exists(filename):
+        return rows
+
+    with open(filename, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            pkt_loss = float(record.pop('pkt_loss'))
+            rows.setdefault(pkt_loss, []).append(record)
+    return rows
+
+def convert(root, force=False, remove=False):
+    converted = 0
+
+    for value_dir in sorted(os.listdir(root)):
+        mode = value_dir.split('=', 1)[0]
+        value = extract_number(value_dir, f'{mode}=')
+        value_path = os.path.join(root, value_dir)
+        if mode not in ('initcwnd', 'mtu') or not value or not os.path.isdir(value_path):
+            continue
+        value = int(float(value))
+
+        for latency_dir in sorted(os.listdir(value_path)):
+            latency_path = os.path.join(value_path, latency_dir)
+            if not latency_dir.startswith('latency=') or not os.path.isdir(latency_path):
+                continue
+            latency_ms = latency_dir.split('=', 1)[1]
+
+            for filename in sorted(os.listdir(latency_path)):
+                if not filename.endswith('.csv'):
+                    continue
+                # NOTE: assumes filename format: <sig_alg>.csv
+                sig_alg, _ = filename.rsplit('.', 1)
+                csv_path = os.path.join(latency_path, filename)
+                record_rows = read_record_rows(os.path.join(latency_path, f"{sig_alg}.jsonl"))
+
+                for pkt_loss, timings in read_csv_rows(csv_path).items():
+                    existing = os.path.join(cell_dir(mode, value, latency_ms, sig_alg, pkt_loss, root), META_FILE)
+                    if os.path.exists(existing) and not force:
+                        continue
+
+                    records = record_rows.get(pkt_loss)
+                    if not records or len(records) != len(timings):
+                        records = [{'handshake_ms': handshake_ms} for handshake_ms in timings]
+                    write_cell(mode, value, latency_ms, sig_alg, pkt_loss, records,
+                               meta={'converted_from': csv_path}, root=root)
+                    converted += 1
+
+                if remove:
+                    os.remove(csv_path)
+                    if os.path.exists(os.path.join(latency_path, f"{sig_alg}.jsonl")):
+                        os.remove(os.path.join(latency_path, f"{sig_alg}.jsonl"))
+
+    print(f"Converted {converted} cells into the results store under {root}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert wide CSV results into the columnar results store")
+    parser.add_argument('--root', default=DATA_DIR, help="Data directory (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="Overwrite cells that already exist in the store")
+    parser.add_argument('--remove', action='store_true', help="Delete the CSV / JSONL files once converted")
+    args = parser.parse_args()
+
+    convert(args.root, force=args.force, remove=args.remove)
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,212 @@
 #!/bin/bash
-set -ex
+set -e
 
 ROOT_DIR=$(pwd)
 FINAL_BUILD_DIR="${ROOT_DIR}/provider_build"
 NGINX_CONF_DIR="${FINAL_BUILD_DIR}/nginx/conf"
+CERTS_DIR="${NGINX_CONF_DIR}/certs"
 OPENSSL="${FINAL_BUILD_DIR}/bin/openssl"
 
 # Set environment vars for OQS provider
 export OPENSSL_CONF="${FINAL_BUILD_DIR}/ssl/openssl.cnf"
 export OPENSSL_MODULES="${FINAL_BUILD_DIR}/lib"
 
-# Create certificate directory
-mkdir -p "${NGINX_CONF_DIR}/certs"
-
-# Generate certificates for each algorithm
-for SIG in "mldsa44" "mldsa65" "mldsa87" "sphincssha2128fsimple" "falcon512" "falcon1024" "mayo1" "mayo3" "mayo5" "CROSSrsdp128balanced"; do
-    # Generate Root CA (self-signed)
-    "${OPENSSL}" req -x509 -new \
-        -newkey "${SIG}" \
-        -keyout "${NGINX_CONF_DIR}/certs/${SIG}_RootCA.key" \
-        -out "${NGINX_CONF_DIR}/certs/${SIG}_RootCA.crt" \
-        -nodes \
-        -subj "/CN=OQS Root CA ${SIG}" \
-        -days 730
-
-    # Generate intermediate CA CSR
-    "${OPENSSL}" req -new \
-        -newkey "${SIG}" \
-        -keyout "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.key" \
-        -out "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.csr" \
-        -nodes \
-        -subj "/CN=OQS Intermediate CA ${SIG}"
-
-    # Sign intermediate CA with Root CA
-    "${OPENSSL}" x509 -req \
-        -in "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.csr" \
-        -out "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.crt" \
-        -CA "${NGINX_CONF_DIR}/certs/${SIG}_RootCA.crt" \
-        -CAkey "${NGINX_CONF_DIR}/certs/${SIG}_RootCA.key" \
-        -CAcreateserial \
-        -days 730 \
-        -extfile <(printf "basicConstraints=CA:TRUE\nkeyUsage=keyCertSign,cRLSign")
-
-    # Generate server csr
-    "${OPENSSL}" req -new \
-        -newkey "${SIG}" \
-        -keyout "${NGINX_CONF_DIR}/certs/${SIG}_server.key" \
-        -out "${NGINX_CONF_DIR}/certs/${SIG}_server.csr" \
-        -nodes \
-        -subj "/CN=OQS Server ${SIG}"
-
-    # Sign server cert with intermediaet CA
-    "${OPENSSL}" x509 -req \
-        -in "${NGINX_CONF_DIR}/certs/${SIG}_server.csr" \
-        -out "${NGINX_CONF_DIR}/certs/${SIG}_server.crt" \
-        -CA "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.crt" \
-        -CAkey "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.key" \
-        -CAcreateserial \
-        -days 365 \
-        -extfile <(printf "extendedKeyUsage=serverAuth")
-
-    # Create a certificate chain file (server cert + intermediat cert + root cert)
-    cat \
-        "${NGINX_CONF_DIR}/certs/${SIG}_server.crt" \
-        "${NGINX_CONF_DIR}/certs/${SIG}_IntermediateCA.crt" \
-        "${NGINX_CONF_DIR}/certs/${SIG}_RootCA.crt" \
-        > "${NGINX_CONF_DIR}/certs/${SIG}_fullchain.crt"
+# Keys and certificates are cached by a hash of everything they are generated from (algorithm, role, issuer,
+# validity), so reruns reuse identical key material and only generate what is missing or no longer valid.
+# Bump CACHE_VERSION to regenerate everything
+CACHE_DIR="${CERTS_DIR}/cache"
+CACHE_VERSION=1
 
+# Parallel openssl jobs (default: one per core)
+JOBS="${JOBS:-$(nproc)}"
+
+# Validity in days of CA and server certificates, and how close to expiry a cached one is regenerated
+CA_DAYS=730
+SERVER_DAYS=365
+RENEW_DAYS=30
+
+SIG_ALGS=("mldsa44" "mldsa65" "mldsa87" "sphincssha2128fsimple" "falcon512" "falcon1024" "mayo1" "mayo3" "mayo5" "CROSSrsdp128balanced")
+
+### --- Chains --- ###
+
+# Chain shapes generated for every algorithm, as <chain name suffix>:<levels>. 3 levels is root ->
+# intermediate -> server (the default chains, named after the algorithm alone), 2 is root -> server and
+# 1 a self-signed server certificate
+CHAIN_SHAPES=(":3" "_2level:2" "_leaf:1")
+
+# Mixed-algorithm chains, as <chain name> <algorithm of each level, root first>
+MIXED_CHAINS=(
+    "mldsa44_falcon512 mldsa44 mldsa44 falcon512"
+    "mldsa65_mayo1 mldsa65 mldsa65 mayo1"
+)
+
+# The full declarative list: <chain name> <algorithm of each level, root first>
+CHAINS=()
+for SIG in "${SIG_ALGS[@]}"; do
+    for SHAPE in "${CHAIN_SHAPES[@]}"; do
+        LEVELS=${SHAPE#*:}
+        CHAIN="${SIG}${SHAPE%%:*}"
+        for ((LEVEL = 0; LEVEL < LEVELS; LEVEL++)); do
+            CHAIN+=" ${SIG}"
+        done
+        CHAINS+=("${CHAIN}")
+    done
+done
+CHAINS+=("${MIXED_CHAINS[@]}")
+
+### --- Generation (run in parallel by xargs) --- ###
+
+# Print the cache id of the given parameters
+content_id() {
+    printf '%s\n' "${CACHE_VERSION}" "$@" | sha256sum | cut -c1-32
+}
+
+# Generate a private key into the cache, unless a readable one is already there
+gen_key() {
+    local ID=$1 ALG=$2
+    local KEY="${CACHE_DIR}/keys/${ID}.key"
+    if [ -s "${KEY}" ] && "${OPENSSL}" pkey -in "${KEY}" -noout 2>/dev/null; then
+        return
+    fi
+
+    echo "Generating ${ALG} key ${ID}"
+    "${OPENSSL}" genpkey -algorithm "${ALG}" -out "${KEY}.tmp"
+    mv "${KEY}.tmp" "${KEY}"
+}
+
+# Whether a cached certificate is still valid: not close to expiry, matching its key and signed by its issuer
+valid_cert() {
+    local CRT=$1 KEY=$2 ISSUER_CRT=$3
+    [ -s "${CRT}" ] || return 1
+    "${OPENSSL}" x509 -in "${CRT}" -noout -checkend $((RENEW_DAYS * 86400)) >/dev/null || return 1
+    [ "$("${OPENSSL}" x509 -in "${CRT}" -noout -pubkey)" = "$("${OPENSSL}" pkey -in "${KEY}" -pubout)" ] || return 1
+    "${OPENSSL}" verify -partial_chain -CAfile "${ISSUER_CRT}" "${CRT}" >/dev/null 2>&1
+}
+
+# Generate a certificate into the cache, unless a valid one is already there.
+# ISSUER is the issuing certificate's id (signed with ISSUER_KEY's key), or 'self' for a self-signed one
+gen_cert() {
+    local ID=$1 KEY_ID=$2 ROLE=$3 ALG=$4 ISSUER=$5 ISSUER_KEY=$6
+    local CRT="${CACHE_DIR}/certs/${ID}.crt"
+    local KEY="${CACHE_DIR}/keys/${KEY_ID}.key"
+    local ISSUER_CRT="${CACHE_DIR}/certs/${ISSUER}.crt"
+    [ "${ISSUER}" = "self" ] && ISSUER_CRT="${CRT}"
+    if valid_cert "${CRT}" "${KEY}" "${ISSUER_CRT}"; then
+        return
+    fi
+
+    local SUBJECT DAYS EXT
+    case "${ROLE}" in
+    root)
+        SUBJECT="/CN=OQS Root CA ${ALG}"; DAYS=${CA_DAYS}; EXT="keyUsage=keyCertSign,cRLSign" ;;
+    intermediate)
+        SUBJECT="/CN=OQS Intermediate CA ${ALG}"; DAYS=${CA_DAYS}; EXT="basicConstraints=CA:TRUE\nkeyUsage=keyCertSign,cRLSign" ;;
+    server)
+        SUBJECT="/CN=OQS Server ${ALG}"; DAYS=${SERVER_DAYS}; EXT="extendedKeyUsage=serverAuth" ;;
+    esac
+
+    echo "Generating ${ALG} ${ROLE} certificate ${ID}"
+    if [ "${ISSUER}" = "self" ]; then
+        # req -x509 marks self-signed certificates as CAs itself
+        "${OPENSSL}" req -x509 -new -key "${KEY}" -out "${CRT}.tmp" -subj "${SUBJECT}" -days "${DAYS}" \
+            -set_serial "0x${ID}" -addext "${EXT}"
+    else
+        # NOTE: serials are derived from the cache id rather than a serial file, so parallel signing can't clash
+        "${OPENSSL}" req -new -key "${KEY}" -subj "${SUBJECT}" |
+            "${OPENSSL}" x509 -req \
+                -out "${CRT}.tmp" \
+                -CA "${ISSUER_CRT}" \
+                -CAkey "${CACHE_DIR}/keys/${ISSUER_KEY}.key" \
+                -set_serial "0x${ID}" \
+                -days "${DAYS}" \
+                -extfile <(printf "${EXT}")
+    fi
+    mv "${CRT}.tmp" "${CRT}"
+}
+
+export OPENSSL CACHE_DIR CACHE_VERSION RENEW_DAYS CA_DAYS SERVER_DAYS
+export -f gen_key gen_cert valid_cert
+
+### --- Plan --- ###
+
+mkdir -p "${CACHE_DIR}/keys" "${CACHE_DIR}/certs"
+TASKS=$(mktemp -d)
+trap 'rm -rf "${TASKS}"' EXIT
+
+# Work out every chain's key and certificate ids. Each level's certificates only depend on the level above,
+# so are generated together once it is done; identical keys / certificates shared by chains are made once
+declare -A CHAIN_KEYS CHAIN_CERTS
+MAX_LEVELS=0
+for CHAIN in "${CHAINS[@]}"; do
+    read -r NAME ALGS <<< "${CHAIN}"
+    read -r -a ALGS <<< "${ALGS}"
+    LEVELS=${#ALGS[@]}
+    (( LEVELS > MAX_LEVELS )) && MAX_LEVELS=${LEVELS}
+
+    ISSUER="self"
+    ISSUER_KEY="-"
+    for ((LEVEL = 0; LEVEL < LEVELS; LEVEL++)); do
+        ALG=${ALGS[LEVEL]}
+        if (( LEVEL == LEVELS - 1 )); then ROLE=server; elif (( LEVEL == 0 )); then ROLE=root; else ROLE=intermediate; fi
+        DAYS=${CA_DAYS}
+        [ "${ROLE}" = "server" ] && DAYS=${SERVER_DAYS}
+
+        KEY_ID=$(content_id key "${ALG}" "${ROLE}")
+        CERT_ID=$(content_id cert "${KEY_ID}" "${ROLE}" "${ALG}" "${ISSUER}" "${DAYS}")
+        echo "${KEY_ID} ${ALG}" >> "${TASKS}/keys"
+        echo "${CERT_ID} ${KEY_ID} ${ROLE} ${ALG} ${ISSUER} ${ISSUER_KEY}" >> "${TASKS}/certs_${LEVEL}"
+
+        CHAIN_KEYS[${NAME}]+="${KEY_ID} "
+        CHAIN_CERTS[${NAME}]+="${CERT_ID} "
+        ISSUER=${CERT_ID}
+        ISSUER_KEY=${KEY_ID}
+    done
+done
+
+### --- Generate --- ###
+
+sort -u "${TASKS}/keys" | xargs -P "${JOBS}" -L 1 bash -c 'set -eo pipefail; gen_key "$@"' _
+for ((LEVEL = 0; LEVEL < MAX_LEVELS; LEVEL++)); do
+    sort -u "${TASKS}/certs_${LEVEL}" | xargs -P "${JOBS}" -L 1 bash -c 'set -eo pipefail; gen_cert "$@"' _
+done
+
+### --- Install chains --- ###
+
+# Each chain is installed under its name as the files nginx and the client use: <name>_server.crt / .key,
+# <name>_fullchain.crt (server cert + any intermediate + root) and the <name>_RootCA.crt trust anchor
+# (the certificate itself for a self-signed chain), plus the CA certs / keys of longer chains
+for CHAIN in "${CHAINS[@]}"; do
+    read -r NAME _ <<< "${CHAIN}"
+    read -r -a KEYS <<< "${CHAIN_KEYS[${NAME}]}"
+    read -r -a CERTS <<< "${CHAIN_CERTS[${NAME}]}"
+    LEVELS=${#CERTS[@]}
+    LEAF=$((LEVELS - 1))
+
+    cp "${CACHE_DIR}/certs/${CERTS[0]}.crt" "${CERTS_DIR}/${NAME}_RootCA.crt"
+    if (( LEVELS > 1 )); then
+        cp "${CACHE_DIR}/keys/${KEYS[0]}.key" "${CERTS_DIR}/${NAME}_RootCA.key"
+    fi
+    if (( LEVELS > 2 )); then
+        cp "${CACHE_DIR}/certs/${CERTS[1]}.crt" "${CERTS_DIR}/${NAME}_IntermediateCA.crt"
+        cp "${CACHE_DIR}/keys/${KEYS[1]}.key" "${CERTS_DIR}/${NAME}_IntermediateCA.key"
+    fi
+    cp "${CACHE_DIR}/certs/${CERTS[LEAF]}.crt" "${CERTS_DIR}/${NAME}_server.crt"
+    cp "${CACHE_DIR}/keys/${KEYS[LEAF]}.key" "${CERTS_DIR}/${NAME}_server.key"
+
+    # Create a certificate chain file (server cert + intermediate cert + root cert)
+    for ((LEVEL = LEAF; LEVEL >= 0; LEVEL--)); do
+        cat "${CACHE_DIR}/certs/${CERTS[LEVEL]}.crt"
+    done > "${CERTS_DIR}/${NAME}_fullchain.crt"
+
+    # The same chain served without its root, which the client already holds as its trust anchor, installed as
+    # <name>_noroot so the sweep can serve both (a self-signed chain has nothing to drop)
+    if (( LEVELS > 1 )); then
+        cp "${CERTS_DIR}/${NAME}_RootCA.crt" "${CERTS_DIR}/${NAME}_noroot_RootCA.crt"
+        cp "${CERTS_DIR}/${NAME}_server.key" "${CERTS_DIR}/${NAME}_noroot_server.key"
+        for ((LEVEL = LEAF; LEVEL >= 1; LEVEL--)); do
+            cat "${CACHE_DIR}/certs/${CERTS[LEVEL]}.crt"
+        done > "${CERTS_DIR}/${NAME}_noroot_fullchain.crt"
+    fi
 done
+
+echo "${#CHAINS[@]} certificate chains installed in ${CERTS_DIR}"
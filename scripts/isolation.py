@@ -0,0 +1,61 @@
+### --- Imports --- ###
+
+import os
+
+### --- Config --- ###
+
+# CPUs left to the Python harness (and whatever else runs on the host) in isolation mode
+HOUSEKEEPING_CPUS = 1
+
+# CPUs each lane's nginx is pinned to in isolation mode (its worker_processes, outside load mode)
+SERVER_CPUS = 2
+
+# CPUs each relay lane's relay is pinned to in isolation mode (it runs on a single event loop)
+RELAY_CPUS = 1
+
+### --- CPU isolation --- ###
+
+def isolate_lanes(lanes, timers, server_cpus=SERVER_CPUS):
+    """
+    Split the CPUs this process may run on into disjoint sets: the first HOUSEKEEPING_CPUS for the harness itself,
+    then for each lane one CPU per timer, server_cpus for its nginx and (relay lanes) RELAY_CPUS for its relay.
+    Sets each lane's client_cpus / server_cpus / relay_cpus and pins this process to the housekeeping CPUs.
+    Returns the housekeeping CPUs.
+    NOTE: netem runs in softirq context on whichever CPU handles the packet, so it isn't confined. Disabling SMT
+    (or keeping sibling threads out of the affinity mask) stops the sets sharing physical cores
+    """
+
+    cpus = sorted(os.sched_getaffinity(0))
+    needed = HOUSEKEEPING_CPUS + sum(timers + server_cpus + (RELAY_CPUS if lane.relay else 0) for lane in lanes)
+    if len(cpus) < needed:
+        relays = f" (and {RELAY_CPUS} per relay)" if any(lane.relay for lane in lanes) else ""
+        raise ValueError(f"Isolating {len(lanes)} lane(s) with {timers} timers and {server_cpus} server CPUs{relays} "
+                         f"needs {needed} CPUs, but only {len(cpus)} are available")
+
+    housekeeping, cpus = cpus[:HOUSEKEEPING_CPUS], cpus[HOUSEKEEPING_CPUS:]
+    for lane in lanes:
+        lane.client_cpus, cpus = cpus[:timers], cpus[timers:]
+        lane.server_cpus, cpus = cpus[:server_cpus], cpus[server_cpus:]
+        if lane.relay:
+            lane.relay_cpus, cpus = cpus[:RELAY_CPUS], cpus[RELAY_CPUS:]
+    os.sched_setaffinity(0, housekeeping)
+    return housekeeping
+
+def release_lanes(lanes, cpus):
+    """
+    Undo isolate_lanes: unpin the lanes and let this process run on the given CPUs again.
+    """
+
+    for lane in lanes:
+        lane.client_cpus = lane.server_cpus = lane.relay_cpus = None
+    os.sched_setaffinity(0, cpus)
+
+def cpu_assignment(lane, timers):
+    """
+    The CPU assignment a lane's cells were measured with, stored with each cell's statistics.
+    """
+
+    assignment = {'timers': timers, 'client_cpus': lane.client_cpus, 'server_cpus': lane.server_cpus}
+    if lane.relay:
+        assignment['relay_cpus'] = lane.relay_cpus
+    return assignment
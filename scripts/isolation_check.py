@@ -0,0 +1,113 @@
+### --- Imports --- ###
+
+import argparse
+import json
+import math
+import os
+import statistics
+
+from isolation import SERVER_CPUS, isolate_lanes, release_lanes
+from lanes import make_lanes
+from run_sweep import check_lanes, nginx_master, start_nginx, stop_nginx
+from time_handshakes import (
+    ADAPTIVE_CI_WIDTH, LATENCIES, TIMERS,
+    measure_loss, quantile, set_netem, summarise, timings
+)
+
+### --- Config --- ###
+
+CHECK_PATH = "data/isolation_check.json"
+
+# Pinned and unpinned batches are alternated, so drift over the run affects both alike
+CHECK_ROUNDS = 4
+CHECK_MEASUREMENTS = 50
+
+def spread(handshake_times, ci_width):
+    """
+    How noisy a set of handshake times is: standard deviation, IQR, coefficient of variation and the relative
+    width of the median's confidence interval, plus the samples that width suggests are needed to reach ci_width
+    (interval widths shrink with the square root of the sample count).
+    """
+
+    sorted_vals = sorted(handshake_times)
+    summary = summarise(sorted_vals)
+    median_lo, median_hi = summary['median_ci']
+    relative_ci = (median_hi - median_lo) / summary['median']
+    stdev = statistics.stdev(sorted_vals)
+    return {
+        'samples': len(sorted_vals),
+        'median': summary['median'],
+        'stdev': stdev,
+        'iqr': quantile(sorted_vals, 0.75) - quantile(sorted_vals, 0.25),
+        'cv': stdev / statistics.mean(sorted_vals),
+        'median_ci_relative_width': relative_ci,
+        'samples_for_target_ci': math.ceil(len(sorted_vals) * (relative_ci / ci_width) ** 2),
+    }
+
+def run_check(lane, args):
+    """
+    Alternate batches with the lane unpinned and isolated, restarting nginx for each so it picks up the CPU
+    sets. Returns the handshake times of each.
+    """
+
+    all_cpus = os.sched_getaffinity(0)
+    handshake_times = {'unpinned': [], 'pinned': []}
+    set_netem(lane, args.loss, args.latency)
+    try:
+        for round_index in range(args.rounds):
+            for setting in handshake_times:
+                if setting == 'pinned':
+                    isolate_lanes([lane], args.timers, args.server_cpus)
+                else:
+                    release_lanes([lane], all_cpus)
+                worker_processes = len(lane.server_cpus) if lane.server_cpus else args.server_cpus
+
+                if nginx_master(lane) is not None:
+                    stop_nginx(lane)
+                start_nginx(lane, worker_processes)
+                print(f"Round {round_index + 1}/{args.rounds}: {setting}")
+                records = list(measure_loss(args.sig_alg, None, args.loss, args.latency, args.measurements,
+                                            lane=lane, netem=False, timers=args.timers))
+                handshake_times[setting].extend(timings(records))
+    finally:
+        release_lanes([lane], all_cpus)
+        if nginx_master(lane) is not None:
+            stop_nginx(lane)
+    return handshake_times
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare handshake time variance with and without CPU isolation")
+    parser.add_argument('--sig-alg', default='mldsa44', help="Algorithm to time (default: %(default)s)")
+    parser.add_argument('--latency', default=LATENCIES[0], help="Latency applied to both veths (default: %(default)s)")
+    parser.add_argument('--loss', type=float, default=0, help="Packet loss %% (default: %(default)s)")
+    parser.add_argument('--rounds', type=int, default=CHECK_ROUNDS,
+                        help="Pinned / unpinned batch pairs (default: %(default)s)")
+    parser.add_argument('--measurements', type=int, default=CHECK_MEASUREMENTS,
+                        help="Handshakes per timer per batch (default: %(default)s)")
+    parser.add_argument('--timers', type=int, default=TIMERS, help="Concurrent timers (default: %(default)s)")
+    parser.add_argument('--server-cpus', type=int, default=SERVER_CPUS,
+                        help="CPUs pinned to nginx, and its worker_processes in both settings (default: %(default)s)")
+    parser.add_argument('--ci-width', type=float, default=ADAPTIVE_CI_WIDTH,
+                        help="Target relative median CI width the sample counts are estimated for (default: %(default)s)")
+    args = parser.parse_args()
+
+    lane = make_lanes(1)[0]
+    check_lanes([lane])
+    handshake_times = run_check(lane, args)
+
+    results = {setting: spread(times, args.ci_width) for setting, times in handshake_times.items() if len(times) > 1}
+    print(f"{'setting':<10} {'samples':>8} {'median':>9} {'stdev':>8} {'IQR':>8} {'CV':>7} {'CI width':>9} "
+          f"{'samples for target':>19}")
+    for setting, result in results.items():
+        print(f"{setting:<10} {result['samples']:>8} {result['median']:>9.2f} {result['stdev']:>8.3f} "
+              f"{result['iqr']:>8.3f} {result['cv']:>7.2%} {result['median_ci_relative_width']:>9.2%} "
+              f"{result['samples_for_target_ci']:>19}")
+
+    os.makedirs(os.path.dirname(CHECK_PATH), exist_ok=True)
+    with open(CHECK_PATH, 'w') as f:
+        json.dump({'args': vars(args), 'results': results}, f, indent=1)
+    print(f"Results written to {CHECK_PATH}")
+
+
+if __name__ == '__main__':
+    main()
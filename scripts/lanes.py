@@ -0,0 +1,124 @@
+### --- Lanes --- ###
+
+# Port nginx serves TLS on within each lane's server namespace (or on its loopback address), and plain HTTP on
+SERVER_PORT = 4433
+HTTP_PORT = 80
+RELAY_HTTP_PORT = 8080
+
+# Ways of emulating the network between client and server: namespaces with netem qdiscs (needs root), or a
+# userspace relay on loopback (see relay.py)
+BACKENDS = ['netns', 'relay']
+
+class Lane:
+    """
+    One isolated client/server namespace pair (with its own veths, subnet, netem qdiscs and nginx instance),
+    as created by setup_namespaces.sh.
+    NOTE: lane 0 keeps the original names and 10.0.0.0/24, lane k uses a `_k` suffix and 10.0.k.0/24
+    """
+
+    relay = False
+
+    def __init__(self, index):
+        suffix = f"_{index}" if index else ""
+
+        self.index = index
+        self.server_ns = f"server_namespace{suffix}"
+        self.client_ns = f"client_namespace{suffix}"
+        self.server_veth = f"server_veth{suffix}"
+        self.client_veth = f"client_veth{suffix}"
+        self.subnet = f"10.0.{index}.0/24"
+        self.server_ip = f"10.0.{index}.1"
+        self.client_ip = f"10.0.{index}.2"
+        self.server_port = SERVER_PORT
+
+        # Address the client connects to, and nginx's plain HTTP listener
+        self.connect_ip = self.server_ip
+        self.connect_port = self.server_port
+        self.http_listen = str(HTTP_PORT)
+
+        # CPUs the lane's timers, nginx and relay (relay lanes only) are pinned to in isolation mode (see
+        # isolation.py), or None
+        self.client_cpus = None
+        self.server_cpus = None
+        self.relay_cpus = None
+
+    def timer_cpus(self, timer):
+        """
+        CPU the given timer (numbered from 0) is pinned to, as a list, or None if the lane isn't isolated.
+        """
+
+        if not self.client_cpus:
+            return None
+        return [self.client_cpus[timer % len(self.client_cpus)]]
+
+    def client_command(self, command):
+        """
+        A command run in the lane's client namespace.
+        """
+
+        return ['ip', 'netns', 'exec', self.client_ns, *command]
+
+    def server_command(self, command):
+        """
+        A command run in the lane's server namespace.
+        """
+
+        return ['ip', 'netns', 'exec', self.server_ns, *command]
+
+    def __repr__(self):
+        return f"Lane({self.index})"
+
+class RelayLane(Lane):
+    """
+    A lane on loopback rather than in namespaces: nginx listens on 127.0.k.1, and the client connects to a
+    userspace relay (relay.py) on 127.0.k.2 that emulates the delay, loss, MTU and initcwnd netem and the routes
+    would. Needs no root, so many lanes can share one host.
+    """
+
+    relay = True
+
+    def __init__(self, index):
+        super().__init__(index)
+        self.server_ns = self.client_ns = None
+        self.server_veth = self.client_veth = None
+        self.subnet = None
+        self.server_ip = f"127.0.{index}.1"
+        self.client_ip = f"127.0.{index}.2"
+        self.connect_ip = self.client_ip
+        self.http_listen = f"{self.server_ip}:{RELAY_HTTP_PORT}"
+
+        # The running relay process, started by relay.start_relay
+        self.relay_proc = None
+
+    def client_command(self, command):
+        return command
+
+    def server_command(self, command):
+        return command
+
+    def __repr__(self):
+        return f"RelayLane({self.index})"
+
+def pinned(command, cpus):
+    """
+    A command prefixed with taskset to run it (and everything it starts) on the given CPUs, or unchanged if
+    cpus is None.
+    """
+
+    if not cpus:
+        return command
+    return ['taskset', '-c', ','.join(str(cpu) for cpu in cpus), *command]
+
+def make_lanes(count, backend='netns'):
+    """
+    The first `count` lanes of the given backend. Namespace lanes must not exceed the number passed to
+    setup_namespaces.sh.
+    """
+
+    if not 1 <= count <= 255:
+        raise ValueError(f"Lane count must be between 1 and 255, got {count}")
+    lane_class = RelayLane if backend == 'relay' else Lane
+    return [lane_class(index) for index in range(count)]
+
+# Lane used when running a single experiment
+DEFAULT_LANE = Lane(0)
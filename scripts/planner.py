@@ -0,0 +1,246 @@
+### --- Imports --- ###
+
+import itertools
+import math
+import re
+from collections import namedtuple
+
+from time_handshakes import (
+    LATENCIES, LOSS_SCHEDULE, TIMERS,
+    ADAPTIVE_BATCH,
+    LOAD_LATENCY
+)
+
+### --- Experiment matrix --- ###
+
+SIG_ALGS = [
+    "mldsa44", "mldsa65", "mldsa87", "sphincssha2128fsimple", "falcon512",
+    "falcon1024", "mayo1", "mayo3", "mayo5", "CROSSrsdp128balanced"
+]
+
+# Key exchange groups swept with --groups all. A group of None leaves both ends on their default groups,
+# and those cells are untagged; any other group's cells are tagged with it
+KEM_GROUPS = ["x25519", "mlkem512", "mlkem768", "mlkem1024", "X25519MLKEM768"]
+
+# initcwnd experiment: initcwnd values from 5 to 100 in steps of 5
+INITCWND_VALUES = list(range(5, 101, 5))
+
+# MTU experiment: MTU values and their corresponding initcwnd, following inverse proportional relationship
+MTU_INITCWND = [(1500, 12), (3000, 6), (9000, 2)]
+
+# How the server's certificate chain is delivered, swept with --chains: the suffix of the chain name (from
+# gen_certs.sh) nginx serves it under. 'full' is the default root -> intermediate -> server chain with the root
+# included, 'noroot' the same chain without the root (which the client already holds as its trust anchor),
+# '2level' a root -> server chain without the root (so just the server certificate, signed by the root) and
+# 'leaf' a self-signed server certificate pinned as the client's trust anchor. Cells of any chain but 'full'
+# are tagged with it
+CHAIN_VARIANTS = {
+    'full': '',
+    'noroot': '_noroot',
+    '2level': '_2level_noroot',
+    'leaf': '_leaf',
+}
+DEFAULT_CHAIN = 'full'
+
+# Load experiment: nginx worker_processes values (the other modes use 'auto')
+WORKER_PROCESSES_VALUES = [1, 2, 4]
+
+# One cell of a sweep. value is the experiment value the results are stored under, and an initcwnd / MTU of
+# None leaves the route / link MTU untouched. A load cell ramps through every concurrency level, so has no
+# measurement count
+Cell = namedtuple('Cell', ['value', 'initcwnd', 'mtu', 'group', 'latency_ms', 'pkt_loss', 'measurements',
+                           'sig_alg', 'chain'])
+
+def chain_name(sig_alg, chain=DEFAULT_CHAIN):
+    """
+    Name of an algorithm's certificate chain delivered the given way: the SNI server name nginx serves it under,
+    and the prefix of its certificate files.
+    """
+
+    return sig_alg + CHAIN_VARIANTS[chain]
+
+### --- Cost model --- ###
+
+# Estimated seconds taken by each kind of reconfiguration
+SWITCH_COSTS = {
+    'route': 0.05,  # `ip route change` in both namespaces
+    'mtu': 0.5,     # `ip link set mtu` on both veths, which resets the links
+    'nginx': 1.0,   # Graceful reload, waiting for the old workers to finish
+    'netem': 0.05,  # `tc qdisc change` on both veths
+}
+
+# Handshake time model: round trips per handshake (TCP connect plus the TLS 1.3 flights), segments exposed to
+# loss and the delay each loss adds (about one minimum RTO), plus the fixed cost of each batch (process start
+# and provider loading, unless run with --persistent)
+EST_HANDSHAKE_RTTS = 3
+EST_LOSSY_SEGMENTS = 12
+EST_RTO_SECS = 0.2
+EST_BATCH_OVERHEAD_SECS = 0.1
+
+# Warmup run by time_handshake before each load mode concurrency level
+EST_LOAD_WARMUP_SECS = 1.0
+
+def matrix(mode, groups, chains=(DEFAULT_CHAIN,)):
+    """
+    The declarative experiment matrix for a mode: the values swept along each axis. The 'value' axis holds
+    (experiment value, initcwnd, MTU) settings and the 'loss' axis (packet loss, measurements per timer) pairs.
+    """
+
+    if mode == "initcwnd":
+        values = [(initcwnd, initcwnd, None) for initcwnd in INITCWND_VALUES]
+    elif mode == "mtu":
+        values = [(mtu, initcwnd, mtu) for mtu, initcwnd in MTU_INITCWND]
+    else:
+        values = [(worker_processes, None, None) for worker_processes in WORKER_PROCESSES_VALUES]
+
+    return {
+        'value': values,
+        'group': list(groups),
+        'latency': [LOAD_LATENCY] if mode == "load" else list(LATENCIES),
+        'loss': [(0, None)] if mode == "load" else list(LOSS_SCHEDULE),
+        'sig_alg': list(SIG_ALGS),
+        'chain': list(chains),
+    }
+
+def axis_costs(mode):
+    """
+    Estimated cost of one switch along each axis of the mode's matrix.
+    NOTE: algorithms and chains are free to switch between since nginx serves them all at once (selected by SNI)
+    """
+
+    value_cost = {
+        'initcwnd': SWITCH_COSTS['route'],
+        'mtu': SWITCH_COSTS['mtu'] + SWITCH_COSTS['route'],
+        'load': SWITCH_COSTS['nginx'],
+    }[mode]
+    return {
+        'value': value_cost,
+        'group': SWITCH_COSTS['nginx'],
+        'latency': SWITCH_COSTS['netem'],
+        'loss': SWITCH_COSTS['netem'],
+        'sig_alg': 0,
+        'chain': 0,
+    }
+
+def order_cost(order, axes, costs):
+    """
+    Estimated reconfiguration cost of nesting the axes in the given order (outermost first). An axis switches
+    once per combination of itself and every axis outside it, or just once if it has a single value.
+    """
+
+    total = 0
+    combinations = 1
+    for axis in order:
+        combinations *= len(axes[axis])
+        total += costs[axis] * (combinations if len(axes[axis]) > 1 else 1)
+    return total
+
+def best_order(axes, costs):
+    """
+    The axis nesting order with the lowest estimated reconfiguration cost. Ties keep the matrix's own order.
+    """
+
+    return min(itertools.permutations(axes), key=lambda order: order_cost(order, axes, costs))
+
+def plan(mode, groups, chains=(DEFAULT_CHAIN,)):
+    """
+    Every cell of the mode's matrix, in the execution order that minimises reconfiguration.
+    Returns the cells and the axis order used.
+    """
+
+    axes = matrix(mode, groups, chains)
+    order = best_order(axes, axis_costs(mode))
+
+    cells = []
+    for combination in itertools.product(*(axes[axis] for axis in order)):
+        point = dict(zip(order, combination))
+        value, initcwnd, mtu = point['value']
+        pkt_loss, measurements = point['loss']
+        cells.append(Cell(value, initcwnd, mtu, point['group'], point['latency'], pkt_loss, measurements,
+                          point['sig_alg'], point['chain']))
+    return cells, order
+
+### --- Runtime estimate --- ###
+
+def delay_secs(delay):
+    """
+    Seconds of a tc delay string (e.g. '20.000ms').
+    """
+
+    match = re.fullmatch(r'([\d.]+)(us|ms|s)?', delay)
+    if match is None:
+        raise ValueError(f"Unrecognised delay: {delay}")
+    scale = {'us': 1e-6, 'ms': 1e-3, 's': 1, None: 1}[match.group(2)]
+    return float(match.group(1)) * scale
+
+def handshake_secs(latency_ms, pkt_loss, resumption=0):
+    """
+    Estimated time of one handshake. The delay is applied on both veths, so a round trip takes twice as long.
+    Resumption adds up to a round trip per handshake waiting for the session ticket.
+    """
+
+    rtt = 2 * delay_secs(latency_ms)
+    return (EST_HANDSHAKE_RTTS + (1 if resumption else 0)) * rtt + EST_LOSSY_SEGMENTS * pkt_loss / 100 * EST_RTO_SECS
+
+def cell_secs(mode, cell, args):
+    """
+    Estimated time spent handshaking in one cell, with its handshakes split across args.timers concurrent
+    timers. Adaptive cells are assumed to need their fixed schedule's sample count, clamped to the adaptive bounds.
+    """
+
+    if mode == "load":
+        return len(args.concurrency) * (args.duration + EST_LOAD_WARMUP_SECS)
+
+    samples = cell.measurements * TIMERS
+    batches = 1
+    if args.adaptive:
+        samples = min(max(samples, args.min_samples), args.max_samples)
+    measurements = math.ceil(samples / args.timers)
+    if args.adaptive:
+        batches = math.ceil(measurements / ADAPTIVE_BATCH)
+    return batches * EST_BATCH_OVERHEAD_SECS + measurements * handshake_secs(cell.latency_ms, cell.pkt_loss,
+                                                                            args.resumption)
+
+def switch_secs(mode, previous, cell):
+    """
+    Estimated cost of reconfiguring a lane from the previous cell's settings (None if it is fresh) to this cell's.
+    """
+
+    if previous is None:
+        # The route / MTU and netem are always set, and nginx started, for a lane's first cell
+        previous = Cell(*[None] * len(Cell._fields))
+    secs = 0
+    if cell.mtu is not None and cell.mtu != previous.mtu:
+        secs += SWITCH_COSTS['mtu']
+    if cell.initcwnd is not None and cell.initcwnd != previous.initcwnd:
+        secs += SWITCH_COSTS['route']
+    if cell.group != previous.group or (mode == "load" and cell.value != previous.value):
+        secs += SWITCH_COSTS['nginx']
+    if (cell.latency_ms, cell.pkt_loss) != (previous.latency_ms, previous.pkt_loss):
+        secs += SWITCH_COSTS['netem']
+    return secs
+
+def estimate_runtime(mode, cells, lanes, args):
+    """
+    Estimated (handshaking, reconfiguration) seconds to run the cells in order, shared across the lanes.
+    Each lane is assumed to take every lanes-th cell, as they pull from one queue.
+    """
+
+    handshaking = sum(cell_secs(mode, cell, args) for cell in cells)
+    switching = 0
+    for lane in range(lanes):
+        previous = None
+        for cell in cells[lane::lanes]:
+            switching += switch_secs(mode, previous, cell)
+            previous = cell
+    return handshaking / lanes, switching / lanes
+
+def format_secs(secs):
+    """
+    Seconds as a [Nd ]H:MM:SS string.
+    """
+
+    days, secs = divmod(round(secs), 86400)
+    hours, secs = divmod(secs, 3600)
+    minutes, secs = divmod(secs, 60)
+    return f"{f'{days}d ' if days else ''}{hours}:{minutes:02}:{secs:02}"
@@ -0,0 +1,79 @@
+import os
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
+from results_store import parse_tags
+
+# Compares ways of delivering the server's certificate chain from sweeps run with --chains (and --compress-certs).
+# Prints the mean bytes the server sent per handshake for every algorithm and delivery, with the saving over the
+# default full chain, and plots the median handshake time of each delivery against initcwnd / MTU for a few
+# algorithms and loss rates.
+
+# Algorithms to plot (the ones whose chains overflow the initial window most)
+plotted_algs = ['sphincssha2128fsimple', 'CROSSrsdp128balanced']
+packet_loss_values = [0, 6, 12]
+
+DEFAULT_DELIVERY = 'full'
+
+def delivery(cell_tags):
+    name = cell_tags.get('chain', DEFAULT_DELIVERY)
+    if 'cert_compression' in cell_tags:
+        name += ' + compression'
+    return name
+
+def load_deliveries(mode):
+    summary = load_summary(mode, tags=None).dropna(subset=['median'])
+    tags = summary['tags'].map(parse_tags)
+
+    # Only cells that differ by chain delivery alone (e.g. not resumption or group runs) are comparable
+    summary = summary[tags.map(lambda cell_tags: set(cell_tags) <= {'chain', 'cert_compression'})].copy()
+    summary['delivery'] = tags.map(delivery)
+    return summary
+
+def print_bytes(summary):
+    server_bytes = summary.dropna(subset=['mean_server_bytes'])
+    server_bytes = server_bytes.groupby(['sig_alg', 'delivery'])['mean_server_bytes'].mean()
+
+    print(f"{'sig_alg':<24} {'delivery':<24} {'server bytes':>12} {'saving':>8}")
+    for (sig_alg, name), mean_bytes in server_bytes.items():
+        full = server_bytes.get((sig_alg, DEFAULT_DELIVERY))
+        saving = f"{1 - mean_bytes / full:>8.1%}" if full else f"{'-':>8}"
+        print(f"{sig_alg:<24} {name:<24} {mean_bytes:>12.0f} {saving}")
+
+def plot_delivery(summary, mode, sig_alg, pkt_loss):
+    cells = summary[(summary['sig_alg'] == sig_alg) & (summary['pkt_loss'] == pkt_loss)]
+    if cells['delivery'].nunique() < 2:
+        return
+
+    plt.figure(figsize=(10, 6))
+    for name, delivery_cells in sorted(cells.groupby('delivery'), key=lambda item: item[0] != DEFAULT_DELIVERY):
+        delivery_cells = delivery_cells.sort_values(by='value')
+        plt.plot(delivery_cells['value'], delivery_cells['median'], 'o-', label=name, linewidth=2, markersize=5,
+                 alpha=0.8)
+
+    plt.xlabel('initcwnd' if mode == 'initcwnd' else 'MTU (bytes)', fontsize=14)
+    plt.ylabel('Median Handshake Time (ms)', fontsize=14)
+    plt.title(f'{sig_alg} Chain Delivery ({pkt_loss:g}% loss)', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=10, loc='upper right')
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/chains_{mode}_{sig_alg}_loss{pkt_loss:g}.png")
+    plt.close()
+
+def main():
+    for mode in ['initcwnd', 'mtu']:
+        summary = load_deliveries(mode)
+        if summary['delivery'].nunique() < 2:
+            print(f"{mode}: fewer than two chain deliveries found - run the sweep with --chains first")
+            continue
+
+        print(f"--- {mode} ---")
+        print_bytes(summary)
+        for sig_alg in plotted_algs:
+            for pkt_loss in packet_loss_values:
+                plot_delivery(summary, mode, sig_alg, pkt_loss)
+
+if __name__ == '__main__':
+    main()
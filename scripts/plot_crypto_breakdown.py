@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
+from results_store import iter_cells
+
+# Splits each algorithm's median handshake time into the signature crypto it needs and everything else (mostly
+# transmission), using the crypto-only benchmarks from bench_crypto.py. A full handshake costs one sign (the
+# server's CertificateVerify), one verify of it by the client and one verification of the server's chain.
+# Key exchange and hashing are left in the remainder.
+
+# Conditions to break down: (mode, value) and packet loss rates
+breakdown_cells = [('initcwnd', 10), ('mtu', 1500)]
+packet_loss_values = [0, 6]
+
+CRYPTO_OPS = ['sign', 'verify', 'chain_verify']
+
+def load_crypto():
+    """
+    Median ms of each crypto operation per algorithm, from the untagged (unpinned) crypto cells. Where an
+    algorithm was benchmarked more than once, the run with the most iterations is used.
+    """
+
+    crypto = {}
+    for meta in iter_cells('crypto', tags=''):
+        iterations = int(float(meta['value']))
+        if iterations > crypto.get(meta['sig_alg'], (0, None))[0]:
+            crypto[meta['sig_alg']] = (iterations, {op: stats['median_ms'] for op, stats in meta['ops'].items()})
+    return {sig_alg: ops for sig_alg, (_, ops) in crypto.items()}
+
+def plot_breakdown(summary, crypto, mode, value, pkt_loss):
+    cells = summary[(summary['value'] == value) & (summary['pkt_loss'] == pkt_loss) &
+                    summary['sig_alg'].isin(list(crypto))].dropna(subset=['median'])
+    if cells.empty:
+        return
+    cells = cells.sort_values(by='median')
+
+    print(f"--- {mode} = {value}, {pkt_loss:g}% loss ---")
+    print(f"{'sig_alg':<24} {'handshake (ms)':>14} {'crypto (ms)':>12} {'crypto share':>12}")
+    sig_algs = list(cells['sig_alg'])
+    handshake = cells['median'].to_numpy()
+    crypto_ms = {op: np.array([crypto[sig_alg].get(op, np.nan) for sig_alg in sig_algs]) for op in CRYPTO_OPS}
+    total_crypto = np.nansum(list(crypto_ms.values()), axis=0)
+    for sig_alg, handshake_ms, crypto_total in zip(sig_algs, handshake, total_crypto):
+        print(f"{sig_alg:<24} {handshake_ms:>14.2f} {crypto_total:>12.3f} {crypto_total / handshake_ms:>12.1%}")
+
+    plt.figure(figsize=(12, 6))
+    bottom = np.zeros(len(sig_algs))
+    for op in CRYPTO_OPS:
+        heights = np.nan_to_num(crypto_ms[op])
+        plt.bar(sig_algs, heights, bottom=bottom, label=op)
+        bottom += heights
+    plt.bar(sig_algs, handshake - bottom, bottom=bottom, label='transmission and other', color='lightgrey')
+
+    plt.xticks(rotation=30, ha='right')
+    plt.ylabel('Median Handshake Time (ms)', fontsize=14)
+    plt.title(f'Crypto vs Transmission Time ({mode} = {value}, {pkt_loss:g}% loss)', fontsize=16)
+    plt.legend(fontsize=10, loc='upper left')
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/crypto_breakdown_{mode}{value}_loss{pkt_loss:g}.png")
+    plt.close()
+
+def main():
+    crypto = load_crypto()
+    if not crypto:
+        print("No crypto benchmarks found - run scripts/bench_crypto.py first")
+        return
+
+    for mode, value in breakdown_cells:
+        summary = load_summary(mode)
+        for pkt_loss in packet_loss_values:
+            plot_breakdown(summary, crypto, mode, value, pkt_loss)
+
+if __name__ == '__main__':
+    main()
@@ -1,92 +1,27 @@
-import os
-import pandas as pd
-import matplotlib.pyplot as plt
 import re
-import numpy as np
+
+from plot_pipeline import Figure, plot_predicted_intervals, render_args, render_figures, seeded_rng
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
 
 # Set of initcwnd values to include
 # NOTE: an exponential scale was used because the thresholds can be quite widely spaced for each alg.
 allowed_initcwnds = {5, 10, 20, 40, 80}
 
 # Option to add very minute random variation to plots to make ones that overlap more visible
-def add_random_variation(series, percent=0.035):
-    noise = np.random.uniform(1 - percent, 1 + percent, size=len(series))
+# NOTE: the variation is seeded per line, so re-rendering unchanged data gives an identical file
+def add_random_variation(series, rng, percent=0.035):
+    noise = rng.uniform(1 - percent, 1 + percent, size=len(series))
     return series * noise
 
-# Process the given csv
-def load_and_process(filename):
-    rows = []
-
-    with open(filename, 'r') as f:
-        for line in f:
-            if not line.strip():
-                continue
-            parts = line.strip().split(',')
-            try:
-                loss_val = float(parts[0])
-            except ValueError:
-                continue
-
-            try:
-                numeric_vals = [float(x) for x in parts[1:] if x.strip() != '']
-            except ValueError:
-                continue
-
-            median_val = pd.Series(numeric_vals).median() if numeric_vals else None
-            pct90_val = pd.Series(numeric_vals).quantile(0.90) if numeric_vals else None
-
-            rows.append({'loss': loss_val, 'median': median_val, '90thpercentile': pct90_val})
-
-    return pd.DataFrame(rows).sort_values(by='loss')
-
 # extract num using regex
 def extract_number(text, prefix):
     match = re.search(rf'{prefix}([\d.]+)', text)
     return match.group(1) if match else None
 
-# Root data directory relative to the script execution location.
-# NOTE: expected to be in the format:
-# - initcwnd=X1/
-#   - latency=Y1
-#   - latency=Y2
-# - initcwnd=X2/
-#   - latency=Y1
-#   - latency=Y2
-# - ...
-
-RELATIVE_DATA_DIR = 'data'
-results = {}
-
-# Loop over initcwnd directories (top-level)
-for initcwnd_dir in sorted(os.listdir(RELATIVE_DATA_DIR)):
-    full_initcwnd_path = os.path.join(RELATIVE_DATA_DIR, initcwnd_dir)
-    if os.path.isdir(full_initcwnd_path):
-        # Extract initcwnd value, e.g. from "initcwnd=10'
-        initcwnd_value = extract_number(initcwnd_dir, 'initcwnd=')
-        if not initcwnd_value:
-            continue
-        # loop over latency directories inside initcwnd directory
-        for latency_dir in sorted(os.listdir(full_initcwnd_path)):
-            full_latency_path = os.path.join(full_initcwnd_path, latency_dir)
-            if os.path.isdir(full_latency_path):
-                # Extract latency value, e.g. from "latency=20.000ms"
-                latency_value = extract_number(latency_dir, 'latency=')
-                if not latency_value:
-                    continue
-                # Process each CSV file in latency directory
-                for filename in os.listdir(full_latency_path):
-                    if filename.endswith('.csv'):
-                        # NOTE: assumes filename format: <sig_alg>.csv
-                        sig_alg, _ = filename.rsplit('.', 1)
-                        df = load_and_process(os.path.join(full_latency_path, filename))
-                        key = (sig_alg, latency_value)
-                        if key not in results:
-                            results[key] = {}
-                        # Store dataframe keyed by an integer initcwnd value
-                        results[key][int(float(initcwnd_value))] = df
-
-# Plot results for each (signature algorithm, latency) - MEDIAN HANDSHAKE TIME 
-for (sig_alg, latency), cwnd_data in results.items():
+# Plot results for one (signature algorithm, latency) - MEDIAN HANDSHAKE TIME
+def plot_median(sig_alg, cwnd_data):
     plt.figure(figsize=(8, 5))
 
     line_styles = ['o-', 's-', 'd-', 'x-', '^-']
@@ -96,11 +31,14 @@ for (sig_alg, latency), cwnd_data in results.items():
 
     for initcwnd, df in sorted(cwnd_data.items()):
         if initcwnd in allowed_initcwnds:
-            plt.plot(df['loss'], add_random_variation(df['median']), 
+            medians = add_random_variation(df['median'], seeded_rng(sig_alg, 'median', initcwnd))
+            plt.plot(df['loss'], medians, 
                      line_styles[style_idx % len(line_styles)],
                      label=f'initcwnd = {initcwnd}', 
                      color=custom_colors[style_idx % len(custom_colors)],
                      linewidth=2.5, markersize=7, alpha=0.7)
+            plot_predicted_intervals(df['loss'], medians, df['median'], df['median_lo'], df['median_hi'],
+                                     df['predicted'], custom_colors[style_idx % len(custom_colors)])
             style_idx += 1
 
         
@@ -121,16 +59,9 @@ for (sig_alg, latency), cwnd_data in results.items():
 
     plt.xticks(ticks=list(range(0, 21, 2)))
     plt.tight_layout()
-    
-    # save plot to ./plots/
-    os.makedirs("plots", exist_ok=True)
-    filename = f"plots/{sig_alg.lower()}_median.png"
-    plt.savefig(filename)
-    plt.close()
-    plt.show()
-
-# Now plot results for each (sig algorithm, latency) - 90th PERCENTILE HANSHAKE TIME
-for (sig_alg, latency), cwnd_data in results.items():
+
+# Plot results for one (sig algorithm, latency) - 90th PERCENTILE HANSHAKE TIME
+def plot_90th(sig_alg, cwnd_data):
     plt.figure(figsize=(8, 5))
 
     line_styles = ['o-', 's-', 'd-', 'x-', '^-']
@@ -145,6 +76,8 @@ for (sig_alg, latency), cwnd_data in results.items():
                      label=f'initcwnd = {initcwnd}', 
                      color=custom_colors[style_idx % len(custom_colors)],
                      linewidth=2.5, markersize=7, alpha=0.7)
+            plot_predicted_intervals(df['loss'], df['90thpercentile'], df['90thpercentile'], df['p90_lo'],
+                                     df['p90_hi'], df['predicted'], custom_colors[style_idx % len(custom_colors)])
             style_idx += 1
 
     plt.title(f'{sig_alg} - 90th Percentile Handshake Time', fontsize=16)
@@ -155,10 +88,29 @@ for (sig_alg, latency), cwnd_data in results.items():
 
     plt.xticks(ticks=list(range(0, 19, 2)))
     plt.tight_layout()
-    
-    # save plot to ./plots/
-    os.makedirs("plots", exist_ok=True)
-    filename = f"plots/{sig_alg.lower()}_90th.png"
-    plt.savefig(filename)
-    plt.close()
-    # plt.show()
+
+def main():
+    args = render_args("Plot median / 90th percentile handshake time against packet loss for each initcwnd")
+
+    # Per-cell medians / 90th percentiles come from the cached summary index (see aggregate.py), one row per
+    # (initcwnd, latency, sig_alg, packet loss). Only cells that changed since the last run are re-read.
+    # Cells an active sweep (run_sweep.py --active) predicted are included, and drawn with error bars.
+    summary = load_summary('initcwnd', predicted=True).dropna(subset=['median'])
+    summary['latency'] = summary['latency'].map(lambda latency: extract_number(latency, ''))
+    summary = summary.rename(columns={'pkt_loss': 'loss', 'p90': '90thpercentile'})
+
+    # Store dataframe keyed by an integer initcwnd value
+    results = {}
+    for (sig_alg, latency, initcwnd), df in summary.groupby(['sig_alg', 'latency', 'value']):
+        results.setdefault((sig_alg, latency), {})[int(initcwnd)] = df.sort_values(by='loss').reset_index(drop=True)
+
+    figures = []
+    for (sig_alg, latency), cwnd_data in results.items():
+        params = {'sig_alg': sig_alg, 'cwnd_data': cwnd_data}
+        figures.append(Figure(f"plots/{sig_alg.lower()}_median.png", plot_median, params))
+        figures.append(Figure(f"plots/{sig_alg.lower()}_90th.png", plot_90th, params))
+    render_figures(figures, args)
+
+
+if __name__ == '__main__':
+    main()
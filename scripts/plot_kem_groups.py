@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
+from results_store import parse_tags
+
+# Compares (signature algorithm, key exchange group) combinations from sweeps run with --groups.
+# Prints the cheapest combination (lowest median handshake time) for every (initcwnd, packet loss) condition,
+# and draws a heatmap of the median for every combination at a few conditions.
+
+# initcwnd values and packet loss rates to draw heatmaps for
+allowed_initcwnds = {10}
+packet_loss_values = [0, 6, 12, 18]
+
+DEFAULT_GROUP = 'default'
+
+def load_groups():
+    summary = load_summary('initcwnd', tags=None).dropna(subset=['median'])
+    tags = summary['tags'].map(parse_tags)
+
+    # Only cells that differ by group alone (e.g. not resumption runs) are comparable
+    summary = summary[tags.map(lambda cell_tags: set(cell_tags) <= {'group'})].copy()
+    summary['group'] = tags.map(lambda cell_tags: cell_tags.get('group', DEFAULT_GROUP))
+    return summary
+
+def print_cheapest(summary):
+    print(f"{'initcwnd':>8}  {'loss':>5}  {'sig_alg':<24} {'group':<18} {'median (ms)':>11}")
+    for (initcwnd, pkt_loss), cells in summary.groupby(['value', 'pkt_loss']):
+        best = cells.loc[cells['median'].idxmin()]
+        print(f"{initcwnd:>8}  {pkt_loss:>5g}  {best['sig_alg']:<24} {best['group']:<18} {best['median']:>11.2f}")
+
+def plot_heatmap(summary, initcwnd, pkt_loss):
+    cells = summary[(summary['value'] == initcwnd) & (summary['pkt_loss'] == pkt_loss)]
+    if cells.empty:
+        return
+    medians = cells.pivot_table(index='sig_alg', columns='group', values='median')
+
+    plt.figure(figsize=(10, 6))
+    plt.imshow(medians.values, cmap='YlOrRd', aspect='auto')
+    plt.colorbar(label='Median Handshake Time (ms)')
+    for row in range(medians.shape[0]):
+        for col in range(medians.shape[1]):
+            if not np.isnan(medians.values[row, col]):
+                plt.text(col, row, f'{medians.values[row, col]:.0f}', ha='center', va='center', fontsize=9,
+                         color='black')
+
+    plt.xticks(range(medians.shape[1]), medians.columns, rotation=30, ha='right')
+    plt.yticks(range(medians.shape[0]), medians.index)
+    plt.xlabel('Key Exchange Group', fontsize=14)
+    plt.ylabel('Signature Algorithm', fontsize=14)
+    plt.title(f'Median Handshake Time (initcwnd = {initcwnd}, {pkt_loss:g}% loss)', fontsize=16)
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/kem_groups_initcwnd{initcwnd}_loss{pkt_loss:g}.png")
+    plt.close()
+
+def main():
+    summary = load_groups()
+    if summary['group'].nunique() < 2:
+        print("Fewer than two key exchange groups found - run the sweep with --groups first")
+        return
+
+    print_cheapest(summary)
+    for initcwnd in sorted(allowed_initcwnds):
+        for pkt_loss in packet_loss_values:
+            plot_heatmap(summary, initcwnd, pkt_loss)
+
+if __name__ == '__main__':
+    main()
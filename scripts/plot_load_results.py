@@ -0,0 +1,52 @@
+import os
+import matplotlib.pyplot as plt
+
+from results_store import iter_cells
+
+# Plots the load experiment (run_sweep.py load): sustained handshakes/sec and handshake latency against the
+# number of concurrent handshakes, one line per signature algorithm and one figure per nginx worker_processes value.
+# The per-concurrency-level summaries are read from each cell's meta.json, so no columns are loaded.
+
+def load_levels():
+    results = {}
+    for meta in iter_cells('load'):
+        worker_processes = int(float(meta['value']))
+        results.setdefault(worker_processes, {})[meta['sig_alg']] = meta.get('levels', [])
+    return results
+
+def plot_metric(alg_levels, worker_processes, metric, ylabel, title, filename):
+    plt.figure(figsize=(8, 5))
+
+    for sig_alg, levels in sorted(alg_levels.items()):
+        levels = [level for level in levels if level.get(metric) is not None]
+        if not levels:
+            continue
+        plt.plot([level['concurrency'] for level in levels], [level[metric] for level in levels], 'o-',
+                 label=sig_alg, linewidth=2, markersize=5, alpha=0.8)
+
+    plt.xscale('log', base=2)
+    plt.xlabel('Concurrent Handshakes', fontsize=14)
+    plt.ylabel(ylabel, fontsize=14)
+    plt.title(f'{title} (worker_processes = {worker_processes})', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=10, loc='upper left')
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/{filename}_workers{worker_processes}.png")
+    plt.close()
+
+def main():
+    results = load_levels()
+    if not results:
+        print("No load results found - run run_load_experiment.sh first")
+        return
+
+    for worker_processes, alg_levels in sorted(results.items()):
+        plot_metric(alg_levels, worker_processes, 'handshakes_per_sec', 'Handshakes / sec',
+                    'Sustained Handshake Rate', 'load_throughput')
+        plot_metric(alg_levels, worker_processes, 'p90', '90th Percentile Latency (ms)',
+                    'Handshake Latency Under Load', 'load_p90')
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
-import os
 import pandas as pd
-import matplotlib.pyplot as plt
 import re
-import numpy as np
+
+from plot_pipeline import Figure, plot_predicted_intervals, render_args, render_figures, seeded_rng
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
 
 # Only MTU values to include
 allowed_mtus = {1500, 3000, 4500, 6000, 7500, 9000}
 
-def add_random_variation(series, percent=0.02):
+def add_random_variation(series, rng, percent=0.02):
     """
-    Apply a small random variation to make overlapping lines easier to read.
+    Apply a small random variation to make overlapping lines easier to read. The variation comes from rng, seeded
+    per line so re-rendering unchanged data gives an identical file.
     """
-    noise = np.random.uniform(1 - percent, 1 + percent, size=len(series))
+    noise = rng.uniform(1 - percent, 1 + percent, size=len(series))
     return series * noise
 
 def extract_number(text, prefix):
@@ -21,52 +24,78 @@ def extract_number(text, prefix):
 def load_data():
     results = {}
 
-    RELATIVE_DATA_DIR = 'data'
-
-    for mtu_dir in sorted(os.listdir(RELATIVE_DATA_DIR)):
-        full_mtu_path = os.path.join(RELATIVE_DATA_DIR, mtu_dir)
-        mtu_val = extract_number(mtu_dir, 'mtu=')
-        if not mtu_val or not os.path.isdir(full_mtu_path):
-            continue
-        mtu_val = int(float(mtu_val))
-
-        for latency_dir in os.listdir(full_mtu_path):
-            full_latency_path = os.path.join(full_mtu_path, latency_dir)
-            if not os.path.isdir(full_latency_path):
-                continue
-
-            for filename in os.listdir(full_latency_path):
-                if not filename.endswith('.csv'):
-                    continue
-                sig_alg, _ = filename.rsplit('.', 1)
-                if sig_alg.lower() == "sphincssha2128ssimple":
-                    continue # NOTE: as a self reminder, I am excluding this algorithm for time being due to issues
-                filepath = os.path.join(full_latency_path, filename)
-
-                with open(filepath, 'r') as f:
-                    for line in f:
-                        if not line.strip():
-                            continue
-                        parts = line.strip().split(',')
-                        try:
-                            pkt_loss = float(parts[0])
-                            times = [float(x) for x in parts[1:] if x.strip()]
-                            median = pd.Series(times).median() if times else None
-                            pct90 = pd.Series(times).quantile(0.90) if times else None
-                        except ValueError:
-                            continue
-
-                        key = (sig_alg, pkt_loss)
-                        if key not in results:
-                            results[key] = {}
-                        if mtu_val not in results[key]:
-                            results[key][mtu_val] = {'median': None, '90th': None}
-                        results[key][mtu_val]['median'] = median
-                        results[key][mtu_val]['90th'] = pct90
+    # Per-cell medians / 90th percentiles for (MTU, latency, sig_alg, packet loss) from the cached summary index,
+    # including the cells an active sweep (run_sweep.py --active) predicted, with their intervals
+    summary = load_summary('mtu', predicted=True)
+    for cell in summary.itertuples():
+        if cell.sig_alg.lower() == "sphincssha2128ssimple":
+            continue # NOTE: as a self reminder, I am excluding this algorithm for time being due to issues
+        median = None if pd.isna(cell.median) else cell.median
+        pct90 = None if pd.isna(cell.p90) else cell.p90
+
+        key = (cell.sig_alg, cell.pkt_loss)
+        if key not in results:
+            results[key] = {}
+        results[key][int(cell.value)] = {'median': median, '90th': pct90, 'predicted': bool(cell.predicted),
+                                         'median_lo': cell.median_lo, 'median_hi': cell.median_hi,
+                                         '90th_lo': cell.p90_lo, '90th_hi': cell.p90_hi}
 
     return results
 
-def plot_by_signature(results, metric='median'):
+mtu_to_initcwnd = {
+    1500: 12,
+    3000: 6,
+    9000: 2,
+}
+
+def plot_signature(sig_alg, pkt_loss_data, metric='median'):
+    plt.figure(figsize=(8, 5))
+
+    line_styles = ['o-', 's--', 'd:']
+    custom_colors = ['red', 'green', 'blue']
+    style_idx = 0
+
+    for mtu in sorted(mtu_to_initcwnd.keys()):
+        x_vals = []
+        y_vals = []
+        cells = []
+
+        for pkt_loss in sorted(pkt_loss_data.keys()):
+            mtu_data = pkt_loss_data[pkt_loss]
+            if mtu in mtu_data and mtu_data[mtu][metric] is not None:
+                x_vals.append(pkt_loss)
+                y_vals.append(mtu_data[mtu][metric])
+                cells.append(mtu_data[mtu])
+
+        if x_vals and y_vals:
+            if metric == 'median':
+                series = pd.Series(add_random_variation(pd.Series(y_vals), seeded_rng(sig_alg, metric, mtu)))
+            else:
+                series = pd.Series(y_vals)  # No jitter needed for 90th perc
+            plt.plot(
+                x_vals, series,
+                line_styles[style_idx % len(line_styles)],
+                label=f'MTU={mtu} (initcwnd={mtu_to_initcwnd[mtu]})',
+                color=custom_colors[style_idx % len(custom_colors)],
+                linewidth=2.5,
+                markersize=7,
+                alpha=0.75
+            )
+            plot_predicted_intervals(x_vals, series, y_vals, [cell[f'{metric}_lo'] for cell in cells],
+                                     [cell[f'{metric}_hi'] for cell in cells], [cell['predicted'] for cell in cells],
+                                     custom_colors[style_idx % len(custom_colors)])
+            style_idx += 1
+
+    plt.xlabel('Packet Loss (%)', fontsize=14)
+    plt.ylabel('Handshake Time (ms)', fontsize=14)
+    title_metric = "Median" if metric == 'median' else "90th Percentile"
+    plt.title(f'{sig_alg} - {title_metric} Handshake Time', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=15, loc='upper left')
+    plt.xticks(list(range(0, 21, 2)))
+    plt.tight_layout()
+
+def signature_figures(results, metric='median'):
     # Organise by sig algorithm
     grouped = {}
     for (sig_alg, pkt_loss), mtu_data in results.items():
@@ -74,62 +103,14 @@ def plot_by_signature(results, metric='median'):
             grouped[sig_alg] = {}
         grouped[sig_alg][pkt_loss] = mtu_data
 
-    mtu_to_initcwnd = {
-        1500: 12,
-        3000: 6,
-        9000: 2,
-    }
-
-    for sig_alg, pkt_loss_data in grouped.items():
-        plt.figure(figsize=(8, 5))
-
-        line_styles = ['o-', 's--', 'd:']
-        custom_colors = ['red', 'green', 'blue']
-        style_idx = 0
-
-        for mtu in sorted(mtu_to_initcwnd.keys()):
-            x_vals = []
-            y_vals = []
-
-            for pkt_loss in sorted(pkt_loss_data.keys()):
-                mtu_data = pkt_loss_data[pkt_loss]
-                if mtu in mtu_data and mtu_data[mtu][metric] is not None:
-                    x_vals.append(pkt_loss)
-                    y_vals.append(mtu_data[mtu][metric])
-
-            if x_vals and y_vals:
-                if metric == 'median':
-                    series = pd.Series(add_random_variation(pd.Series(y_vals)))
-                else:
-                    series = pd.Series(y_vals)  # No jitter needed for 90th perc
-                plt.plot(
-                    x_vals, series,
-                    line_styles[style_idx % len(line_styles)],
-                    label=f'MTU={mtu} (initcwnd={mtu_to_initcwnd[mtu]})',
-                    color=custom_colors[style_idx % len(custom_colors)],
-                    linewidth=2.5,
-                    markersize=7,
-                    alpha=0.75
-                )
-                style_idx += 1
-
-        plt.xlabel('Packet Loss (%)', fontsize=14)
-        plt.ylabel('Handshake Time (ms)', fontsize=14)
-        title_metric = "Median" if metric == 'median' else "90th Percentile"
-        plt.title(f'{sig_alg} - {title_metric} Handshake Time', fontsize=16)
-        plt.grid(True, alpha=0.3)
-        plt.legend(fontsize=15, loc='upper left')
-        plt.xticks(list(range(0, 21, 2)))
-        plt.tight_layout()
-
-        os.makedirs("plots", exist_ok=True)
-        plt.savefig(f"plots/{sig_alg.lower()}_mtu_{metric}.png")
-        plt.close()
+    return [Figure(f"plots/{sig_alg.lower()}_mtu_{metric}.png", plot_signature,
+                   {'sig_alg': sig_alg, 'pkt_loss_data': pkt_loss_data, 'metric': metric})
+            for sig_alg, pkt_loss_data in grouped.items()]
 
 def main():
+    args = render_args("Plot median / 90th percentile handshake time against packet loss for each MTU")
     results = load_data()
-    plot_by_signature(results, metric='median')
-    plot_by_signature(results, metric='90th')
+    render_figures(signature_figures(results, metric='median') + signature_figures(results, metric='90th'), args)
 
 if __name__ == '__main__':
     main()
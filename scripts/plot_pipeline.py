@@ -0,0 +1,162 @@
+"""
+Shared rendering for the plot scripts: figures are drawn across a process pool, and only when their inputs have
+changed since the last render.
+Importing this module selects matplotlib's non-interactive Agg backend, so scripts must import it before pyplot.
+"""
+
+### --- Imports --- ###
+
+import argparse
+import fnmatch
+import hashlib
+import inspect
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+# Figures are only ever saved, so every process renders with the non-interactive backend
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+### --- Config --- ###
+
+PLOTS_DIR = "plots"
+
+# Hash of each figure's inputs when it was last rendered, keyed by its path
+RENDER_CACHE = os.path.join(PLOTS_DIR, ".render_cache.json")
+
+# NOTE: matplotlib writes its version into a PNG's Software field, which would make the same figure differ
+# byte-for-byte between matplotlib releases
+SAVE_METADATA = {'Software': None}
+
+# A figure to render: its output path, the module-level function drawing it onto the current figure (so it can
+# be sent to a worker process), and the keyword arguments that function is called with
+Figure = namedtuple('Figure', ['path', 'draw', 'params'])
+
+def seeded_rng(*key):
+    """
+    Random generator seeded from the key (e.g. the figure's path and series), so a figure's jitter is the same
+    on every render.
+    """
+
+    digest = hashlib.sha256('/'.join(str(part) for part in key).encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+def plot_predicted_intervals(x, values, estimates, lows, highs, predicted, color):
+    """
+    Error bars (the surrogate model's interval, see surrogate.py) on the points an active sweep predicted rather
+    than measured, drawn around the plotted values, which may be jittered away from the estimates.
+    """
+
+    predicted = np.asarray(predicted, dtype=bool)
+    if not predicted.any():
+        return
+    estimates = np.asarray(estimates, dtype=float)[predicted]
+    yerr = [estimates - np.asarray(lows, dtype=float)[predicted], np.asarray(highs, dtype=float)[predicted] - estimates]
+    plt.errorbar(np.asarray(x)[predicted], np.asarray(values, dtype=float)[predicted], yerr=np.clip(yerr, 0, None),
+                 fmt='none', color=color, capsize=3, alpha=0.7)
+
+### --- Fingerprints --- ###
+
+def encode(value):
+    """
+    JSON-serialisable form of the values figures are drawn from (frames, series, numpy values and sets).
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return value.to_csv()
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Can't fingerprint {type(value).__name__}")
+
+def fingerprint(figure):
+    """
+    Hash of everything a figure's output depends on: its inputs, the source of the script drawing it and of this
+    module (whose helpers it draws with and which saves it), and the matplotlib version rendering it.
+    """
+
+    with open(inspect.getsourcefile(figure.draw), 'rb') as f:
+        source = f.read()
+    pipeline = inspect.getsource(inspect.getmodule(fingerprint))
+    params = json.dumps({str(name): value for name, value in figure.params.items()}, sort_keys=True, default=encode)
+    return hashlib.sha256(source + pipeline.encode() + matplotlib.__version__.encode() +
+                          figure.draw.__qualname__.encode() + params.encode()).hexdigest()
+
+def load_cache(path=RENDER_CACHE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, path=RENDER_CACHE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+### --- Rendering --- ###
+
+def render(figure):
+    """
+    Draw and save one figure. Runs in a worker process.
+    """
+
+    plt.close('all')
+    figure.draw(**figure.params)
+    os.makedirs(os.path.dirname(figure.path) or '.', exist_ok=True)
+    plt.savefig(figure.path, metadata=SAVE_METADATA)
+    plt.close('all')
+    return figure.path
+
+def render_figures(figures, args):
+    """
+    Render the figures whose inputs changed since they were last rendered (or whose file is missing) across a
+    pool of processes, restricted to those whose path matches --only. With --force every figure is rendered.
+    """
+
+    # NOTE: a figure drawn twice to the same path (e.g. once per latency) keeps the last one, as if rendered in order
+    figures = list({figure.path: figure for figure in figures}.values())
+    if args.only:
+        figures = [figure for figure in figures if any(fnmatch.fnmatch(figure.path, f"*{pattern}*")
+                                                       for pattern in args.only)]
+    cache = load_cache()
+    hashes = {figure.path: fingerprint(figure) for figure in figures}
+    stale = [figure for figure in figures
+             if args.force or cache.get(figure.path) != hashes[figure.path] or not os.path.exists(figure.path)]
+
+    # NOTE: a pool takes longer to start than one figure takes to draw
+    jobs = min(args.jobs, len(stale))
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            rendered = list(pool.map(render, stale))
+    else:
+        rendered = [render(figure) for figure in stale]
+
+    cache = load_cache()
+    cache.update({path: hashes[path] for path in rendered})
+    save_cache(cache)
+    print(f"Rendered {len(rendered)} of {len(figures)} figures ({len(figures) - len(rendered)} unchanged)")
+
+def render_args(description):
+    """
+    Command line options shared by the plot scripts using the pipeline.
+    """
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--only', nargs='+', default=None,
+                        help="Only render figures whose path contains one of these (glob) patterns, e.g. mldsa44")
+    parser.add_argument('--force', action='store_true', help="Render every figure, even if its inputs are unchanged")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help="Processes to render figures across (default: %(default)s)")
+    return parser.parse_args()
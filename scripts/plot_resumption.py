@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from results_store import iter_cells, read_columns
+
+# Plots runs made with session resumption (run_sweep.py --resumption <ratio>). Each of those cells holds both
+# full and resumed handshakes, so the mean cost at any resumption rate r can be estimated as
+#   (1 - r) * mean(full) + r * mean(resumed)
+# and compared across algorithms: the signature / chain size penalty only applies to the full handshakes.
+
+# Cells to produce figures for
+allowed_values = {10}
+packet_loss_values = [0, 6, 12, 18]
+
+# Resumption rates the effective cost is evaluated at
+resumption_rates = np.linspace(0, 1, 11)
+
+def load_costs():
+    """
+    Mean full and resumed handshake time per (mode, value, latency, pkt_loss, resumption ratio) and algorithm, from
+    every cell tagged with a resumption ratio alone.
+    """
+
+    costs = {}
+    for meta in iter_cells():
+        # NOTE: cells with other tags as well (group, chain, relay backend, ...) aren't comparable with these
+        if set(meta.get('tags', {})) != {'resumption'}:
+            continue
+        value = int(float(meta['value']))
+        if value not in allowed_values or meta['pkt_loss'] not in packet_loss_values:
+            continue
+
+        columns = read_columns(meta, ['handshake_ms', 'resumed'])
+        if columns['resumed'] is None:
+            continue
+        timings = np.asarray(columns['handshake_ms'])
+        resumed = np.asarray(columns['resumed']).astype(bool)
+        if resumed.all() or not resumed.any():
+            continue
+
+        key = (meta['mode'], value, meta['latency'], meta['pkt_loss'], meta['tags']['resumption'])
+        costs.setdefault(key, {})[meta['sig_alg']] = (timings[~resumed].mean(), timings[resumed].mean())
+    return costs
+
+def plot_effective_cost(mode, value, latency, pkt_loss, ratio, alg_costs):
+    plt.figure(figsize=(8, 5))
+
+    for sig_alg, (full_ms, resumed_ms) in sorted(alg_costs.items()):
+        effective = (1 - resumption_rates) * full_ms + resumption_rates * resumed_ms
+        plt.plot(resumption_rates * 100, effective, 'o-', label=sig_alg, linewidth=2, markersize=5, alpha=0.8)
+
+    plt.xlabel('Resumed Handshakes (%)', fontsize=14)
+    plt.ylabel('Mean Handshake Time (ms)', fontsize=14)
+    plt.title(f'Effective Handshake Cost ({mode} = {value}, {latency}, {pkt_loss:g}% loss)', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=10, loc='upper right')
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/resumption{ratio}_{mode}{value}_latency{latency}_loss{pkt_loss:g}.png")
+    plt.close()
+
+def main():
+    costs = load_costs()
+    if not costs:
+        print("No resumption results found - run the sweep with --resumption first")
+        return
+
+    for (mode, value, latency, pkt_loss, ratio), alg_costs in sorted(costs.items()):
+        plot_effective_cost(mode, value, latency, pkt_loss, ratio, alg_costs)
+
+if __name__ == '__main__':
+    main()
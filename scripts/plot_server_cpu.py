@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from aggregate import load_summary
+
+# Server CPU cost of a handshake per algorithm, from the nginx CPU time sampled around every cell of a sweep.
+# Prints the CPU time per handshake and the cores needed to sustain a few target handshake rates, and plots
+# the CPU time per handshake against packet loss (retransmissions and longer-lived connections cost CPU too).
+
+# initcwnd value to report on
+initcwnd = 10
+
+# Handshakes/sec the core counts are worked out for
+target_rates = [1000, 10000]
+
+def print_cores(summary):
+    cells = summary[summary['pkt_loss'] == 0]
+    per_alg = cells.groupby('sig_alg')['server_cpu_us_per_handshake'].median().sort_values()
+
+    rate_headers = ''.join(f"{f'cores @ {rate}/s':>16}" for rate in target_rates)
+    print(f"{'sig_alg':<24} {'CPU µs/handshake':>16}{rate_headers}")
+    for sig_alg, cpu_us in per_alg.items():
+        cores = ''.join(f"{rate * cpu_us / 1e6:>16.2f}" for rate in target_rates)
+        print(f"{sig_alg:<24} {cpu_us:>16.0f}{cores}")
+
+def plot_cpu(summary):
+    plt.figure(figsize=(10, 6))
+    for sig_alg, cells in summary.groupby('sig_alg'):
+        cells = cells.sort_values(by='pkt_loss')
+        plt.plot(cells['pkt_loss'], cells['server_cpu_us_per_handshake'], 'o-', label=sig_alg, linewidth=2,
+                 markersize=5, alpha=0.8)
+
+    plt.xlabel('Packet Loss (%)', fontsize=14)
+    plt.ylabel('Server CPU per Handshake (µs)', fontsize=14)
+    plt.title(f'nginx CPU Time per Handshake (initcwnd = {initcwnd})', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=10, loc='upper left')
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/server_cpu_initcwnd{initcwnd}.png")
+    plt.close()
+
+def main():
+    summary = load_summary('initcwnd')
+    summary = summary[summary['value'] == initcwnd].dropna(subset=['server_cpu_us_per_handshake'])
+    summary['server_cpu_us_per_handshake'] = summary['server_cpu_us_per_handshake'].astype(np.float64)
+    if summary.empty:
+        print(f"No server CPU samples for initcwnd = {initcwnd} - rerun the sweep to record them")
+        return
+
+    print_cores(summary)
+    plot_cpu(summary)
+
+if __name__ == '__main__':
+    main()
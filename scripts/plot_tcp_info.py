@@ -0,0 +1,60 @@
+import os
+import matplotlib.pyplot as plt
+
+from results_store import load_frame
+
+# Plots the TCP_INFO columns recorded per handshake (run_sweep.py --records) against packet loss,
+# one line per signature algorithm, to help explain where performance cliffs come from.
+
+# initcwnd values to produce figures for
+allowed_initcwnds = {5, 10, 20, 40, 80}
+
+# Recorded TCP_INFO fields to plot, with their axis labels
+# NOTE: these are from the client socket, so total_retrans only counts the client's own retransmissions.
+# Retransmissions by the server show up as extra segments received.
+metrics = {
+    'segs_in': 'Segments Received (client)',
+    'total_retrans': 'Retransmissions (client)',
+    'rtt_us': 'Smoothed RTT (us)',
+    'bytes_received': 'Bytes Received (client)',
+}
+
+def plot_metric(records, metric, label, initcwnd):
+    subset = records[records['value'] == initcwnd]
+    if subset[metric].isna().all():
+        return
+
+    plt.figure(figsize=(8, 5))
+
+    means = subset.groupby(['sig_alg', 'pkt_loss'])[metric].mean()
+    for sig_alg in sorted(subset['sig_alg'].unique()):
+        series = means[sig_alg]
+        plt.plot(series.index, series.values, 'o-', label=sig_alg, linewidth=2, markersize=5, alpha=0.8)
+
+    plt.xlabel('Packet Loss (%)', fontsize=14)
+    plt.ylabel(f'Mean {label}', fontsize=14)
+    plt.title(f'{label} per Handshake (initcwnd = {initcwnd})', fontsize=16)
+    plt.grid(True, alpha=0.3)
+    plt.legend(fontsize=10, loc='upper left')
+    plt.xticks(list(range(0, 21, 2)))
+    plt.tight_layout()
+
+    os.makedirs("plots", exist_ok=True)
+    plt.savefig(f"plots/tcpinfo_{metric}_initcwnd{initcwnd}.png")
+    plt.close()
+
+def main():
+    # Only the TCP_INFO columns are read from each (untagged) cell
+    records = load_frame('initcwnd', columns=list(metrics), tags='')
+    records = records.dropna(subset=list(metrics), how='all')
+    if records.empty:
+        print("No per-handshake TCP_INFO found - run the sweep with --records first")
+        return
+    records['value'] = records['value'].astype(float).astype(int)
+
+    for initcwnd in sorted(allowed_initcwnds & set(records['value'].unique())):
+        for metric, label in metrics.items():
+            plot_metric(records, metric, label, initcwnd)
+
+if __name__ == '__main__':
+    main()
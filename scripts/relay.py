@@ -0,0 +1,302 @@
+### --- Imports --- ###
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import re
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+
+from lanes import pinned
+
+### --- Config --- ###
+
+# Each relay lane's settings file lives here, and is re-read by its relay for every new connection
+RELAY_DIR = os.path.join(tempfile.gettempdir(), f"pqtls_relay_{os.getuid()}")
+
+# Settings a relay starts with: no delay or loss, and the rate, MTU and initcwnd of the netem lanes
+RELAY_RATE_MBIT = 1000
+DEFAULT_SETTINGS = {
+    'delay_ms': 0.0,
+    'pkt_loss': 0.0,
+    'loss_model': 'random',
+    'burst_length': 1.0,
+    'rate_mbit': RELAY_RATE_MBIT,
+    'mtu': 1500,
+    'initcwnd': 10,
+}
+LOSS_MODELS = ['random', 'burst']
+
+# Bytes of IPv4 + TCP (with timestamps) headers per segment: the MSS is the MTU less these
+TCP_HEADER_BYTES = 52
+
+# Linux's minimum retransmission timeout (TCP_RTO_MIN)
+RTO_MIN_SECS = 0.2
+
+# Bytes read from a socket at a time
+READ_BYTES = 65536
+
+RELAY_START_TIMEOUT_SECS = 10
+
+def parse_delay(delay):
+    """
+    Delay in ms of a netem-style delay string, e.g. '20.000ms', '500us' or '0.1s'.
+    """
+
+    match = re.fullmatch(r'\s*([\d.]+)\s*(us|ms|s)?\s*', delay)
+    if not match:
+        raise ValueError(f"Can't parse delay {delay!r}")
+    scale = {'us': 1e-3, 'ms': 1, 's': 1e3}[match.group(2) or 'ms']
+    return float(match.group(1)) * scale
+
+### --- Link emulation --- ###
+
+class LossModel:
+    """
+    Decides which segments are lost: each independently at the given rate ('random', as netem's loss does),
+    or in bursts with a mean length of burst_length segments at the same long-run rate ('burst', a two-state
+    Gilbert model). Bursts hit consecutive segments, but a retransmission (sent an RTO later) is lost at the
+    long-run rate.
+    """
+
+    def __init__(self, pkt_loss, model='random', burst_length=1.0, rng=random):
+        self.rate = pkt_loss / 100
+        self.rng = rng
+        self.bad = False
+        self.leave_bad = None
+        if model == 'burst' and 0 < self.rate < 1:
+            self.leave_bad = 1 / max(burst_length, 1)
+            self.enter_bad = min(self.rate * self.leave_bad / (1 - self.rate), 1)
+
+    def lost(self, retransmission=False):
+        if self.leave_bad is None or retransmission:
+            return self.rng.random() < self.rate
+        self.bad = self.rng.random() >= self.leave_bad if self.bad else self.rng.random() < self.enter_bad
+        return self.bad
+
+class Path:
+    """
+    One direction of a relayed connection, emulating the link and the sending TCP's window on it. Each
+    segment's delivery time is worked out as it is read: it leaves once the sender's congestion window
+    (initcwnd segments at first, growing by one per acknowledged segment as in slow start) and the link rate
+    allow, and arrives one delay later. A lost segment is retransmitted after the retransmission timeout
+    (doubling each time it is lost again), and nothing overtakes it, as the receiver gets the stream in order.
+    NOTE: there is no fast retransmit or tail loss probe, so losses cost a full RTO as in the worst case
+    """
+
+    def __init__(self, settings, rng=random):
+        self.delay = settings['delay_ms'] / 1000
+        self.mss = settings['mtu'] - TCP_HEADER_BYTES
+        self.rate = settings['rate_mbit'] * 1e6 / 8 if settings['rate_mbit'] else None
+        self.cwnd = settings['initcwnd']
+        self.loss = LossModel(settings['pkt_loss'], settings['loss_model'], settings['burst_length'], rng)
+
+        # The RTT sampled from the connection's SYN sets the first RTO (srtt + 4 * rttvar, with rttvar = srtt / 2)
+        rtt = 2 * self.delay
+        self.rto = rtt + max(2 * rtt, RTO_MIN_SECS)
+
+        self.link_free = 0.0
+        self.delivered = 0.0
+        self.in_flight = collections.deque()  # when each unacknowledged segment's ACK reaches the sender
+
+    def serialise(self, length, at):
+        """
+        Time a segment sent at `at` has finished going onto the link, which it has to itself at the link rate.
+        """
+
+        if self.rate is None:
+            return at
+        self.link_free = max(at, self.link_free) + (length + TCP_HEADER_BYTES) / self.rate
+        return self.link_free
+
+    def schedule(self, length, now):
+        """
+        Delivery time of a segment of `length` bytes, read from the sender at `now`.
+        """
+
+        departure = now
+        while True:
+            while self.in_flight and self.in_flight[0] <= departure:
+                self.in_flight.popleft()
+                self.cwnd += 1
+            if len(self.in_flight) < self.cwnd:
+                break
+            departure = self.in_flight[0]
+
+        sent = self.serialise(length, departure)
+        timeout = self.rto
+        lost = self.loss.lost()
+        while lost:
+            sent += timeout
+            timeout *= 2
+            lost = self.loss.lost(retransmission=True)
+        self.delivered = max(self.delivered, sent + self.delay)
+        self.in_flight.append(self.delivered + self.delay)
+        return self.delivered
+
+### --- Relay --- ###
+
+async def pump(path, reader, writer):
+    """
+    Relay one direction of a connection: split what is read into segments, and write each out at its
+    delivery time. The write side is shut down once the read side ends and everything has been delivered.
+    """
+
+    loop = asyncio.get_running_loop()
+    deliveries = asyncio.Queue()
+
+    async def deliver():
+        while (delivery := await deliveries.get()) is not None:
+            at, segment = delivery
+            if at > loop.time():
+                await asyncio.sleep(at - loop.time())
+            writer.write(segment)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+
+    delivering = asyncio.create_task(deliver())
+    try:
+        while data := await reader.read(READ_BYTES):
+            now = loop.time()
+            for offset in range(0, len(data), path.mss):
+                segment = data[offset:offset + path.mss]
+                deliveries.put_nowait((path.schedule(len(segment), now), segment))
+    finally:
+        deliveries.put_nowait(None)
+        await delivering
+
+async def relay_connection(client_reader, client_writer, upstream, settings_path, rng):
+    """
+    Relay one client connection to the upstream server, with the settings current when it was accepted.
+    An error on either side (e.g. a reset) tears down both.
+    """
+
+    settings = read_settings(settings_path)
+    try:
+        server_reader, server_writer = await asyncio.open_connection(*upstream)
+    except OSError:
+        client_writer.close()
+        return
+
+    writers = [client_writer, server_writer]
+    for writer in writers:
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    pumps = [
+        asyncio.create_task(pump(Path(settings, rng), client_reader, server_writer)),
+        asyncio.create_task(pump(Path(settings, rng), server_reader, client_writer)),
+    ]
+    try:
+        await asyncio.wait(pumps, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        # NOTE: the relay is shutting down - returning rather than re-raising stops asyncio logging every open
+        # connection
+        pass
+    finally:
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+async def serve(listen, upstream, settings_path, seed=None):
+    rng = random.Random(seed)
+    server = await asyncio.start_server(
+        lambda reader, writer: relay_connection(reader, writer, upstream, settings_path, rng), *listen
+    )
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+
+    # The harness waits for this line before using the relay
+    print(f"Relaying {listen[0]}:{listen[1]} to {upstream[0]}:{upstream[1]}", flush=True)
+    async with server:
+        await stop.wait()
+
+### --- Control from the harness --- ###
+
+def relay_settings_path(lane):
+    return f"{RELAY_DIR}/lane{lane.index}.json"
+
+def read_settings(path):
+    """
+    A relay's current settings, falling back to the defaults for any not in its settings file.
+    """
+
+    try:
+        with open(path, 'r') as f:
+            return {**DEFAULT_SETTINGS, **json.load(f)}
+    except (OSError, ValueError):
+        return dict(DEFAULT_SETTINGS)
+
+def write_settings(path, settings):
+    """
+    Atomically replace a relay's settings file, so a relay never reads a half-written one.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(settings, f)
+    os.replace(f"{path}.tmp", path)
+
+def update_relay(lane, **changes):
+    """
+    Change some of the lane's relay settings (delay_ms, pkt_loss, mtu, initcwnd, ...). They apply from the
+    relay's next connection on.
+    """
+
+    print(f"{lane}: setting relay " + ", ".join(f"{name}={value}" for name, value in changes.items()))
+    path = relay_settings_path(lane)
+    write_settings(path, {**read_settings(path), **changes})
+
+def start_relay(lane, **settings):
+    """
+    Start the lane's relay (listening on the address its client connects to, and relaying to nginx) with the
+    given settings on top of the defaults, on the lane's relay CPUs if it is isolated. Returns once it is
+    listening.
+    """
+
+    write_settings(relay_settings_path(lane), {**DEFAULT_SETTINGS, **settings})
+    command = [sys.executable, os.path.abspath(__file__),
+               '--listen', f"{lane.connect_ip}:{lane.connect_port}",
+               '--upstream', f"{lane.server_ip}:{lane.server_port}",
+               '--settings', relay_settings_path(lane)]
+    command = pinned(command, lane.relay_cpus)
+    print(" > " + " ".join(command))
+    lane.relay_proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    ready, _, _ = select.select([lane.relay_proc.stdout], [], [], RELAY_START_TIMEOUT_SECS)
+    if not ready or not lane.relay_proc.stdout.readline():
+        stop_relay(lane)
+        raise RuntimeError(f"Timed out waiting for {lane} relay to start")
+
+def stop_relay(lane):
+    if lane.relay_proc is None:
+        return
+    lane.relay_proc.terminate()
+    lane.relay_proc.wait()
+    lane.relay_proc.stdout.close()
+    lane.relay_proc = None
+
+def split_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def main():
+    parser = argparse.ArgumentParser(description="Userspace TCP relay emulating delay, loss, rate, MTU and initcwnd")
+    parser.add_argument('--listen', type=split_address, required=True, help="host:port to accept connections on")
+    parser.add_argument('--upstream', type=split_address, required=True, help="host:port to relay them to")
+    parser.add_argument('--settings', required=True,
+                        help="JSON settings file, re-read for every connection (missing settings take their defaults)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the loss decisions (default: random)")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.listen, args.upstream, args.settings, args.seed))
+
+
+if __name__ == '__main__':
+    main()
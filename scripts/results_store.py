@@ -0,0 +1,345 @@
+### --- Imports --- ###
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+### --- Config --- ###
+
+# Root data directory relative to the repo root.
+# NOTE: each (mode, value, latency, sig_alg, pkt_loss) cell is stored as a directory in the format:
+# - <mode>=X/
+#   - latency=Y/
+#     - <sig_alg>[,<tag>=<value>...]/
+#       - loss=Z/
+#         - meta.json           (cell key, number of handshakes and column dtypes - written last)
+#         - <column>.npy        (one typed array per column, one row per handshake)
+# Cells can carry tags for run-wide settings that aren't part of the sweep grid (e.g. the session resumption
+# ratio), so that runs with different settings are stored side by side. Untagged cells are the default runs.
+# While a cell is being measured its records are appended to a spool file next to it (loss=Z.spool.jsonl), which
+# is turned into the columns once the cell is complete. A spool left by an interrupted run is picked up again.
+DATA_DIR = 'data'
+META_FILE = 'meta.json'
+SPOOL_SUFFIX = '.spool.jsonl'
+
+# Spooled records are fsynced to disk every SPOOL_SYNC_RECORDS records
+SPOOL_SYNC_RECORDS = 100
+
+# Columns stored as integers. Anything else numeric is stored as float64, with missing values as NaN
+INT_COLUMNS = {
+    'batch', 'index', 'attempt', 'concurrency', 'resumed', 'segs_in', 'segs_out', 'total_retrans', 'rtt_us', 'snd_cwnd', 'bytes_received',
+    'server_bytes', 'certificate_bytes', 'certificate_compressed'
+}
+
+### --- Writing --- ###
+
+def tag_string(tags):
+    """
+    Canonical string form of a cell's tags, e.g. 'resumption=0.5' ('' for an untagged cell).
+    """
+
+    return ','.join(f"{name}={value}" for name, value in sorted((tags or {}).items()))
+
+def parse_tags(tags):
+    """
+    Inverse of tag_string. Tag values are returned as strings.
+    """
+
+    return dict(part.split('=', 1) for part in tags.split(',') if part)
+
+def cell_dir(mode, value, latency_ms, sig_alg, pkt_loss, root=DATA_DIR, tags=None):
+    """
+    Directory a cell's columns are stored in.
+    """
+
+    sig_dir = ','.join(part for part in (sig_alg, tag_string(tags)) if part)
+    return os.path.join(root, f"{mode}={value}", f"latency={latency_ms}", sig_dir, f"loss={float(pkt_loss):g}")
+
+def to_columns(records):
+    """
+    Turn a list of per-handshake record dicts into typed numpy columns.
+    """
+
+    names = []
+    for record in records:
+        names.extend(name for name in record if name not in names)
+
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        if name in INT_COLUMNS and all(value is not None for value in values):
+            columns[name] = np.asarray(values, dtype=np.int64)
+        else:
+            columns[name] = np.asarray([np.nan if value is None else value for value in values], dtype=np.float64)
+    return columns
+
+def write_cell(mode, value, latency_ms, sig_alg, pkt_loss, records, meta=None, root=DATA_DIR, tags=None):
+    """
+    Write one cell's per-handshake records as columns, replacing any previous copy of the cell.
+    """
+
+    return write_columns(mode, value, latency_ms, sig_alg, pkt_loss, to_columns(records), meta, root, tags)
+
+def write_columns(mode, value, latency_ms, sig_alg, pkt_loss, columns, meta=None, root=DATA_DIR, tags=None):
+    """
+    Write one cell's typed columns, replacing any previous copy of the cell.
+    The cell is built in a temporary directory and renamed into place, so readers never see a partial cell.
+    """
+
+    path = cell_dir(mode, value, latency_ms, sig_alg, pkt_loss, root, tags)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, column in columns.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), column)
+
+    cell_meta = {
+        'mode': mode,
+        'value': value,
+        'latency': latency_ms,
+        'sig_alg': sig_alg,
+        'pkt_loss': float(pkt_loss),
+        'tags': tags or {},
+        'samples': len(next(iter(columns.values()), [])),
+        'columns': {name: str(column.dtype) for name, column in columns.items()},
+        'written': datetime.now(timezone.utc).isoformat(),
+    }
+    cell_meta.update(meta or {})
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump(cell_meta, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def read_spool(path):
+    """
+    Yield the records of a spool file. A torn final line (e.g. from a crash mid-write) is skipped.
+    """
+
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def failed(record):
+    """
+    Whether a record is of a failed handshake attempt rather than a measurement.
+    """
+
+    return record.get('status', 'ok') != 'ok'
+
+def spool_columns(path):
+    """
+    Typed columns of the successful records in a spool file, and the number of failed attempts per
+    '<stage>: <error>'. The file is read twice (once for the column names and row count, once to fill the
+    columns) so only the columns themselves are held in memory.
+    """
+
+    names = []
+    rows = 0
+    failures = {}
+    for record in read_spool(path):
+        if failed(record):
+            reason = f"{record.get('stage')}: {record.get('error')}"
+            failures[reason] = failures.get(reason, 0) + 1
+            continue
+        names.extend(name for name in record if name not in names and name != 'status')
+        rows += 1
+
+    columns = {name: np.full(rows, np.nan) for name in names}
+    row = 0
+    for record in read_spool(path):
+        if failed(record):
+            continue
+        if row == rows:
+            break
+        for name, value in record.items():
+            if name in columns and value is not None:
+                columns[name][row] = value
+        row += 1
+
+    for name in names:
+        if name in INT_COLUMNS and not np.isnan(columns[name]).any():
+            columns[name] = columns[name].astype(np.int64)
+    return columns, failures
+
+class CellWriter:
+    """
+    Writes one cell incrementally: each record is appended to the cell's spool file as it arrives, so memory
+    stays flat and an interrupted cell keeps the records measured so far. commit() turns the spool into the
+    cell's columns. Successful handshakes become rows; failed attempts are only counted.
+    """
+
+    def __init__(self, mode, value, latency_ms, sig_alg, pkt_loss, root=DATA_DIR, tags=None):
+        self.key = (mode, value, latency_ms, sig_alg, pkt_loss)
+        self.root = root
+        self.tags = tags
+        self.spool_path = cell_dir(mode, value, latency_ms, sig_alg, pkt_loss, root, tags) + SPOOL_SUFFIX
+        self.file = None
+        self.unsynced = 0
+
+    def records(self):
+        """
+        Yield the records already spooled, e.g. by an interrupted run.
+        """
+
+        self.sync()
+        return read_spool(self.spool_path)
+
+    def append(self, record):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            self.file = open(self.spool_path, 'a+')
+            # Drop a torn final line so the next record starts on a fresh line
+            self.file.seek(0)
+            content = self.file.read()
+            if content and not content.endswith('\n'):
+                self.file.truncate(len(content[:content.rfind('\n') + 1].encode()))
+
+        self.file.write(json.dumps(record) + '\n')
+        self.unsynced += 1
+        if self.unsynced >= SPOOL_SYNC_RECORDS:
+            self.sync()
+
+    def sync(self):
+        if self.file is not None and self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        self.sync()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """
+        Throw away any spooled records, starting the cell afresh.
+        """
+
+        self.close()
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+    def columns(self):
+        """
+        The spooled records as typed columns, and the failed attempt count per error (see spool_columns).
+        """
+
+        self.sync()
+        return spool_columns(self.spool_path)
+
+    def commit(self, columns, meta=None):
+        """
+        Write the cell's columns (from columns()) and remove the spool.
+        """
+
+        path = write_columns(*self.key, columns, meta, self.root, self.tags)
+        self.discard()
+        return path
+
+### --- Loading --- ###
+
+def iter_cell_paths(mode=None, root=DATA_DIR):
+    """
+    Yield the directory of every complete cell under root (optionally only for one experiment mode),
+    without reading any cell files.
+    """
+
+    if not os.path.isdir(root):
+        return
+
+    for value_dir in sorted(os.listdir(root)):
+        if '=' not in value_dir or (mode and not value_dir.startswith(f"{mode}=")):
+            continue
+        value_path = os.path.join(root, value_dir)
+        if not os.path.isdir(value_path):
+            continue
+
+        for latency_dir in sorted(os.listdir(value_path)):
+            latency_path = os.path.join(value_path, latency_dir)
+            if not latency_dir.startswith('latency=') or not os.path.isdir(latency_path):
+                continue
+
+            for sig_alg in sorted(os.listdir(latency_path)):
+                sig_path = os.path.join(latency_path, sig_alg)
+                if not os.path.isdir(sig_path):
+                    continue
+
+                for loss_dir in sorted(os.listdir(sig_path)):
+                    path = os.path.join(sig_path, loss_dir)
+                    if not loss_dir.endswith('.tmp') and os.path.exists(os.path.join(path, META_FILE)):
+                        yield path
+
+def read_meta(path):
+    """
+    Read a cell's metadata. The returned dict also carries the cell's 'path'.
+    """
+
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+    meta['path'] = path
+    return meta
+
+def iter_cells(mode=None, root=DATA_DIR, tags=None):
+    """
+    Yield the metadata of every complete cell under root (optionally only for one experiment mode, and only
+    with the given tag string - '' for untagged cells). Each metadata dict also carries the cell's 'path'.
+    """
+
+    for path in iter_cell_paths(mode, root):
+        meta = read_meta(path)
+        if tags is None or tag_string(meta.get('tags')) == tags:
+            yield meta
+
+def read_column(meta, column, mmap=True):
+    """
+    Read one column of a cell (memory-mapped by default), or None if the cell doesn't have it.
+    """
+
+    if column not in meta['columns']:
+        return None
+    return np.load(os.path.join(meta['path'], f"{column}.npy"), mmap_mode='r' if mmap else None)
+
+def read_columns(meta, columns, mmap=True):
+    """
+    Read the requested columns of a cell. Only those columns' files are touched.
+    """
+
+    return {column: read_column(meta, column, mmap) for column in columns}
+
+def load_frame(mode=None, columns=('handshake_ms',), root=DATA_DIR, tags=None):
+    """
+    Load the requested columns of every cell into one pandas DataFrame, one row per handshake, along with
+    the cell key columns (mode, value, latency, sig_alg, pkt_loss, tags). Cells without a column get NaN for it.
+    """
+
+    import pandas as pd
+
+    frames = []
+    for meta in iter_cells(mode, root, tags):
+        data = {}
+        for column in columns:
+            values = read_column(meta, column)
+            data[column] = values if values is not None else np.full(meta['samples'], np.nan)
+        frame = pd.DataFrame(data)
+        for key in ('mode', 'value', 'latency', 'sig_alg', 'pkt_loss'):
+            frame[key] = meta[key]
+        frame['tags'] = tag_string(meta.get('tags'))
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=list(columns) + ['mode', 'value', 'latency', 'sig_alg', 'pkt_loss', 'tags'])
+    return pd.concat(frames, ignore_index=True)
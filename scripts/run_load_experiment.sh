@@ -0,0 +1,41 @@
+#!/bin/bash
+set -ex
+
+### --- Setting variables --- ###
+
+# Paths
+ROOT_DIR=$(pwd)
+FINAL_BUILD_DIR="${ROOT_DIR}/provider_build"
+NGINX_APP="${FINAL_BUILD_DIR}/nginx/sbin/nginx"
+NGINX_CONF_DIR="${FINAL_BUILD_DIR}/nginx/conf"
+OPENSSL_BIN="${FINAL_BUILD_DIR}/bin/openssl"
+
+# Inherited env vars (saves passing around provider paths all the time)
+export OPENSSL_CONF="${FINAL_BUILD_DIR}/ssl/openssl.cnf"
+export OPENSSL_MODULES="${FINAL_BUILD_DIR}/lib"
+
+# Arguments are passed through to run_sweep.py (e.g. --concurrency 1,4,16,64 --duration 5).
+# NOTE: this always runs on the first lane only, since concurrent lanes would compete for the server's CPU
+
+### --- Setup --- ###
+
+# TCP configuration (in every lane's client namespace)
+for CLIENT_NS in $(ip netns list | awk '/^client_namespace/ {print $1}'); do
+    ip netns exec "${CLIENT_NS}" sysctl net.ipv4.tcp_no_metrics_save=1
+done
+
+# Build C handshake executable (will be run from the client namespace)
+cd src
+cmake -B build && cmake --build build
+cd ..
+
+# Sanity check that the provider is available
+$OPENSSL_BIN list -providers -verbose
+
+### --- Experiment logic --- ###
+
+# Loop over all nginx worker_processes values and signature algorithms, ramping the number of concurrent
+# handshakes for each. Completed cells are recorded in data/manifest.jsonl, so re-running resumes where it left off
+python3 scripts/run_sweep.py load "$@"
+
+exit
@@ -0,0 +1,749 @@
+### --- Imports --- ###
+
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from isolation import SERVER_CPUS, cpu_assignment, isolate_lanes
+from lanes import BACKENDS, make_lanes, pinned
+from planner import (
+    CHAIN_VARIANTS, DEFAULT_CHAIN, KEM_GROUPS, SIG_ALGS,
+    chain_name, estimate_runtime, format_secs, plan
+)
+from aggregate import update_index
+from relay import LOSS_MODELS, RELAY_RATE_MBIT, start_relay, stop_relay, update_relay
+from results_store import CellWriter, failed, parse_tags, tag_string
+from surrogate import SURROGATE_ROUNDS, SURROGATE_TOLERANCE, select_cells, write_predictions
+from telemetry import EVENTS_PATH, Telemetry
+from time_handshakes import (
+    TIMERS,
+    ADAPTIVE_CI_WIDTH, ADAPTIVE_MAX_SAMPLES, ADAPTIVE_MIN_SAMPLES,
+    LOAD_CONCURRENCY, LOAD_DURATION_SECS,
+    WorkerPool, measure_load, measure_loss, measure_loss_adaptive, run_subprocess, set_netem, summarise,
+    summarise_columns, summarise_failures
+)
+
+### --- Config --- ###
+
+ROOT_DIR = os.getcwd()
+FINAL_BUILD_DIR = f"{ROOT_DIR}/provider_build"
+NGINX_APP = f"{FINAL_BUILD_DIR}/nginx/sbin/nginx"
+NGINX_CONF_DIR = f"{FINAL_BUILD_DIR}/nginx/conf"
+NGINX_LOGS_DIR = f"{FINAL_BUILD_DIR}/nginx/logs"
+NGINX_TEMPLATE = f"{ROOT_DIR}/nginx.conf"
+NGINX_SERVER_TEMPLATE = f"{ROOT_DIR}/nginx_server.conf"
+
+# The algorithms, groups and (value, latency, loss) cells swept are declared in planner.py
+
+MANIFEST_PATH = "data/manifest.jsonl"
+
+# nginx start / reload / stop is waited for by polling its processes every NGINX_POLL_SECS, up to a timeout
+NGINX_POLL_SECS = 0.05
+NGINX_TIMEOUT_SECS = 30
+
+# Clock ticks per second of the CPU times in /proc/<pid>/stat
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# Guards the manifest file and the in-memory set of completed cells, shared by all lane threads
+MANIFEST_LOCK = threading.Lock()
+
+def cell_key(mode, value, latency_ms, sig_alg, pkt_loss, tags=None):
+    """
+    Key uniquely identifying one (mode, value, latency, sig_alg, pkt_loss) cell of a sweep, along with any
+    run-wide tags (e.g. the resumption ratio).
+    """
+
+    return (mode, str(value), latency_ms, sig_alg, float(pkt_loss), tag_string(tags))
+
+### --- Manifest --- ###
+
+def load_manifest(path):
+    """
+    Read the set of completed cell keys from the manifest.
+    A torn final line (e.g. from a crash mid-write) is ignored, so that cell will be redone.
+    """
+
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, 'r+') as f:
+        content = f.read()
+        for line in content.splitlines(keepends=True):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            completed.add(cell_key(entry['mode'], entry['value'], entry['latency'],
+                                   entry['sig_alg'], entry['pkt_loss'], entry.get('tags')))
+
+        # Drop the torn line so the next record starts on a fresh line
+        if content and not content.endswith('\n'):
+            f.truncate(len(content[:content.rfind('\n') + 1].encode()))
+    return completed
+
+def record_cell(path, mode, value, latency_ms, sig_alg, pkt_loss, samples, stats=None, tags=None):
+    """
+    Durably append a completed cell (along with any summary statistics, e.g. the final CIs) to the manifest.
+    """
+
+    entry = {
+        'mode': mode,
+        'value': str(value),
+        'latency': latency_ms,
+        'sig_alg': sig_alg,
+        'pkt_loss': pkt_loss,
+        'tags': tags or {},
+        'samples': samples,
+        'finished': datetime.now(timezone.utc).isoformat(),
+    }
+    entry.update(stats or {})
+    with MANIFEST_LOCK, open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+### --- Network and server configuration --- ###
+
+def set_initcwnd(lane, initcwnd):
+    """
+    Set the initcwnd of the lane's veth routes (or of the TCP senders its relay emulates).
+    NOTE: I set them on both the client and the server here but the server is the one it matters for
+    """
+
+    if lane.relay:
+        update_relay(lane, initcwnd=initcwnd)
+        return
+    print(f"{lane}: setting initcwnd value to: {initcwnd}")
+    run_subprocess(['ip', 'netns', 'exec', lane.client_ns, 'ip', 'route', 'change', lane.subnet,
+                    'dev', lane.client_veth, 'proto', 'kernel', 'scope', 'link', 'src', lane.client_ip,
+                    'initcwnd', str(initcwnd)])
+    run_subprocess(['ip', 'netns', 'exec', lane.server_ns, 'ip', 'route', 'change', lane.subnet,
+                    'dev', lane.server_veth, 'proto', 'kernel', 'scope', 'link', 'src', lane.server_ip,
+                    'initcwnd', str(initcwnd)])
+
+def set_mtu(lane, mtu):
+    """
+    Set the MTU of both of the lane's veths (or the segment size its relay emulates).
+    """
+
+    if lane.relay:
+        update_relay(lane, mtu=mtu)
+        return
+    print(f"{lane}: setting MTU value to: {mtu}")
+    run_subprocess(['ip', 'netns', 'exec', lane.client_ns, 'ip', 'link', 'set', 'dev', lane.client_veth,
+                    'mtu', str(mtu)])
+    run_subprocess(['ip', 'netns', 'exec', lane.server_ns, 'ip', 'link', 'set', 'dev', lane.server_veth,
+                    'mtu', str(mtu)])
+
+def nginx_conf_path(lane):
+    """
+    Path of the nginx config rendered for the given lane.
+    """
+
+    return f"{NGINX_CONF_DIR}/nginx_lane{lane.index}.conf"
+
+def nginx_pid_path(lane):
+    """
+    Path of the lane's nginx master pid file.
+    """
+
+    return f"{NGINX_LOGS_DIR}/nginx_lane{lane.index}.pid"
+
+def render_nginx_conf(lane, worker_processes='auto', group=None):
+    """
+    Render the lane's nginx config: one HTTPS server per signature algorithm and way of delivering its
+    certificate chain, each serving that chain to clients that send its name (see planner.chain_name) as the
+    SNI server name. Chains gen_certs.sh hasn't installed are left out, apart from the default ones.
+    """
+
+    with open(NGINX_SERVER_TEMPLATE, 'r') as f:
+        server_template = f.read()
+    servers = []
+    for sig_alg in SIG_ALGS:
+        for chain in CHAIN_VARIANTS:
+            name = chain_name(sig_alg, chain)
+            if chain != DEFAULT_CHAIN and not os.path.exists(f'{NGINX_CONF_DIR}/certs/{name}_fullchain.crt'):
+                continue
+            server = server_template.replace('??SERVER_NAME??', name)
+            server = server.replace('??SERVER_CERT??', f'certs/{name}_fullchain.crt')
+            server = server.replace('??SERVER_KEY??', f'certs/{name}_server.key')
+            servers.append(server.replace('??SERVER_ADDR??', f'{lane.server_ip}:{lane.server_port}'))
+
+    with open(NGINX_TEMPLATE, 'r') as f:
+        conf = f.read()
+    conf = conf.replace('??SSL_SERVERS??', '\n'.join(servers))
+    conf = conf.replace('??HTTP_LISTEN??', lane.http_listen)
+    conf = conf.replace('??PID_FILE??', nginx_pid_path(lane))
+    conf = conf.replace('??ERROR_LOG??', f'logs/error_lane{lane.index}.log')
+    conf = conf.replace('??WORKER_PROCESSES??', str(worker_processes))
+    conf = conf.replace('??KEM_GROUPS??', group or 'auto')
+    with open(nginx_conf_path(lane), 'w') as f:
+        f.write(conf)
+
+def nginx_master(lane):
+    """
+    PID of the lane's running nginx master process, or None if it isn't running.
+    """
+
+    try:
+        with open(nginx_pid_path(lane), 'r') as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    return pid if os.path.exists(f"/proc/{pid}") else None
+
+def nginx_workers(master_pid):
+    """
+    PIDs of the worker processes of an nginx master (its child processes).
+    """
+
+    workers = set()
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # The ppid is the 2nd field after the command name, which is in brackets and may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            workers.add(int(entry))
+    return workers
+
+def process_cpu_us(pid):
+    """
+    CPU time (µs) a process has used so far, or None if it has exited. Read from /proc/<pid>/schedstat (ns
+    on the CPU), falling back to the user + system clock ticks in /proc/<pid>/stat on kernels without schedstats.
+    NOTE: schedstat only covers the process's main thread, which is fine for nginx's single-threaded workers
+    """
+
+    try:
+        with open(f"/proc/{pid}/schedstat", 'r') as f:
+            return int(f.read().split()[0]) / 1000
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            # utime and stime are the 12th and 13th fields after the bracketed command name
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS * 1e6
+    except (OSError, IndexError, ValueError):
+        return None
+
+def nginx_cpu_us(lane):
+    """
+    CPU time (µs) used so far by each of the lane's nginx processes (master and workers), keyed by pid.
+    """
+
+    master = nginx_master(lane)
+    if master is None:
+        return {}
+    usage = {pid: process_cpu_us(pid) for pid in nginx_workers(master) | {master}}
+    return {pid: cpu_us for pid, cpu_us in usage.items() if cpu_us is not None}
+
+def cpu_used_us(before, after):
+    """
+    CPU time (µs) used between two nginx_cpu_us snapshots. Processes started in between count in full, and
+    those that exited in between are lost.
+    """
+
+    return sum(cpu_us - before.get(pid, 0) for pid, cpu_us in after.items())
+
+def wait_for(condition, what):
+    """
+    Poll until condition() is true, rather than sleeping for a fixed time.
+    """
+
+    deadline = time.monotonic() + NGINX_TIMEOUT_SECS
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for {what}")
+        time.sleep(NGINX_POLL_SECS)
+
+def start_nginx(lane, worker_processes='auto', group=None):
+    """
+    Start the lane's nginx instance in its server namespace (or on loopback), serving every algorithm. Returns once the
+    workers are up (the listening socket exists before the pid file is written, so connections queue until then).
+    An isolated lane's nginx is pinned to its server CPUs, which the workers (including those started by a
+    reload) inherit from the master.
+    """
+
+    render_nginx_conf(lane, worker_processes, group)
+    run_subprocess(pinned(lane.server_command([NGINX_APP, '-c', nginx_conf_path(lane)]), lane.server_cpus))
+    wait_for(lambda: nginx_master(lane) and nginx_workers(nginx_master(lane)), f"{lane} nginx to start")
+
+def reload_nginx(lane, worker_processes='auto', group=None):
+    """
+    Gracefully reload the lane's nginx with new settings. Returns once every old worker has exited, so all
+    further handshakes are served with the new configuration.
+    """
+
+    master = nginx_master(lane)
+    old_workers = nginx_workers(master)
+    render_nginx_conf(lane, worker_processes, group)
+    run_subprocess(lane.server_command([NGINX_APP, '-c', nginx_conf_path(lane), '-s', 'reload']))
+    wait_for(lambda: nginx_workers(master) and not (nginx_workers(master) & old_workers),
+             f"{lane} nginx to reload")
+
+def stop_nginx(lane):
+    """
+    Stop the lane's nginx instance and remove its rendered config.
+    """
+
+    run_subprocess(lane.server_command([NGINX_APP, '-c', nginx_conf_path(lane), '-s', 'stop']))
+    wait_for(lambda: nginx_master(lane) is None, f"{lane} nginx to stop")
+    os.remove(nginx_conf_path(lane))
+
+def check_lanes(lanes):
+    """
+    Make sure every namespace lane's namespaces exist and no nginx instance is left over from a previous run.
+    """
+
+    namespaces = [] if all(lane.relay for lane in lanes) else run_subprocess(['ip', 'netns', 'list']).split()
+    for lane in lanes:
+        if not lane.relay and (lane.server_ns not in namespaces or lane.client_ns not in namespaces):
+            raise SystemExit(f"Namespaces for {lane} not found - run setup_namespaces.sh with at least {len(lanes)} lanes")
+
+        if os.path.exists(nginx_conf_path(lane)):
+            try:
+                stop_nginx(lane)
+            except Exception as e:
+                print(f"{lane}: could not stop leftover nginx ({e})")
+                os.remove(nginx_conf_path(lane))
+
+### --- Sweep logic --- ###
+
+def sweep_tags(args, group=None, chain=DEFAULT_CHAIN):
+    """
+    Tags identifying a cell's key exchange group, certificate chain delivery and the run-wide settings of this
+    sweep in the results store and manifest. Relay cells are tagged as such (and with any non-default loss
+    model or rate), so they can be compared with netem's rather than mixed in.
+    """
+
+    tags = {}
+    if args.backend == 'relay':
+        tags['backend'] = 'relay'
+        if args.relay_loss_model != 'random':
+            tags['loss_model'] = f"{args.relay_loss_model}{args.relay_burst_length:g}"
+        if args.relay_rate != RELAY_RATE_MBIT:
+            tags['rate'] = f"{args.relay_rate:g}mbit"
+
+    if group:
+        tags['group'] = group
+    if chain != DEFAULT_CHAIN:
+        tags['chain'] = chain
+    if args.compress_certs:
+        tags['cert_compression'] = 'on'
+    if args.resumption:
+        tags['resumption'] = args.resumption
+    return tags
+
+def measure_cell(lane, mode, cell, timer_pool, writer, telemetry, args):
+    """
+    Measure one cell, streaming its per-handshake records to the cell's writer (and counting them in the sweep's
+    telemetry) as they arrive.
+    Records spooled by an earlier (interrupted) attempt count towards the cell, so only the rest are measured.
+    The lane's netem qdiscs must already be set for the cell. Returns the summary statistics stored with it,
+    including (outside load mode) the CPU time nginx spent per handshake completed by this attempt.
+    """
+
+    server_name = chain_name(cell.sig_alg, cell.chain)
+    if mode == "load":
+        # A concurrency ramp can't be resumed part way, so it always starts afresh
+        writer.discard()
+        records, levels = measure_load(server_name, cell.latency_ms, args.concurrency, args.duration, lane=lane,
+                                       group=cell.group, netem=False)
+        for record in records:
+            writer.append(record)
+            telemetry.record(lane, record)
+        peak = max(levels, key=lambda level: level['handshakes_per_sec'])
+        return {'levels': levels, 'peak_handshakes_per_sec': peak['handshakes_per_sec'],
+                'peak_concurrency': peak['concurrency']}
+
+    done = []
+    batch = 0
+    for record in writer.records():
+        batch = max(batch, record.get('batch', 0) + 1)
+        if not failed(record):
+            done.append(record['handshake_ms'])
+    if done:
+        print(f"{lane}: resuming cell with {len(done)} handshakes already measured")
+
+    # The lane's nginx serves nothing but this lane's client, so all of its CPU time goes to these handshakes
+    cpu_before = nginx_cpu_us(lane)
+
+    if args.adaptive:
+        records = measure_loss_adaptive(server_name, timer_pool, cell.pkt_loss, cell.latency_ms,
+                                        ci_width=args.ci_width, min_samples=args.min_samples,
+                                        max_samples=args.max_samples, lane=lane, detailed=args.records,
+                                        resumption=args.resumption, group=cell.group, netem=False, done=done,
+                                        batch=batch, compress=args.compress_certs, timers=args.timers)
+    else:
+        # The loss schedule's measurements are per default timer, so the cell's total stays the same with --timers
+        remaining = math.ceil((cell.measurements * TIMERS - len(done)) / args.timers)
+        records = measure_loss(server_name, timer_pool, cell.pkt_loss, cell.latency_ms, remaining, lane=lane,
+                               detailed=args.records, resumption=args.resumption, group=cell.group,
+                               netem=False, batch=batch, compress=args.compress_certs,
+                               timers=args.timers) if remaining > 0 else []
+    handshakes = 0
+    for record in records:
+        writer.append(record)
+        telemetry.record(lane, record)
+        if not failed(record):
+            handshakes += 1
+
+    server_cpu_us = cpu_used_us(cpu_before, nginx_cpu_us(lane))
+    return {
+        'server_cpu_us': server_cpu_us,
+        'server_handshakes': handshakes,
+        'server_cpu_us_per_handshake': server_cpu_us / handshakes if handshakes else None,
+    }
+
+def run_cell(lane, mode, cell, timer_pool, completed, telemetry, args):
+    """
+    Measure one cell on the given lane (retrying on failure) and write it to the results store. Returns whether
+    it completed.
+    Records are spooled to disk as they arrive, so a retry (or the next run, if every attempt fails) carries
+    on from where the cell got to. Failed handshake attempts are left out of the columns, but their rate and
+    errors are stored with the cell's statistics.
+    With --records, the per-handshake records (phase timings, TCP_INFO) are stored as extra columns. With
+    --compress-certs, a cell is discarded rather than stored unless every certificate chain came compressed.
+    """
+
+    tags = sweep_tags(args, cell.group, cell.chain)
+    key = cell_key(mode, cell.value, cell.latency_ms, cell.sig_alg, cell.pkt_loss, tags)
+    writer = CellWriter(mode, cell.value, cell.latency_ms, cell.sig_alg, cell.pkt_loss, tags=tags)
+    try:
+        for attempt in range(args.retries + 1):
+            try:
+                stats = measure_cell(lane, mode, cell, timer_pool, writer, telemetry, args)
+                columns, failures = writer.columns()
+                if not len(columns.get('handshake_ms', [])) and mode != "load":
+                    raise RuntimeError("no handshakes succeeded")
+                break
+            except Exception as e:
+                print(f"{lane}: cell {key} failed (attempt {attempt + 1}/{args.retries + 1}): {e}")
+        else:
+            print(f"{lane}: giving up on cell {key} - it will be resumed on the next run")
+            return False
+
+        samples = len(next(iter(columns.values()), []))
+        if 'handshake_ms' in columns:
+            stats.update(summarise(columns['handshake_ms'].tolist()))
+        stats.update(summarise_columns(columns))
+        if args.compress_certs and stats.get('compressed_fraction', 0) < 1:
+            # NOTE: nginx compresses only if its OpenSSL loads a compression library at runtime (zlib-dynamic), so
+            # a cell tagged for compression can't be trusted to have been
+            print(f"{lane}: cell {key} received {stats.get('compressed_fraction', 0):.0%} of its certificate chains "
+                  f"compressed despite --compress-certs (can the server's OpenSSL load zlib?) - discarding it")
+            writer.discard()
+            return False
+        stats.update(summarise_failures(failures, samples))
+        stats['cpu_assignment'] = cpu_assignment(lane, args.timers)
+
+        # The cell is written atomically (replacing any copy left by an interrupted run) before it is
+        # recorded as complete
+        writer.commit(columns, meta=stats)
+    finally:
+        writer.close()
+
+    record_cell(args.manifest, mode, cell.value, cell.latency_ms, cell.sig_alg, cell.pkt_loss, samples,
+                stats=stats, tags=tags)
+    with MANIFEST_LOCK:
+        completed.add(key)
+    return True
+
+def run_lane(lane, jobs, timer_pool, completed, telemetry, args):
+    """
+    Run jobs on one lane, timing handshakes with the lane's own persistent workers if requested. A relay lane's
+    relay runs for as long as the lane does.
+    """
+
+    if lane.relay:
+        start_relay(lane, loss_model=args.relay_loss_model, burst_length=args.relay_burst_length,
+                    rate_mbit=args.relay_rate)
+    if args.persistent:
+        timer_pool = WorkerPool(lane, size=args.timers, records=args.records, resumption=args.resumption,
+                                compress=args.compress_certs)
+
+    try:
+        run_lane_jobs(lane, jobs, timer_pool, completed, telemetry, args)
+    finally:
+        if args.persistent:
+            timer_pool.close()
+        if lane.relay:
+            stop_relay(lane)
+
+def run_lane_jobs(lane, jobs, timer_pool, completed, telemetry, args):
+    """
+    Worker loop for one lane: pull cells off the shared queue (in planned order) until it is empty.
+    Each of the lane's settings is only changed when the next cell needs a different one: the route / MTU,
+    nginx (one instance serves every algorithm for the whole run, and is only reloaded when the
+    worker_processes or key exchange group settings change) and the netem qdiscs. The telemetry is kept up to
+    date with the lane's settings and each cell's outcome.
+    """
+
+    route = None
+    server = None
+    netem = None
+    try:
+        while True:
+            try:
+                cell = jobs.get_nowait()
+            except queue.Empty:
+                return
+
+            telemetry.cell_started(lane, cell)
+            try:
+                if route != (cell.initcwnd, cell.mtu):
+                    if cell.mtu is not None:
+                        set_mtu(lane, cell.mtu)
+                    if cell.initcwnd is not None:
+                        set_initcwnd(lane, cell.initcwnd)
+                    route = (cell.initcwnd, cell.mtu)
+                    telemetry.lane_settings(lane, initcwnd=cell.initcwnd, mtu=cell.mtu)
+
+                # (Re)started if this is the first cell or it has died. An isolated lane runs a worker per server CPU
+                worker_processes = len(lane.server_cpus) if lane.server_cpus else 'auto'
+                settings = (cell.value if args.mode == "load" else worker_processes, cell.group)
+                if server is None or nginx_master(lane) is None:
+                    start_nginx(lane, *settings)
+                elif server != settings:
+                    reload_nginx(lane, *settings)
+                server = settings
+
+                if netem != (cell.latency_ms, cell.pkt_loss):
+                    set_netem(lane, cell.pkt_loss, cell.latency_ms)
+                    netem = (cell.latency_ms, cell.pkt_loss)
+                    telemetry.lane_settings(lane, latency_ms=cell.latency_ms, pkt_loss=cell.pkt_loss)
+
+                completed_cell = run_cell(lane, args.mode, cell, timer_pool, completed, telemetry, args)
+                telemetry.cell_finished(lane, cell, completed_cell)
+            except Exception as e:
+                route = netem = None
+                print(f"{lane}: cell {cell} failed, it will be retried on the next run: {e}")
+                telemetry.cell_finished(lane, cell, False, error=str(e))
+    finally:
+        if nginx_master(lane) is not None:
+            stop_nginx(lane)
+
+def plan_cells(args, completed):
+    """
+    The outstanding cells of the sweep in planned order, printing the plan and its estimated runtime.
+    """
+
+    cells, order = plan(args.mode, args.groups, args.chains)
+    cells = [cell for cell in cells
+             if cell_key(args.mode, cell.value, cell.latency_ms, cell.sig_alg, cell.pkt_loss,
+                         sweep_tags(args, cell.group, cell.chain)) not in completed]
+
+    handshaking, switching = estimate_runtime(args.mode, cells, args.lanes, args)
+    print(f"Plan: {len(cells)} cells to run across {args.lanes} lane(s), looping over {' > '.join(order)}")
+    print(f"Estimated runtime: {format_secs(handshaking + switching)} "
+          f"({format_secs(handshaking)} handshaking, {format_secs(switching)} reconfiguring)")
+    return cells
+
+def run_cells(cells, lanes, completed, args):
+    """
+    Run the cells across the lanes, each lane's thread pulling them off one queue in order.
+    """
+
+    jobs = queue.Queue()
+    for cell in cells:
+        jobs.put(cell)
+
+    # Without --persistent, each lane runs the executable once per timer and batch
+    timer_pool = None
+
+    telemetry = Telemetry(args.mode, cells, lanes, args, path=args.events)
+    telemetry.start(args.metrics_port)
+    threads = [
+        threading.Thread(target=run_lane, args=(lane, jobs, timer_pool, completed, telemetry, args), name=repr(lane))
+        for lane in lanes
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        telemetry.stop()
+
+def measured_cells(mode):
+    """
+    Summary index entries (see aggregate.py) of every measured cell of the mode, keyed by cell key.
+    """
+
+    return {cell_key(entry['mode'], int(float(entry['value'])), entry['latency'], entry['sig_alg'],
+                     entry['pkt_loss'], parse_tags(entry['tags'])): entry
+            for entry in update_index().values() if entry['mode'] == mode}
+
+def run_active(lanes, completed, args):
+    """
+    Active sampling: rather than every cell of the grid, run rounds of just the cells the surrogate model
+    (surrogate.py) needs - either side of each predicted step, then wherever a plateau turns out not to be flat -
+    choosing each round from everything measured so far. The rest of the grid is written out as predictions with
+    intervals.
+    """
+
+    grid, _ = plan(args.mode, args.groups, args.chains)
+
+    def key(cell):
+        return cell_key(args.mode, cell.value, cell.latency_ms, cell.sig_alg, cell.pkt_loss,
+                        sweep_tags(args, cell.group, cell.chain))
+
+    # Cells given up on (every retry failed) in an earlier round aren't picked again until the next run
+    given_up = set()
+    for round_index in range(args.active_rounds):
+        measured = measured_cells(args.mode)
+        chosen, reasons = select_cells(grid, measured, key, args.tolerance)
+        # Cells completed according to the manifest but missing from the results store aren't rerun either
+        chosen = [cell for cell in chosen if key(cell) not in completed and key(cell) not in given_up]
+        handshaking, switching = estimate_runtime(args.mode, chosen, args.lanes, args)
+        print(f"Active round {round_index + 1}/{args.active_rounds}: {len(chosen)} cells to measure "
+              f"({', '.join(f'{count} {reason}' for reason, count in reasons.items())}), "
+              f"estimated {format_secs(handshaking + switching)}")
+        if args.plan_only or not chosen:
+            break
+        run_cells(chosen, lanes, completed, args)
+        given_up.update(key(cell) for cell in chosen if key(cell) not in completed)
+
+    if args.plan_only:
+        return
+    measured = measured_cells(args.mode)
+    predicted = write_predictions(args.mode, grid, measured, key)
+    measured_count = sum(key(cell) in measured for cell in grid)
+    print(f"Measured {measured_count} of {len(grid)} cells ({measured_count / len(grid):.0%}), predicted "
+          f"{predicted} into data/surrogate_{args.mode}.json")
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable initcwnd / MTU / server load handshake sweep")
+    parser.add_argument('mode', choices=['initcwnd', 'mtu', 'load'])
+    parser.add_argument('--manifest', default=MANIFEST_PATH,
+                        help="JSONL file recording completed cells (default: %(default)s)")
+    parser.add_argument('--retries', type=int, default=2,
+                        help="Times to retry a failed cell before moving on (default: %(default)s)")
+    parser.add_argument('--lanes', type=int, default=1,
+                        help="Number of namespace lanes (from setup_namespaces.sh) to spread cells across (default: %(default)s)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Sample each cell only until the median / 90th percentile CIs are narrow enough")
+    parser.add_argument('--ci-width', type=float, default=ADAPTIVE_CI_WIDTH,
+                        help="Target CI width relative to the estimate in adaptive mode (default: %(default)s)")
+    parser.add_argument('--min-samples', type=int, default=ADAPTIVE_MIN_SAMPLES,
+                        help="Minimum handshakes per cell in adaptive mode (default: %(default)s)")
+    parser.add_argument('--max-samples', type=int, default=ADAPTIVE_MAX_SAMPLES,
+                        help="Hard cap on handshakes per cell in adaptive mode (default: %(default)s)")
+    parser.add_argument('--persistent', action='store_true',
+                        help="Time handshakes with persistent worker processes instead of one executable run per batch")
+    parser.add_argument('--records', action='store_true',
+                        help="Also store per-handshake TCP connect / per-message timings and TCP_INFO columns")
+    parser.add_argument('--concurrency', type=lambda levels: [int(level) for level in levels.split(',')],
+                        default=LOAD_CONCURRENCY,
+                        help="Comma-separated handshake concurrency levels ramped through in load mode "
+                             "(default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=LOAD_DURATION_SECS,
+                        help="Seconds measured at each concurrency level in load mode (default: %(default)s)")
+    parser.add_argument('--resumption', type=float, default=0,
+                        help="Fraction (0-1) of handshakes that resume an earlier session instead of a full "
+                             "handshake. Implies --records, and the cells are tagged with the ratio (default: off)")
+    parser.add_argument('--plan-only', action='store_true',
+                        help="Print the planned cell order and estimated runtime, then exit without running")
+    parser.add_argument('--groups', type=lambda groups: KEM_GROUPS if groups == 'all' else groups.split(','),
+                        default=[None],
+                        help="Comma-separated key exchange groups to sweep (both client and nginx are restricted to "
+                             f"each in turn), or 'all' for {','.join(KEM_GROUPS)} (default: the default groups)")
+    parser.add_argument('--chains', type=lambda chains: list(CHAIN_VARIANTS) if chains == 'all' else chains.split(','),
+                        default=[DEFAULT_CHAIN],
+                        help="Comma-separated ways of delivering the server's certificate chain to sweep "
+                             f"({','.join(CHAIN_VARIANTS)}), or 'all' (default: %(default)s)")
+    parser.add_argument('--compress-certs', action='store_true',
+                        help="Let the client accept a compressed certificate chain (RFC 8879). Whether the server "
+                             "compresses it depends on its OpenSSL build loading a compression library, so cells "
+                             "whose chains weren't all compressed are discarded. The cells are tagged with it")
+    parser.add_argument('--timers', type=int, default=TIMERS,
+                        help="Concurrent handshake timers per lane. Cells keep the same total number of handshakes "
+                             "(default: %(default)s)")
+    parser.add_argument('--isolate', action='store_true',
+                        help="Pin each lane's timers (one CPU each) and nginx to separate CPU sets, and the harness to "
+                             "its own CPU. Each cell records the assignment")
+    parser.add_argument('--server-cpus', type=int, default=SERVER_CPUS,
+                        help="CPUs (and nginx workers, outside load mode) per lane with --isolate (default: %(default)s)")
+    parser.add_argument('--backend', choices=BACKENDS, default='netns',
+                        help="Emulate the network with namespaces and netem (needs root), or with a userspace relay "
+                             "per lane on loopback (default: %(default)s)")
+    parser.add_argument('--relay-loss-model', choices=LOSS_MODELS, default='random',
+                        help="How the relay loses segments: independently, or in bursts (default: %(default)s)")
+    parser.add_argument('--relay-burst-length', type=float, default=3,
+                        help="Mean segments per burst with --relay-loss-model burst (default: %(default)s)")
+    parser.add_argument('--relay-rate', type=float, default=RELAY_RATE_MBIT,
+                        help="Link rate (Mbit/s) the relay emulates in each direction (default: %(default)s)")
+    parser.add_argument('--active', action='store_true',
+                        help="Measure only the cells a surrogate model of the grid needs, in rounds, and predict the "
+                             "rest (initcwnd / MTU modes)")
+    parser.add_argument('--active-rounds', type=int, default=SURROGATE_ROUNDS,
+                        help="Rounds of measuring and refitting with --active (default: %(default)s)")
+    parser.add_argument('--tolerance', type=float, default=SURROGATE_TOLERANCE,
+                        help="Relative difference between measured cells of a plateau above which --active measures "
+                             "the cells between them too (default: %(default)s)")
+    parser.add_argument('--events', default=EVENTS_PATH,
+                        help="JSONL file progress events are appended to (default: %(default)s)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Also serve the sweep's progress as Prometheus metrics on 127.0.0.1:<port>/metrics "
+                             "(default: off)")
+    args = parser.parse_args()
+
+    unknown = set(args.chains) - set(CHAIN_VARIANTS)
+    if unknown:
+        raise SystemExit(f"Unknown chain(s): {','.join(sorted(unknown))} - choose from {','.join(CHAIN_VARIANTS)}")
+
+    if args.resumption:
+        if not 0 < args.resumption <= 1 or args.mode == "load":
+            raise SystemExit("--resumption must be between 0 and 1, and isn't supported in load mode")
+        # Each handshake's record says whether it was resumed
+        args.records = True
+    if args.compress_certs and args.mode == "load":
+        raise SystemExit("--compress-certs isn't supported in load mode")
+    if args.active and args.mode == "load":
+        raise SystemExit("--active isn't supported in load mode")
+
+    # NOTE: load mode measures how fast the server's CPU can complete handshakes, so concurrent lanes
+    # would just compete for the same cores
+    if args.mode == "load" and args.lanes != 1:
+        raise SystemExit("Load mode must be run on a single lane")
+
+    completed = load_manifest(args.manifest)
+    print(f"{len(completed)} cells already completed according to {args.manifest}")
+    cells = plan_cells(args, completed)
+    if args.plan_only:
+        if args.active:
+            run_active(None, completed, args)
+        return
+
+    lanes = make_lanes(args.lanes, args.backend)
+    check_lanes(lanes)
+    if args.isolate:
+        try:
+            housekeeping = isolate_lanes(lanes, args.timers, args.server_cpus)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Harness pinned to CPUs {housekeeping}")
+        for lane in lanes:
+            relay = f", relay on CPUs {lane.relay_cpus}" if lane.relay else ""
+            print(f"{lane}: timers on CPUs {lane.client_cpus}, nginx on CPUs {lane.server_cpus}{relay}")
+    os.makedirs(os.path.dirname(args.manifest) or '.', exist_ok=True)
+
+    if args.active:
+        run_active(lanes, completed, args)
+    else:
+        run_cells(cells, lanes, completed, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+### --- Imports --- ###
+
+import json
+import math
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from planner import DEFAULT_CHAIN
+from relay import TCP_HEADER_BYTES
+from results_store import DATA_DIR
+
+### --- Config --- ###
+
+# Signature and public key sizes (bytes) of each algorithm, from ALGORITHMS.md. Used to estimate the server's
+# first flight until a cell of the algorithm has measured it (mean_server_bytes)
+SIG_SIZES = {
+    'mldsa44': (2420, 1312),
+    'mldsa65': (3309, 1952),
+    'mldsa87': (4627, 2592),
+    'sphincssha2128fsimple': (17088, 32),
+    'falcon512': (752, 897),
+    'falcon1024': (1462, 1793),
+    'mayo1': (321, 1168),
+    'mayo3': (577, 2656),
+    'mayo5': (838, 5008),
+    'CROSSrsdp128balanced': (12912, 77),
+}
+
+# Certificates sent in each chain delivery (see planner.CHAIN_VARIANTS), the bytes of each besides its key and
+# signature, and the rest of the server's first flight besides the chain and CertificateVerify signature
+# (ServerHello, EncryptedExtensions, Finished and record headers)
+CHAIN_CERTS = {'full': 3, 'noroot': 2, '2level': 1, 'leaf': 1}
+CERT_OVERHEAD_BYTES = 350
+FLIGHT_OVERHEAD_BYTES = 250
+
+# Link MTU of cells that leave it untouched
+DEFAULT_MTU = 1500
+
+# Active sampling: rounds of measuring, and the relative difference between two measured cells of a plateau
+# above which (if their confidence intervals don't overlap either) the cells between them are measured too
+SURROGATE_ROUNDS = 5
+SURROGATE_TOLERANCE = 0.05
+
+# Quantities modelled, as named in the summary index
+QUANTITIES = ['median', 'p90']
+
+def surrogate_path(mode, root=DATA_DIR):
+    return os.path.join(root, f"surrogate_{mode}.json")
+
+### --- Model --- ###
+
+def estimate_flight_bytes(sig_alg, chain=DEFAULT_CHAIN):
+    """
+    Rough size of the server's first flight: every certificate in the chain carries a public key and a
+    signature, plus the CertificateVerify signature and the flight's other messages.
+    """
+
+    sig, pk = SIG_SIZES[sig_alg]
+    return FLIGHT_OVERHEAD_BYTES + sig + CHAIN_CERTS[chain] * (pk + sig + CERT_OVERHEAD_BYTES)
+
+def slow_start_rounds(segments, initcwnd):
+    """
+    Round trips the server needs to send `segments` segments, starting from a window of initcwnd segments that
+    doubles every round trip.
+    """
+
+    rounds, window, sent = 1, initcwnd, initcwnd
+    while sent < segments:
+        window *= 2
+        sent += window
+        rounds += 1
+    return rounds
+
+def flight_rounds(cell, flight_bytes):
+    """
+    Round trips a cell's server needs for a first flight of flight_bytes, at the cell's MTU and initcwnd.
+    """
+
+    segments = math.ceil(flight_bytes / ((cell.mtu or DEFAULT_MTU) - TCP_HEADER_BYTES))
+    return slow_start_rounds(segments, cell.initcwnd)
+
+def flight_sizes(grid, measured, key):
+    """
+    First flight bytes of each (algorithm, chain) in the grid: the mean measured by its cells so far, or the
+    estimate from its key and signature sizes.
+    """
+
+    observed = defaultdict(list)
+    for cell in grid:
+        entry = measured.get(key(cell))
+        if entry and entry.get('mean_server_bytes'):
+            observed[(cell.sig_alg, cell.chain)].append(entry['mean_server_bytes'])
+    return {(cell.sig_alg, cell.chain): (float(np.mean(observed[(cell.sig_alg, cell.chain)]))
+                                         if observed[(cell.sig_alg, cell.chain)]
+                                         else estimate_flight_bytes(cell.sig_alg, cell.chain))
+            for cell in grid}
+
+def plateaus(grid, measured, key):
+    """
+    The grid split into plateaus: runs of cells along the experiment value (initcwnd / MTU), everything else
+    equal, whose first flights take the same number of round trips. Handshake times are modelled as flat
+    within a plateau, with the steps between plateaus.
+    NOTE: each series is modelled on its own, with no step heights shared across latencies or loss rates
+    Returns (cells in value order, whether the plateau borders a step) for each.
+    """
+
+    flights = flight_sizes(grid, measured, key)
+    series = defaultdict(list)
+    for cell in grid:
+        series[(cell.group, cell.latency_ms, cell.pkt_loss, cell.sig_alg, cell.chain)].append(cell)
+
+    runs = []
+    for cells in series.values():
+        cells.sort(key=lambda cell: cell.value)
+        rounds = [flight_rounds(cell, flights[(cell.sig_alg, cell.chain)]) for cell in cells]
+        start = 0
+        for index in range(1, len(cells) + 1):
+            if index == len(cells) or rounds[index] != rounds[start]:
+                runs.append((cells[start:index], start > 0 or index < len(cells)))
+                start = index
+    return runs
+
+def interval(entry, quantity):
+    """
+    A measured cell's confidence interval for a quantity, or just its value if it has none.
+    """
+
+    return tuple(entry.get(f'{quantity}_ci') or (entry[quantity], entry[quantity]))
+
+def distinguishable(entry_a, entry_b, tolerance):
+    """
+    Whether two measured cells differ by more than tolerance (relative to their mean) in either quantity, with
+    confidence intervals that don't overlap.
+    """
+
+    for quantity in QUANTITIES:
+        value_a, value_b = entry_a[quantity], entry_b[quantity]
+        (lo_a, hi_a), (lo_b, hi_b) = interval(entry_a, quantity), interval(entry_b, quantity)
+        if abs(value_a - value_b) > tolerance * (value_a + value_b) / 2 and (hi_a < lo_b or hi_b < lo_a):
+            return True
+    return False
+
+def gaps(cells, measured, key):
+    """
+    Consecutive measured cells of a plateau with unmeasured cells between them, as (low, high, between).
+    """
+
+    indices = [index for index, cell in enumerate(cells) if key(cell) in measured]
+    return [(cells[low], cells[high], cells[low + 1:high]) for low, high in zip(indices, indices[1:])
+            if high > low + 1]
+
+### --- Active sampling --- ###
+
+def select_cells(grid, measured, key, tolerance=SURROGATE_TOLERANCE):
+    """
+    The unmeasured cells worth measuring next, in the grid's order: both ends of every plateau (either side of
+    a predicted step, or the ends of a series), then the middle of any gap between distinguishable measured
+    cells, where the plateau isn't flat after all.
+    Returns the cells and the number chosen for each reason.
+    """
+
+    reasons = {'step': set(), 'edge': set(), 'uncertain': set()}
+    for cells, bordered in plateaus(grid, measured, key):
+        ends = [cell for cell in (cells[0], cells[-1]) if key(cell) not in measured]
+        if ends:
+            reasons['step' if bordered else 'edge'].update(ends)
+            continue
+        for low, high, between in gaps(cells, measured, key):
+            if distinguishable(measured[key(low)], measured[key(high)], tolerance):
+                reasons['uncertain'].add(between[len(between) // 2])
+
+    chosen = [cell for cell in grid if any(cell in cells for cells in reasons.values())]
+    return chosen, {reason: len(cells) for reason, cells in reasons.items()}
+
+def predict(grid, measured, key):
+    """
+    The median and 90th percentile of each unmeasured cell between two measured cells of its plateau,
+    interpolated linearly in the experiment value, with an interval spanning both neighbours' confidence
+    intervals. Returns {cell: {quantity: (prediction, low, high)}}.
+    """
+
+    predictions = {}
+    for cells, _ in plateaus(grid, measured, key):
+        for low, high, between in gaps(cells, measured, key):
+            entry_low, entry_high = measured[key(low)], measured[key(high)]
+            for cell in between:
+                weight = (cell.value - low.value) / (high.value - low.value)
+                predictions[cell] = {}
+                for quantity in QUANTITIES:
+                    bounds = interval(entry_low, quantity) + interval(entry_high, quantity)
+                    predictions[cell][quantity] = ((1 - weight) * entry_low[quantity] + weight * entry_high[quantity],
+                                                   min(bounds), max(bounds))
+    return predictions
+
+def write_predictions(mode, grid, measured, key, root=DATA_DIR):
+    """
+    Write the predictions (with their intervals) for the grid's unmeasured cells to data/surrogate_<mode>.json.
+    Returns the number of cells predicted.
+    """
+
+    flights = flight_sizes(grid, measured, key)
+    cells = []
+    for cell, predictions in predict(grid, measured, key).items():
+        flight = flights[(cell.sig_alg, cell.chain)]
+        entry = {'mode': mode, 'value': cell.value, 'latency': cell.latency_ms, 'sig_alg': cell.sig_alg,
+                 'pkt_loss': cell.pkt_loss, 'tags': key(cell)[-1], 'flight_bytes': flight,
+                 'flight_rounds': flight_rounds(cell, flight)}
+        for quantity, (prediction, low, high) in predictions.items():
+            entry.update({quantity: prediction, f'{quantity}_lo': low, f'{quantity}_hi': high})
+        cells.append(entry)
+
+    tmp_path = surrogate_path(mode, root) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'measured': sum(key(cell) in measured for cell in grid), 'cells': cells}, f)
+    os.replace(tmp_path, surrogate_path(mode, root))
+    return len(cells)
+
+def load_predictions(mode, root=DATA_DIR):
+    """
+    The predicted cells written by the last active sampling run of a mode, or [] if there are none.
+    """
+
+    try:
+        with open(surrogate_path(mode, root), 'r') as f:
+            return json.load(f)['cells']
+    except (OSError, ValueError, KeyError):
+        return []
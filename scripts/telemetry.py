@@ -0,0 +1,265 @@
+### --- Imports --- ###
+
+import collections
+import errno
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from planner import cell_secs, format_secs
+from results_store import failed
+
+### --- Config --- ###
+
+EVENTS_PATH = "data/events.jsonl"
+
+# Seconds between progress events (and the status line printed with each)
+HEARTBEAT_SECS = 30
+
+# Handshakes/sec is measured over the last RATE_WINDOW_SECS, and the ETA scaled by the observed / estimated cost
+# of the last ETA_WINDOW_CELLS cells
+RATE_WINDOW_SECS = 60
+ETA_WINDOW_CELLS = 50
+
+# A lane that hasn't produced a handshake record or finished a cell for this long is reported as stalled
+STALL_SECS = 300
+
+### --- Telemetry --- ###
+
+class Telemetry:
+    """
+    Live progress of a sweep, shared by every lane thread. Events (sweep start / end, each cell's start, completion
+    or failure, and a progress snapshot every HEARTBEAT_SECS) are appended to a JSONL file, and the same snapshot
+    can be served as Prometheus text metrics.
+    The ETA takes the planner's estimate for the outstanding cells, scaled by how long recent cells actually took
+    relative to their estimates.
+    """
+
+    def __init__(self, mode, cells, lanes, args, path=EVENTS_PATH):
+        self.mode = mode
+        self.args = args
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+        self.cells_total = len(cells)
+        self.cells_done = 0
+        self.cells_failed = 0
+        self.remaining_secs = sum(cell_secs(mode, cell, args) for cell in cells)
+        self.costs = collections.deque(maxlen=ETA_WINDOW_CELLS)  # (observed, estimated) secs per cell
+
+        self.handshakes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.recent = collections.deque()  # arrival times of handshakes in the last RATE_WINDOW_SECS
+
+        # Per lane: its current cell (and when it started), route / netem settings and time of last progress
+        self.lanes = {lane.index: {'cell': None, 'cell_started': None, 'initcwnd': None, 'mtu': None,
+                                   'latency_ms': None, 'pkt_loss': None, 'last_progress': self.started}
+                      for lane in lanes}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.events = open(path, 'a')
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self.run_heartbeat, name="telemetry", daemon=True)
+        self.server = None
+
+    def emit(self, event, **fields):
+        """
+        Append one event to the JSONL stream.
+        """
+
+        line = json.dumps({'event': event, 'time': datetime.now(timezone.utc).isoformat(), **fields})
+        with self.lock:
+            self.events.write(line + '\n')
+            self.events.flush()
+
+    def start(self, port=None):
+        """
+        Emit the sweep_start event and start the heartbeat, plus the metrics endpoint on localhost if given a port.
+        """
+
+        self.emit('sweep_start', mode=self.mode, cells=self.cells_total, lanes=len(self.lanes),
+                  estimated_secs=self.remaining_secs / len(self.lanes))
+        self.heartbeat.start()
+        if port is not None:
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), metrics_handler(self))
+            threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+
+    def stop(self):
+        self.stopped.set()
+        self.heartbeat.join()
+        self.emit('sweep_end', **self.snapshot())
+        if self.server is not None:
+            self.server.shutdown()
+        self.events.close()
+
+    ### --- Updates from the lane threads --- ###
+
+    def lane_settings(self, lane, **settings):
+        """
+        Record a lane's current route / netem settings (initcwnd, mtu, latency_ms, pkt_loss).
+        """
+
+        with self.lock:
+            self.lanes[lane.index].update(settings)
+
+    def cell_started(self, lane, cell):
+        now = time.time()
+        with self.lock:
+            self.lanes[lane.index].update(cell=cell, cell_started=now, last_progress=now)
+        self.emit('cell_start', lane=lane.index, cell=cell._asdict())
+
+    def record(self, lane, record):
+        """
+        Count one handshake attempt's record as it arrives.
+        """
+
+        now = time.time()
+        with self.lock:
+            self.lanes[lane.index]['last_progress'] = now
+            if failed(record):
+                self.failures += 1
+                if record.get('error_code') == errno.ETIMEDOUT:
+                    self.timeouts += 1
+            else:
+                self.handshakes += 1
+                self.recent.append(now)
+
+    def cell_finished(self, lane, cell, completed, **fields):
+        """
+        Record the end of a lane's current cell, whether it completed or was given up on.
+        """
+
+        now = time.time()
+        with self.lock:
+            state = self.lanes[lane.index]
+            observed = now - state['cell_started'] if state['cell_started'] else None
+            estimated = cell_secs(self.mode, cell, self.args)
+            self.remaining_secs -= estimated
+            if completed:
+                self.cells_done += 1
+                if observed is not None:
+                    self.costs.append((observed, estimated))
+            else:
+                self.cells_failed += 1
+            state.update(cell=None, cell_started=None, last_progress=now)
+        self.emit('cell_done' if completed else 'cell_failed', lane=lane.index, cell=cell._asdict(),
+                  secs=observed, estimated_secs=estimated, **fields)
+
+    ### --- Reporting --- ###
+
+    def snapshot(self):
+        """
+        The sweep's current progress, rates and ETA, and each lane's settings and time since it last progressed.
+        """
+
+        now = time.time()
+        with self.lock:
+            while self.recent and self.recent[0] < now - RATE_WINDOW_SECS:
+                self.recent.popleft()
+            observed = sum(cost[0] for cost in self.costs)
+            estimated = sum(cost[1] for cost in self.costs)
+            scale = observed / estimated if estimated else 1.0
+            lanes = {
+                index: {
+                    'cell': state['cell']._asdict() if state['cell'] else None,
+                    'initcwnd': state['initcwnd'],
+                    'mtu': state['mtu'],
+                    'latency_ms': state['latency_ms'],
+                    'pkt_loss': state['pkt_loss'],
+                    'secs_since_progress': now - state['last_progress'],
+                }
+                for index, state in self.lanes.items()
+            }
+            return {
+                'elapsed_secs': now - self.started,
+                'cells_total': self.cells_total,
+                'cells_completed': self.cells_done,
+                'cells_failed': self.cells_failed,
+                'cells_remaining': self.cells_total - self.cells_done - self.cells_failed,
+                'handshakes': self.handshakes,
+                'handshake_failures': self.failures,
+                'handshake_timeouts': self.timeouts,
+                'handshakes_per_sec': len(self.recent) / min(RATE_WINDOW_SECS, max(now - self.started, 1)),
+                'eta_secs': max(self.remaining_secs, 0) * scale / len(self.lanes),
+                'cost_scale': scale,
+                'lanes': lanes,
+            }
+
+    def run_heartbeat(self):
+        while not self.stopped.wait(HEARTBEAT_SECS):
+            snapshot = self.snapshot()
+            self.emit('progress', **snapshot)
+            print(f"Progress: {snapshot['cells_completed']}/{snapshot['cells_total']} cells "
+                  f"({snapshot['cells_failed']} failed), {snapshot['handshakes_per_sec']:.1f} handshakes/s, "
+                  f"{snapshot['handshake_failures']} failed attempts ({snapshot['handshake_timeouts']} timeouts), "
+                  f"ETA {format_secs(snapshot['eta_secs'])}")
+            # NOTE: a lane without a cell has emptied its queue (or is between cells), so it isn't stalled
+            for index, lane in snapshot['lanes'].items():
+                if lane['cell'] is not None and lane['secs_since_progress'] > STALL_SECS:
+                    print(f"WARNING: Lane({index}) has made no progress for {format_secs(lane['secs_since_progress'])}")
+
+    def metrics(self):
+        """
+        The current snapshot in the Prometheus text exposition format.
+        """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP pqtls_{name} {help_text}")
+            lines.append(f"# TYPE pqtls_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"pqtls_{name}{{{label_text}}} {value}" if label_text else f"pqtls_{name} {value}")
+
+        metric('cells_total', 'gauge', "Cells planned for this sweep", [({}, snapshot['cells_total'])])
+        metric('cells_completed', 'counter', "Cells completed", [({}, snapshot['cells_completed'])])
+        metric('cells_failed', 'counter', "Cells given up on", [({}, snapshot['cells_failed'])])
+        metric('cells_remaining', 'gauge', "Cells still to run", [({}, snapshot['cells_remaining'])])
+        metric('handshakes', 'counter', "Handshakes completed", [({}, snapshot['handshakes'])])
+        metric('handshake_failures', 'counter', "Failed handshake attempts", [({}, snapshot['handshake_failures'])])
+        metric('handshake_timeouts', 'counter', "Handshake attempts that timed out",
+               [({}, snapshot['handshake_timeouts'])])
+        metric('handshakes_per_second', 'gauge', f"Handshakes completed per second over the last {RATE_WINDOW_SECS}s",
+               [({}, snapshot['handshakes_per_sec'])])
+        metric('eta_seconds', 'gauge', "Estimated seconds until the sweep finishes", [({}, snapshot['eta_secs'])])
+
+        for field, help_text in [('initcwnd', "Lane's current initcwnd"), ('mtu', "Lane's current link MTU"),
+                                 ('pkt_loss', "Lane's current netem packet loss (%)")]:
+            metric(f'lane_{field}', 'gauge', help_text,
+                   [({'lane': index}, lane[field]) for index, lane in snapshot['lanes'].items()
+                    if lane[field] is not None])
+        metric('lane_latency_info', 'gauge', "Lane's current netem delay",
+               [({'lane': index, 'latency': lane['latency_ms']}, 1) for index, lane in snapshot['lanes'].items()
+                if lane['latency_ms'] is not None])
+        metric('lane_seconds_since_progress', 'gauge', "Seconds since the lane last produced a record or finished a cell",
+               [({'lane': index}, lane['secs_since_progress']) for index, lane in snapshot['lanes'].items()])
+        return '\n'.join(lines) + '\n'
+
+def metrics_handler(telemetry):
+    """
+    HTTP request handler class serving the telemetry's metrics at /metrics.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = telemetry.metrics().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
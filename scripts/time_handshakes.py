@@ -1,17 +1,62 @@
 ### --- Imports --- ###
 
-import csv
-import os
+import json
+import math
+import queue
 import subprocess
 import sys
-from multiprocessing import Pool
+import threading
+import time
+
+from lanes import DEFAULT_LANE, pinned
+from relay import parse_delay, update_relay
+from results_store import CellWriter, failed
 
 ### --- Config --- ###
 
-POOL_SIZE = 40
 MEASUREMENTS_PER_TIMER = 150
 TIMERS = 4
 
+# Retry policy passed to the timer: attempts per handshake (a measurement is skipped once they all fail), the
+# socket timeout per attempt, and failed attempts in a row before the timer gives up on the batch
+HANDSHAKE_TRIES = 3
+HANDSHAKE_TIMEOUT_SECS = 60
+MAX_CONSECUTIVE_FAILURES = 10
+
+# Latencies applied to both veths - can be expanded to use more latencies
+LATENCIES = ['20.000ms']
+
+# (packet loss %, measurements per timer) pairs. Higher loss rates are noisier so are sampled more
+LOSS_SCHEDULE = (
+    [(pkt_loss, 50) for pkt_loss in [0, 0.1, 1, 2]] +
+    [(pkt_loss, 200) for pkt_loss in [4, 6, 8, 10]] +
+    [(pkt_loss, 300) for pkt_loss in [12, 14]] +
+    [(pkt_loss, 400) for pkt_loss in [16, 18]]
+)
+
+# Adaptive (sequential) sampling: batches of ADAPTIVE_BATCH measurements per timer are taken until the
+# median and 90th percentile confidence intervals are narrower than the target width (relative to the estimate)
+ADAPTIVE_BATCH = 25
+ADAPTIVE_CI_WIDTH = 0.05
+ADAPTIVE_MIN_SAMPLES = 100
+ADAPTIVE_MAX_SAMPLES = 1600
+
+# z-score for the confidence level of the quantile intervals (95%)
+CI_Z = 1.96
+
+# Per-handshake TCP_INFO fields (record mode) averaged into each cell's summary
+TCP_INFO_FIELDS = ['segs_in', 'segs_out', 'total_retrans', 'rtt_us', 'snd_cwnd', 'bytes_received']
+
+# Per-handshake byte counts (every mode) averaged into each cell's summary: the TLS records the server sent
+# during the handshake and its (possibly compressed) Certificate message
+BYTES_FIELDS = ['server_bytes', 'certificate_bytes']
+
+# Load (throughput) mode: concurrency levels ramped through for each algorithm, seconds measured at each level
+# and the latency applied to both veths (none, so the rate is bound by server CPU rather than round trips)
+LOAD_CONCURRENCY = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+LOAD_DURATION_SECS = 10
+LOAD_LATENCY = '0ms'
+
 def run_subprocess(command, working_dir='.'):
     """
     Run a subprocess command and return its stdout  as a string.
@@ -49,28 +94,403 @@ def change_qdisc(ns, dev, pkt_loss, delay):
     print(" > " + " ".join(base_cmd))
     run_subprocess(base_cmd)
 
-def time_handshake(sig_alg, measurements):
+def set_netem(lane, pkt_loss, latency_ms):
+    """
+    Apply the given packet loss and latency to both of the lane's veths (or both directions of its relay).
     """
-    Run the C executable 'time_handshake' in the client namespace with the given
+
+    if lane.relay:
+        update_relay(lane, delay_ms=parse_delay(latency_ms), pkt_loss=pkt_loss)
+        return
+    change_qdisc(lane.client_ns, lane.client_veth, pkt_loss, delay=latency_ms)
+    change_qdisc(lane.server_ns, lane.server_veth, pkt_loss, delay=latency_ms)
+
+def stream_subprocess(command, working_dir='.'):
+    """
+    Run a subprocess command, yielding its stdout line by line as it is produced (stderr is passed through).
+    Raises CalledProcessError once the output ends if the return code is nonzero.
+    """
+
+    with subprocess.Popen(command, stdout=subprocess.PIPE, cwd=working_dir, text=True) as proc:
+        yield from proc.stdout
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+
+def merge_streams(streams):
+    """
+    Iterator over the items of several iterators as they arrive, each one drained by its own thread (started
+    straight away). If any of them raised, the first error is re-raised once they have all finished.
+    """
+
+    arrivals = queue.Queue()
+    finished = object()
+    errors = []
+
+    def drain(stream):
+        try:
+            for item in stream:
+                arrivals.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            arrivals.put(finished)
+
+    def merged(remaining):
+        while remaining:
+            item = arrivals.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield item
+        if errors:
+            raise errors[0]
+
+    for stream in streams:
+        threading.Thread(target=drain, args=(stream,), daemon=True).start()
+    return merged(len(streams))
+
+def client_options(records=False, resumption=0, compress=False):
+    """
+    Options passed to the C executable in both one-shot and worker mode: the retry policy, record mode,
+    certificate compression and resumption ratio.
+    """
+
+    options = ['-t', str(HANDSHAKE_TRIES), '-T', str(HANDSHAKE_TIMEOUT_SECS), '-m', str(MAX_CONSECUTIVE_FAILURES)]
+    if records:
+        options.append('-r')
+    if compress:
+        options.append('-z')
+    if resumption:
+        options.extend(['-s', str(resumption)])
+    return options
+
+def time_handshake(sig_alg, measurements, lane=DEFAULT_LANE, records=False, resumption=0, group=None,
+                   compress=False, cpus=None):
+    """
+    Run the C executable 'time_handshake' in the lane's client namespace with the given
     signature algorithm and measurement count.
-    The command output is expected to be a comma-separated list of handshake timings.
+    Yields one record per handshake attempt as it finishes: the handshake time (and per-phase timings in
+    record mode), or for a failed attempt its status ('error'), stage and error code / message.
+    With a resumption ratio, that fraction of the handshakes resume an earlier session, and with compress the
+    server may send its certificate chain compressed (RFC 8879).
+    sig_alg is the server name sent as SNI, which selects the chain nginx serves (see planner.chain_name).
+    group is the key exchange group offered by the client (None for OpenSSL's default list), and cpus the CPUs
+    the executable is pinned to (None to leave it unpinned).
+    Raises if the executable gave up on the batch, after yielding the records up to that point.
+    """
+
+    command = lane.client_command([
+        './src/build/time_handshake', '-a', lane.connect_ip, '-p', str(lane.connect_port),
+        *client_options(records, resumption, compress), sig_alg, str(measurements)
+    ])
+    if group:
+        command[-2:-2] = ['-g', group]
+    command = pinned(command, cpus)
+    print(" > " + " ".join(command))
+    for line in stream_subprocess(command):
+        if line.strip():
+            yield json.loads(line)
+
+class HandshakeWorker:
+    """
+    A persistent 'time_handshake -w' process in a lane's client namespace. The providers and one SSL_CTX per
+    algorithm stay loaded between batches, so process startup and provider loading aren't paid per batch.
+    """
+
+    def __init__(self, lane=DEFAULT_LANE, records=False, resumption=0, compress=False, cpus=None):
+        command = pinned(lane.client_command([
+            './src/build/time_handshake', '-w', '-a', lane.connect_ip, '-p', str(lane.connect_port),
+            *client_options(records, resumption, compress)
+        ]), cpus)
+        print(" > " + " ".join(command))
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def send(self, sig_alg, measurements, group=None):
+        """
+        Ask the worker to time a batch of handshakes. The records are collected with receive().
+        """
+
+        self.proc.stdin.write(f"run {sig_alg} {measurements} {group or ''}\n")
+        self.proc.stdin.flush()
+
+    def receive(self):
+        """
+        Yield the records of the last batch as each handshake attempt finishes (as with the one-shot
+        executable). Raises if the worker gave up on the batch or exited, after yielding the records up to then.
+        """
+
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Handshake worker exited with code {self.proc.wait()}")
+            if not line.startswith('{'):
+                break
+            yield json.loads(line)
+
+        if line.strip() != 'ok':
+            raise RuntimeError(f"Handshake worker gave up on the batch: {line.strip()}")
+
+    def close(self):
+        if self.alive():
+            try:
+                self.proc.stdin.write("quit\n")
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        self.proc.wait()
+
+class WorkerPool:
+    """
+    Pool of persistent handshake workers for one lane, used in place of one-shot executable runs by run_timers.
+    Each worker is pinned to its timer's CPU if the lane is isolated.
+    """
+
+    def __init__(self, lane=DEFAULT_LANE, size=TIMERS, records=False, resumption=0, compress=False):
+        self.lane = lane
+        self.records = records
+        self.resumption = resumption
+        self.compress = compress
+        self.workers = [self.new_worker(timer) for timer in range(size)]
+
+    def new_worker(self, timer):
+        return HandshakeWorker(self.lane, self.records, self.resumption, self.compress, self.lane.timer_cpus(timer))
+
+    def run_timers(self, sig_alg, timers, measurements, group=None):
+        """
+        Run one batch on each of `timers` workers concurrently, returning an iterator over their records
+        as they arrive.
+        """
+
+        # Replace any workers that have died and grow the pool if needed
+        self.workers = [worker if worker.alive() else self.new_worker(timer)
+                        for timer, worker in enumerate(self.workers)]
+        while len(self.workers) < timers:
+            self.workers.append(self.new_worker(len(self.workers)))
+        active = self.workers[:timers]
+
+        # Send every command before reading any response so the batches run in parallel
+        for worker in active:
+            worker.send(sig_alg, measurements, group)
+
+        # NOTE: every worker's response is read to the end even if another one fails, so none is left out of step
+        return merge_streams([worker.receive() for worker in active])
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+def run_timers(sig_alg, timer_pool, timers, measurements, lane=DEFAULT_LANE, records=False, resumption=0,
+               group=None, compress=False):
+    """
+    Launch multiple handshake measurements concurrently, returning an iterator over the records of every
+    timer as they arrive.
+    timer_pool is either a WorkerPool, or None to run the executable once per timer (each pinned to its own CPU
+    if the lane is isolated).
+    """
+
+    if timer_pool is not None:
+        if (timer_pool.records, timer_pool.resumption, timer_pool.compress) != (records, resumption, compress):
+            raise ValueError("WorkerPool record mode / resumption ratio / compression does not match the "
+                             "requested output")
+        return timer_pool.run_timers(sig_alg, timers, measurements, group)
+    return merge_streams([time_handshake(sig_alg, measurements, lane, records, resumption, group, compress,
+                                         lane.timer_cpus(timer))
+                          for timer in range(timers)])
+
+def generate_load(sig_alg, concurrency_levels, duration, lane=DEFAULT_LANE, group=None):
+    """
+    Run the C executable in load mode in the lane's client namespace, keeping each number of handshakes in
+    flight in turn for the given duration. Returns one dict per concurrency level (handshakes/sec, errors
+    and the latency of every handshake completed).
     """
 
-    command = [
-        'ip', 'netns', 'exec', 'client_namespace',
-        './src/build/time_handshake', sig_alg, str(measurements)
-    ]
+    command = lane.client_command([
+        './src/build/time_handshake', '-l', str(duration), '-a', lane.connect_ip, '-p', str(lane.connect_port),
+        sig_alg, ','.join(str(concurrency) for concurrency in concurrency_levels)
+    ])
+    if group:
+        command[-2:-2] = ['-g', group]
+    command = pinned(command, lane.client_cpus)
     print(" > " + " ".join(command))
     result = run_subprocess(command)
-    # Parse the comma-separated float values
-    return [float(x) for x in result.strip().split(',') if x]
+    return [json.loads(line) for line in result.splitlines() if line.strip()]
 
-def run_timers(sig_alg, timer_pool, timers, measurements):
+def quantile(sorted_vals, q):
     """
-    Launch multiple handshake measurements concurrently and flatten the results.
+    Quantile of already sorted values, linearly interpolated (matches pandas' default).
     """
-    results_nested = timer_pool.starmap(time_handshake, [(sig_alg, measurements)] * timers)
-    return [item for sublist in results_nested for item in sublist]
+
+    pos = (len(sorted_vals) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+def quantile_ci(sorted_vals, q, z=CI_Z):
+    """
+    Distribution-free confidence interval for the q-th quantile, using the order statistics
+    whose ranks bound n*q under the normal approximation to the binomial.
+    """
+
+    n = len(sorted_vals)
+    half_width = z * math.sqrt(n * q * (1 - q))
+    lo = max(0, math.floor(n * q - half_width))
+    hi = min(n - 1, math.ceil(n * q + half_width))
+    return sorted_vals[lo], sorted_vals[hi]
+
+def summarise(timings):
+    """
+    Median and 90th percentile of the timings along with their confidence intervals.
+    """
+
+    sorted_vals = sorted(timings)
+    if not sorted_vals:
+        return {}
+
+    median_lo, median_hi = quantile_ci(sorted_vals, 0.5)
+    p90_lo, p90_hi = quantile_ci(sorted_vals, 0.9)
+    return {
+        'median': quantile(sorted_vals, 0.5),
+        'median_ci': [median_lo, median_hi],
+        'p90': quantile(sorted_vals, 0.9),
+        'p90_ci': [p90_lo, p90_hi],
+    }
+
+def summarise_columns(columns):
+    """
+    Mean of each byte count and TCP_INFO field over a cell's columns, the fraction of handshakes resumed, and the
+    fraction of the certificate chains received that were compressed.
+    """
+
+    summary = {}
+    for field in BYTES_FIELDS + TCP_INFO_FIELDS:
+        values = [float(value) for value in columns.get(field, []) if not math.isnan(value)]
+        if values:
+            summary[f'mean_{field}'] = sum(values) / len(values)
+
+    resumed = [float(value) for value in columns.get('resumed', []) if not math.isnan(value)]
+    if resumed:
+        summary['resumed_fraction'] = sum(resumed) / len(resumed)
+
+    # Resumed handshakes have no certificate chain, so their certificate_compressed is missing
+    compressed = [float(value) for value in columns.get('certificate_compressed', []) if not math.isnan(value)]
+    if compressed:
+        summary['compressed_fraction'] = sum(compressed) / len(compressed)
+    return summary
+
+def summarise_failures(failures, samples):
+    """
+    A cell's failed handshake attempts: their number, the failure rate over every attempt (failed or not)
+    and the count per error.
+    """
+
+    count = sum(failures.values())
+    attempts = count + samples
+    return {'failures': count, 'failure_rate': count / attempts if attempts else 0.0, 'failure_errors': failures}
+
+def ci_converged(summary, ci_width):
+    """
+    Whether both the median and 90th percentile intervals are within the target relative width.
+    """
+
+    return all(
+        (summary[f'{stat}_ci'][1] - summary[f'{stat}_ci'][0]) <= ci_width * summary[stat]
+        for stat in ('median', 'p90')
+    )
+
+def timings(records):
+    """
+    Handshake times (ms) of a list of per-handshake records, skipping failed attempts.
+    """
+
+    return [record['handshake_ms'] for record in records if not failed(record)]
+
+def run_batch(sig_alg, timer_pool, measurements, batch=0, lane=DEFAULT_LANE, detailed=False, resumption=0,
+              group=None, compress=False, timers=TIMERS):
+    """
+    Run one batch on each of the timers, yielding a record per handshake attempt as it arrives, tagged with the
+    batch number and its arrival time. In detailed mode the records also hold the per-phase timings, TCP_INFO
+    and whether the handshake was resumed.
+    """
+
+    for record in run_timers(sig_alg, timer_pool, timers=timers, measurements=measurements, lane=lane,
+                             records=detailed, resumption=resumption, group=group, compress=compress):
+        record['batch'] = batch
+        record['timestamp'] = time.time()
+        yield record
+
+def measure_loss(sig_alg, timer_pool, pkt_loss, latency_ms, measurements, lane=DEFAULT_LANE, detailed=False,
+                 resumption=0, group=None, netem=True, batch=0, compress=False, timers=TIMERS):
+    """
+    Apply the given packet loss and latency to both of the lane's namespaces and time a set of handshakes,
+    yielding the per-handshake records (failed attempts included) as they arrive.
+    Pass netem=False if the lane's qdiscs are already set.
+    """
+
+    if netem:
+        set_netem(lane, pkt_loss, latency_ms)
+    yield from run_batch(sig_alg, timer_pool, measurements, batch=batch, lane=lane, detailed=detailed,
+                         resumption=resumption, group=group, compress=compress, timers=timers)
+
+def measure_loss_adaptive(sig_alg, timer_pool, pkt_loss, latency_ms, ci_width=ADAPTIVE_CI_WIDTH,
+                          min_samples=ADAPTIVE_MIN_SAMPLES, max_samples=ADAPTIVE_MAX_SAMPLES, lane=DEFAULT_LANE,
+                          detailed=False, resumption=0, group=None, netem=True, done=(), batch=0,
+                          compress=False, timers=TIMERS):
+    """
+    As measure_loss, but keeps requesting batches of handshakes only until the median and 90th percentile
+    confidence intervals reach the target relative width (or max_samples is hit).
+    done holds the handshake times already measured for the cell (e.g. by an interrupted run), which count
+    towards the samples, with batch numbering continuing from `batch`.
+    """
+
+    if netem:
+        set_netem(lane, pkt_loss, latency_ms)
+
+    handshake_times = list(done)
+    while len(handshake_times) < max_samples:
+        measurements = min(ADAPTIVE_BATCH, math.ceil((max_samples - len(handshake_times)) / timers))
+        measured = len(handshake_times)
+        for record in run_batch(sig_alg, timer_pool, measurements, batch=batch, lane=lane, detailed=detailed,
+                                resumption=resumption, group=group, compress=compress, timers=timers):
+            if not failed(record):
+                handshake_times.append(record['handshake_ms'])
+            yield record
+        batch += 1
+
+        if len(handshake_times) == measured:
+            raise RuntimeError(f"No handshakes succeeded in batch {batch - 1}")
+        if len(handshake_times) >= min_samples and ci_converged(summarise(handshake_times), ci_width):
+            break
+
+def measure_load(sig_alg, latency_ms, concurrency_levels=LOAD_CONCURRENCY, duration=LOAD_DURATION_SECS,
+                 lane=DEFAULT_LANE, group=None, netem=True):
+    """
+    Apply the given latency (and no loss) to both of the lane's namespaces and ramp the handshake concurrency.
+    Returns a record per handshake (its concurrency level and latency) and a summary per concurrency level:
+    sustained handshakes/sec, errors and the median / 90th / 99th percentile latency.
+    """
+
+    if netem:
+        set_netem(lane, 0, latency_ms)
+
+    records = []
+    levels = []
+    for result in generate_load(sig_alg, concurrency_levels, duration, lane, group):
+        latencies = sorted(result.pop('latencies_ms'))
+        records.extend({'concurrency': result['concurrency'], 'latency_ms': latency} for latency in latencies)
+        if latencies:
+            result.update({
+                'median': quantile(latencies, 0.5),
+                'p90': quantile(latencies, 0.9),
+                'p99': quantile(latencies, 0.99),
+            })
+        levels.append(result)
+
+    if len(levels) < len(concurrency_levels):
+        raise RuntimeError(f"Load generation stopped after {len(levels)} of {len(concurrency_levels)} levels")
+    return records, levels
 
 def main():
     # Argument parsing
@@ -86,58 +506,22 @@ def main():
         print("Error: mode must be either 'initcwnd' or 'mtu'")
         sys.exit(1)
 
-    timer_pool = Pool(processes=POOL_SIZE)
-
-    for latency_ms in ['20.000ms']:  # Can be expanded to use more latencies - 
-
-        # Create directory depending on experiment mode
-        if mode == "initcwnd":
-            output_dir = f"data/initcwnd={experiment_value}/latency={latency_ms}"
-        elif mode == "mtu":
-            output_dir = f"data/mtu={experiment_value}/latency={latency_ms}"
-
-        os.makedirs(output_dir, exist_ok=True)
+    for latency_ms in LATENCIES:
 
         # Set qdisc with no loss initially
         change_qdisc('client_namespace', 'client_veth', 0, delay=latency_ms)
         change_qdisc('server_namespace', 'server_veth', 0, delay=latency_ms)
 
-        csv_filename = f"{output_dir}/{sig_alg}.csv"
-        with open(csv_filename, 'w', newline='') as csvfile:
-            csv_out = csv.writer(csvfile)
-
-            for pkt_loss in [0, 0.1, 1, 2]:
-                change_qdisc('client_namespace', 'client_veth', pkt_loss, delay=latency_ms)
-                change_qdisc('server_namespace', 'server_veth', pkt_loss, delay=latency_ms)
-                results = run_timers(sig_alg, timer_pool, timers=4, measurements=50)
-                results.insert(0, pkt_loss)
-                csv_out.writerow(results)
-
-            for pkt_loss in [4, 6, 8, 10]:
-                change_qdisc('client_namespace', 'client_veth', pkt_loss, delay=latency_ms)
-                change_qdisc('server_namespace', 'server_veth', pkt_loss, delay=latency_ms)
-                results = run_timers(sig_alg, timer_pool, timers=4, measurements=200)
-                results.insert(0, pkt_loss)
-                csv_out.writerow(results)
-
-            for pkt_loss in [12, 14]:
-                change_qdisc('client_namespace', 'client_veth', pkt_loss, delay=latency_ms)
-                change_qdisc('server_namespace', 'server_veth', pkt_loss, delay=latency_ms)
-                results = run_timers(sig_alg, timer_pool, timers=4, measurements=300)
-                results.insert(0, pkt_loss)
-                csv_out.writerow(results)
-
-            for pkt_loss in [16, 18]:
-                change_qdisc('client_namespace', 'client_veth', pkt_loss, delay=latency_ms)
-                change_qdisc('server_namespace', 'server_veth', pkt_loss, delay=latency_ms)
-                results = run_timers(sig_alg, timer_pool, timers=4, measurements=400)
-                results.insert(0, pkt_loss)
-                csv_out.writerow(results)
-
-
-    timer_pool.close()
-    timer_pool.join()
+        # Each loss level is written to the results store as its own cell, with the records spooled to disk
+        # as they arrive
+        for pkt_loss, measurements in LOSS_SCHEDULE:
+            writer = CellWriter(mode, experiment_value, latency_ms, sig_alg, pkt_loss)
+            writer.discard()
+            for record in measure_loss(sig_alg, None, pkt_loss, latency_ms, measurements):
+                writer.append(record)
+            columns, failures = writer.columns()
+            writer.commit(columns, meta=summarise_failures(failures, len(columns.get('handshake_ms', []))))
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
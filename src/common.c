@@ -0,0 +1,47 @@
+#define _POSIX_C_SOURCE 200809L
+#include <stdio.h>
+#include <time.h>
+
+#include <openssl/err.h>
+
+#include "common.h"
+
+// Shared by time_handshake and crypto_bench: timing and provider loading
+
+double get_time(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC_RAW, &ts);
+    return (double)ts.tv_sec + (double)ts.tv_nsec / 1000000000;
+}
+
+int load_providers(struct providers *providers) {
+    providers->libctx = OSSL_LIB_CTX_new();
+    if (!providers->libctx) {
+        fprintf(stderr, "Failed to create OpenSSL libctx\n");
+        return -1;
+    }
+
+    // Load providers: default and oqsprovider
+    providers->defaultprov = OSSL_PROVIDER_load(providers->libctx, "default");
+    if (!providers->defaultprov) {
+        fprintf(stderr, "Failed to load default provider\n");
+        ERR_print_errors_fp(stderr);
+        OSSL_LIB_CTX_free(providers->libctx);
+        return -1;
+    }
+    providers->oqsprov = OSSL_PROVIDER_load(providers->libctx, "oqsprovider");
+    if (!providers->oqsprov) {
+        fprintf(stderr, "Failed to load OQS provider\n");
+        ERR_print_errors_fp(stderr);
+        OSSL_PROVIDER_unload(providers->defaultprov);
+        OSSL_LIB_CTX_free(providers->libctx);
+        return -1;
+    }
+    return 0;
+}
+
+void unload_providers(struct providers *providers) {
+    OSSL_PROVIDER_unload(providers->oqsprov);
+    OSSL_PROVIDER_unload(providers->defaultprov);
+    OSSL_LIB_CTX_free(providers->libctx);
+}
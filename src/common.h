@@ -0,0 +1,23 @@
+#ifndef COMMON_H
+#define COMMON_H
+
+#include <openssl/provider.h>
+
+// Providers loaded into a library context by load_providers
+struct providers {
+    OSSL_LIB_CTX *libctx;
+    OSSL_PROVIDER *defaultprov;
+    OSSL_PROVIDER *oqsprov;
+};
+
+// Get current time in secs (monotonic and not subject to NTP slewing)
+double get_time(void);
+
+// Create a library context with the default and OQS providers loaded. Returns 0 on success, or -1 (with the
+// error printed) if either can't be loaded
+int load_providers(struct providers *providers);
+
+// Unload the providers and free their library context
+void unload_providers(struct providers *providers);
+
+#endif
@@ -0,0 +1,307 @@
+#define _GNU_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sched.h>
+#include <unistd.h>
+
+#include <openssl/err.h>
+#include <openssl/evp.h>
+#include <openssl/pem.h>
+#include <openssl/x509_vfy.h>
+
+#include "common.h"
+
+// Certificate chains generated by gen_certs.sh
+#define CERTS_DIR "provider_build/nginx/conf/certs"
+
+#define DEFAULT_ITERATIONS 1000
+#define DEFAULT_WARMUP 50
+
+// Length of the message signed and verified: a TLS 1.3 CertificateVerify input (64 spaces, the context string,
+// a zero byte and a SHA-256 transcript hash)
+#define MESSAGE_LEN 130
+
+enum op {
+    OP_KEYGEN,
+    OP_SIGN,
+    OP_VERIFY,
+    OP_CHAIN_VERIFY,
+    NUM_OPS
+};
+
+static const char *op_names[NUM_OPS] = {"keygen", "sign", "verify", "chain_verify"};
+
+// Everything the operations of one algorithm work on, set up before any of them are timed
+struct bench {
+    OSSL_LIB_CTX *libctx;
+    const char *sig_alg;
+    EVP_PKEY *pkey;
+    unsigned char message[MESSAGE_LEN];
+    unsigned char *sig;       // signature of message, checked by verify
+    size_t sig_len;
+    size_t sig_max;           // buffer size for the signatures made by sign
+    X509_STORE *store;        // trusting <sig_alg>_RootCA.crt, or NULL if the chain couldn't be loaded
+    X509 *leaf;
+    STACK_OF(X509) *untrusted; // the rest of <sig_alg>_fullchain.crt, as a server sends it
+};
+
+static void usage(const char *prog) {
+    fprintf(stderr, "Usage: %s [-n iterations] [-w warmup] [-c cpu] <sig_alg>[,<sig_alg>...]\n", prog);
+    fprintf(stderr, "  Times EVP keygen, sign and verify, and verification of the algorithm's certificate chain\n"
+                    "  (%s/<sig_alg>_fullchain.crt against <sig_alg>_RootCA.crt), and prints one JSON line per\n"
+                    "  algorithm and operation with the ops/sec, latency percentiles and every iteration's latency\n",
+            CERTS_DIR);
+    fprintf(stderr, "  -n  timed iterations of each operation (default: %d)\n", DEFAULT_ITERATIONS);
+    fprintf(stderr, "  -w  untimed warm-up iterations run first (default: %d)\n", DEFAULT_WARMUP);
+    fprintf(stderr, "  -c  pin the process to this CPU\n");
+}
+
+static int run_keygen(struct bench *b) {
+    EVP_PKEY *pkey = EVP_PKEY_Q_keygen(b->libctx, NULL, b->sig_alg);
+    EVP_PKEY_free(pkey);
+    return pkey ? 0 : -1;
+}
+
+// Sign the message with no separate digest, as TLS does for these algorithms
+static int sign_message(struct bench *b, unsigned char *sig, size_t *sig_len) {
+    EVP_MD_CTX *md_ctx = EVP_MD_CTX_new();
+    int ok = md_ctx && EVP_DigestSignInit_ex(md_ctx, NULL, NULL, b->libctx, NULL, b->pkey, NULL) == 1 &&
+             EVP_DigestSign(md_ctx, sig, sig_len, b->message, MESSAGE_LEN) == 1;
+    EVP_MD_CTX_free(md_ctx);
+    return ok ? 0 : -1;
+}
+
+static int run_sign(struct bench *b) {
+    unsigned char *sig = malloc(b->sig_max);
+    size_t sig_len = b->sig_max;
+    int ret = sig ? sign_message(b, sig, &sig_len) : -1;
+    free(sig);
+    return ret;
+}
+
+static int run_verify(struct bench *b) {
+    EVP_MD_CTX *md_ctx = EVP_MD_CTX_new();
+    int ok = md_ctx && EVP_DigestVerifyInit_ex(md_ctx, NULL, NULL, b->libctx, NULL, b->pkey, NULL) == 1 &&
+             EVP_DigestVerify(md_ctx, b->sig, b->sig_len, b->message, MESSAGE_LEN) == 1;
+    EVP_MD_CTX_free(md_ctx);
+    return ok ? 0 : -1;
+}
+
+// Verify the chain as the client does in a handshake: the server's certificates as untrusted, up to the root
+static int run_chain_verify(struct bench *b) {
+    X509_STORE_CTX *store_ctx = X509_STORE_CTX_new_ex(b->libctx, NULL);
+    int ok = store_ctx && X509_STORE_CTX_init(store_ctx, b->store, b->leaf, b->untrusted) == 1 &&
+             X509_verify_cert(store_ctx) == 1;
+    X509_STORE_CTX_free(store_ctx);
+    return ok ? 0 : -1;
+}
+
+static int (*const op_funcs[NUM_OPS])(struct bench *) = {run_keygen, run_sign, run_verify, run_chain_verify};
+
+// Load the algorithm's root CA as the trust store, and its full chain (leaf first) as a server would send it
+static int load_chain(struct bench *b) {
+    char path[256];
+    snprintf(path, sizeof(path), "%s/%s_RootCA.crt", CERTS_DIR, b->sig_alg);
+    b->store = X509_STORE_new();
+    if (!b->store || !X509_STORE_load_file_ex(b->store, path, b->libctx, NULL)) {
+        fprintf(stderr, "Failed to load CA file: %s\n", path);
+        return -1;
+    }
+
+    snprintf(path, sizeof(path), "%s/%s_fullchain.crt", CERTS_DIR, b->sig_alg);
+    BIO *bio = BIO_new_file(path, "r");
+    STACK_OF(X509_INFO) *infos = bio ? PEM_X509_INFO_read_bio_ex(bio, NULL, NULL, NULL, b->libctx, NULL) : NULL;
+    BIO_free(bio);
+    if (!infos) {
+        fprintf(stderr, "Failed to load certificate chain: %s\n", path);
+        return -1;
+    }
+
+    b->untrusted = sk_X509_new_null();
+    for (int i = 0; i < sk_X509_INFO_num(infos); i++) {
+        X509 *cert = sk_X509_INFO_value(infos, i)->x509;
+        if (!cert)
+            continue;
+        X509_up_ref(cert);
+        if (!b->leaf)
+            b->leaf = cert;
+        else
+            sk_X509_push(b->untrusted, cert);
+    }
+    sk_X509_INFO_pop_free(infos, X509_INFO_free);
+    if (!b->leaf) {
+        fprintf(stderr, "No certificates in %s\n", path);
+        return -1;
+    }
+    return 0;
+}
+
+// Generate the key pair and reference signature used by sign / verify, and load the certificate chain.
+// A missing chain only leaves chain verification out
+static int setup_bench(struct bench *b) {
+    b->pkey = EVP_PKEY_Q_keygen(b->libctx, NULL, b->sig_alg);
+    if (!b->pkey) {
+        fprintf(stderr, "Failed to generate a %s key\n", b->sig_alg);
+        return -1;
+    }
+    memset(b->message, ' ', sizeof(b->message));
+
+    b->sig_max = EVP_PKEY_get_size(b->pkey);
+    b->sig = malloc(b->sig_max);
+    b->sig_len = b->sig_max;
+    if (!b->sig || sign_message(b, b->sig, &b->sig_len) != 0) {
+        fprintf(stderr, "Failed to sign with %s\n", b->sig_alg);
+        return -1;
+    }
+
+    if (load_chain(b) != 0) {
+        fprintf(stderr, "Skipping %s certificate chain verification\n", b->sig_alg);
+        X509_STORE_free(b->store);
+        b->store = NULL;
+    }
+    ERR_clear_error();
+    return 0;
+}
+
+static void free_bench(struct bench *b) {
+    EVP_PKEY_free(b->pkey);
+    free(b->sig);
+    X509_STORE_free(b->store);
+    X509_free(b->leaf);
+    sk_X509_pop_free(b->untrusted, X509_free);
+}
+
+static int compare_doubles(const void *a, const void *b) {
+    double x = *(const double *)a, y = *(const double *)b;
+    return (x > y) - (x < y);
+}
+
+// Quantile of already sorted values, linearly interpolated (as the Python scripts compute them)
+static double quantile(const double *sorted, int n, double q) {
+    double pos = (n - 1) * q;
+    int lo = (int)pos;
+    int hi = lo + 1 < n ? lo + 1 : n - 1;
+    return sorted[lo] + (sorted[hi] - sorted[lo]) * (pos - lo);
+}
+
+// Run the warm-up and then the timed iterations of one operation, and print its JSON line
+static int bench_op(struct bench *b, enum op op, int iterations, int warmup, FILE *out) {
+    double *latencies = malloc(2 * iterations * sizeof(double));
+    if (!latencies)
+        return -1;
+    double *sorted = latencies + iterations;
+    int ret = -1;
+
+    for (int i = 0; i < warmup; i++) {
+        if (op_funcs[op](b) != 0)
+            goto done;
+    }
+
+    double start = get_time();
+    for (int i = 0; i < iterations; i++) {
+        double op_start = get_time();
+        if (op_funcs[op](b) != 0)
+            goto done;
+        latencies[i] = (get_time() - op_start) * 1000.0;
+    }
+    double elapsed = get_time() - start;
+
+    memcpy(sorted, latencies, iterations * sizeof(double));
+    qsort(sorted, iterations, sizeof(double), compare_doubles);
+    fprintf(out, "{\"sig_alg\": \"%s\", \"op\": \"%s\", \"iterations\": %d, \"warmup\": %d, "
+                 "\"ops_per_sec\": %.3f, \"median_ms\": %.6f, \"p90_ms\": %.6f, \"p99_ms\": %.6f, \"latencies_ms\": [",
+            b->sig_alg, op_names[op], iterations, warmup, iterations / elapsed, quantile(sorted, iterations, 0.5),
+            quantile(sorted, iterations, 0.9), quantile(sorted, iterations, 0.99));
+    for (int i = 0; i < iterations; i++)
+        fprintf(out, "%s%.6f", i > 0 ? ", " : "", latencies[i]);
+    fprintf(out, "]}\n");
+    fflush(out);
+    ret = 0;
+
+done:
+    if (ret != 0) {
+        fprintf(stderr, "%s %s failed\n", b->sig_alg, op_names[op]);
+        ERR_print_errors_fp(stderr);
+    }
+    free(latencies);
+    return ret;
+}
+
+static int pin_cpu(int cpu) {
+    cpu_set_t set;
+    CPU_ZERO(&set);
+    CPU_SET(cpu, &set);
+    if (sched_setaffinity(0, sizeof(set), &set) != 0) {
+        perror("sched_setaffinity");
+        return -1;
+    }
+    return 0;
+}
+
+int main(int argc, char *argv[]) {
+    int iterations = DEFAULT_ITERATIONS;
+    int warmup = DEFAULT_WARMUP;
+    int cpu = -1;
+
+    int opt;
+    while ((opt = getopt(argc, argv, "c:n:w:")) != -1) {
+        switch (opt) {
+        case 'c':
+            cpu = atoi(optarg);
+            break;
+        case 'n':
+            iterations = atoi(optarg);
+            if (iterations <= 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 'w':
+            warmup = atoi(optarg);
+            if (warmup < 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (argc - optind < 1) {
+        usage(argv[0]);
+        return 1;
+    }
+    if (cpu >= 0 && pin_cpu(cpu) != 0)
+        return 1;
+
+    struct providers providers;
+    if (load_providers(&providers) != 0)
+        return 1;
+
+    // Algorithms are benchmarked one after another; a failure in one doesn't stop the rest
+    int status = 0;
+    for (char *sig_alg = strtok(argv[optind], ","); sig_alg; sig_alg = strtok(NULL, ",")) {
+        struct bench b = {0};
+        b.libctx = providers.libctx;
+        b.sig_alg = sig_alg;
+
+        if (setup_bench(&b) != 0) {
+            ERR_print_errors_fp(stderr);
+            status = 1;
+        } else {
+            for (int op = 0; op < NUM_OPS; op++) {
+                if (op == OP_CHAIN_VERIFY && !b.store)
+                    continue;
+                if (bench_op(&b, op, iterations, warmup, stdout) != 0)
+                    status = 1;
+            }
+        }
+        free_bench(&b);
+    }
+
+    unload_providers(&providers);
+    return status;
+}
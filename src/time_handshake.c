@@ -1,154 +1,898 @@
-#define _POSIX_C_SOURCE 199309L
+#define _POSIX_C_SOURCE 200809L
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <time.h>
-#include <sys/time.h>
 #include <sys/socket.h>
+#include <sys/time.h>
 #include <netinet/in.h>
 #include <arpa/inet.h>
+#include <linux/tcp.h>
+#include <sys/epoll.h>
+#include <poll.h>
+#include <errno.h>
 #include <unistd.h>
 
 #include <openssl/provider.h>
 #include <openssl/ssl.h>
 #include <openssl/err.h>
 #include <openssl/crypto.h>
+#include <openssl/x509_vfy.h>
+
+#include "common.h"
 
+// Defaults, overridable with -a / -p (e.g. to target a different namespace lane)
 #define SERVER_IP "10.0.0.1"
 #define SERVER_PORT 4433
 
+// Worker mode limits
+#define MAX_CTXS 32
+#define MAX_ALG_LEN 64
+#define MAX_CMD_LEN 256
 
-// Get current time in secs
-static double get_time(void) {
-    struct timeval tv;
-    gettimeofday(&tv, NULL);
-    return (double)tv.tv_sec + (double)tv.tv_usec / 1000000;
-}
+// Load mode: handshakes completed in the first LOAD_WARMUP_SECS of each concurrency level aren't counted
+#define LOAD_WARMUP_SECS 1.0
 
-int main(int argc, char *argv[]) {
-    if (argc < 3) {
-        fprintf(stderr, "Usage: %s <sig_alg> <measurements>\n", argv[0]);
-        return 1;
+// Retry policy defaults, overridable with -t / -T / -m: attempts per handshake before giving up on that
+// measurement, per-attempt socket timeout in secs (0 = the kernel's own) and consecutive failed attempts
+// before the batch is aborted (e.g. the server has died)
+#define DEFAULT_TRIES 3
+#define DEFAULT_TIMEOUT_SECS 0
+#define DEFAULT_MAX_FAILURES 10
+
+#define MAX_ERROR_LEN 160
+
+// TLS certificate compression (RFC 8879) needs OpenSSL 3.2+ built with at least one of zlib, brotli or zstd
+#if OPENSSL_VERSION_NUMBER >= 0x30200000L && !defined(OPENSSL_NO_COMP_ALG)
+#define HAVE_CERT_COMPRESSION 1
+#endif
+
+// Resumption: how long to wait for the server's NewSessionTicket after a handshake (not timed)
+#define SESSION_TICKET_TIMEOUT_MS 1000
+#define SESSION_TICKET_TRIES 4
+
+// Server being benchmarked against
+struct target {
+    struct in_addr addr;
+    int port;
+};
+
+// SSL_CTX (and latest session) per signature algorithm. The algorithm name is also sent as the SNI
+// server name, which nginx uses to pick that algorithm's certificate chain
+struct ctx_entry {
+    char sig_alg[MAX_ALG_LEN];
+    SSL_CTX *ctx;
+    SSL_SESSION *session; // latest resumable session from the server, kept between batches
+};
+
+// Output options
+struct client_opts {
+    int records;       // records also hold the per-phase timings and TCP_INFO, not just the handshake time
+    double resumption; // fraction of handshakes that resume an earlier session (0 = every handshake is full)
+    const char *groups; // key exchange groups offered, e.g. "mlkem768" (NULL = OpenSSL's default list)
+    int tries;          // attempts per handshake
+    double timeout;     // per-attempt socket send / receive timeout in secs (0 = none)
+    int max_failures;   // consecutive failed attempts before the batch is aborted
+    int compress;       // accept compressed certificates (RFC 8879) from the server
+};
+
+// Why a handshake attempt failed
+struct attempt_error {
+    const char *stage;             // "socket", "connect", "setup" or "handshake"
+    unsigned long code;            // errno for socket / connect failures and timeouts, else the OpenSSL error code
+    char message[MAX_ERROR_LEN];
+};
+
+// One in-flight connection in load mode
+struct load_conn {
+    int fd;
+    SSL *ssl;
+    double start;   // when connect() was called
+    int connecting; // TCP connect still in progress
+};
+
+// TLS messages timestamped in record mode, relative to the start of SSL_connect
+enum phase {
+    PHASE_CLIENT_HELLO,     // ClientHello sent
+    PHASE_SERVER_HELLO,     // ServerHello received
+    PHASE_CERTIFICATE,      // Certificate (the full chain) received
+    PHASE_CERT_VERIFY,      // CertificateVerify received
+    PHASE_SERVER_FINISHED,  // server Finished received, i.e. CertificateVerify has been processed
+    PHASE_CLIENT_FINISHED,  // client Finished sent
+    NUM_PHASES
+};
+
+static const char *phase_names[NUM_PHASES] = {
+    "client_hello", "server_hello", "certificate", "certificate_verify", "server_finished", "client_finished"
+};
+
+// Per-handshake timing and byte counts, attached to the SSL object as app data
+struct handshake_timing {
+    double start;
+    double phases[NUM_PHASES]; // ms since start, or -1 if the message wasn't seen
+    double chain_verify_ms;    // time spent verifying the server's certificate chain, or -1
+    long server_bytes;         // bytes of TLS records received from the server (headers included)
+    long certificate_bytes;    // size of the (possibly compressed) Certificate message, or -1
+    int certificate_compressed; // whether the Certificate message was a CompressedCertificate
+};
+
+// Message callback: timestamp the first occurrence of each handshake message of interest
+static void msg_callback(int write_p, int version, int content_type, const void *buf, size_t len,
+                         SSL *ssl, void *arg) {
+    (void)version;
+    (void)ssl;
+    struct handshake_timing *timing = arg;
+
+    // Every record the server sends is reported by its 5 byte header, which holds the record's length
+    if (content_type == SSL3_RT_HEADER && !write_p && len >= SSL3_RT_HEADER_LENGTH) {
+        const unsigned char *header = buf;
+        timing->server_bytes += SSL3_RT_HEADER_LENGTH + ((header[3] << 8) | header[4]);
+        return;
     }
-    
-    const char *sig_alg = argv[1];
-    int measurements = atoi(argv[2]);
-    if (measurements <= 0)
-        measurements = 1;
+    if (content_type != SSL3_RT_HANDSHAKE || len == 0)
+        return;
 
-    // Dynamically build CA file path based on the sig algorithm.
-    char ca_file[256];
-    snprintf(ca_file, sizeof(ca_file), "provider_build/nginx/conf/certs/%s_RootCA.crt", sig_alg);
+    int phase;
+    switch (((const unsigned char *)buf)[0]) {
+    case SSL3_MT_CLIENT_HELLO:
+        phase = write_p ? PHASE_CLIENT_HELLO : -1;
+        break;
+    case SSL3_MT_SERVER_HELLO:
+        phase = write_p ? -1 : PHASE_SERVER_HELLO;
+        break;
+    case SSL3_MT_CERTIFICATE:
+#ifdef SSL3_MT_COMPRESSED_CERTIFICATE
+    case SSL3_MT_COMPRESSED_CERTIFICATE:
+#endif
+        phase = write_p ? -1 : PHASE_CERTIFICATE;
+        if (!write_p) {
+            timing->certificate_bytes = (long)len;
+#ifdef SSL3_MT_COMPRESSED_CERTIFICATE
+            timing->certificate_compressed = ((const unsigned char *)buf)[0] == SSL3_MT_COMPRESSED_CERTIFICATE;
+#endif
+        }
+        break;
+    case SSL3_MT_CERTIFICATE_VERIFY:
+        phase = write_p ? -1 : PHASE_CERT_VERIFY;
+        break;
+    case SSL3_MT_FINISHED:
+        phase = write_p ? PHASE_CLIENT_FINISHED : PHASE_SERVER_FINISHED;
+        break;
+    default:
+        phase = -1;
+    }
 
-    // Initialisations
-    SSL_library_init();
-    SSL_load_error_strings();
-    OpenSSL_add_ssl_algorithms();
+    if (phase >= 0 && timing->phases[phase] < 0)
+        timing->phases[phase] = (get_time() - timing->start) * 1000.0;
+}
 
-    OSSL_LIB_CTX *libctx = OSSL_LIB_CTX_new();
-    if (!libctx) {
-        fprintf(stderr, "Failed to create OpenSSL libctx\n");
-        return 1;
+// Certificate verification callback: the default chain verification, timed in record mode
+static int timed_cert_verify(X509_STORE_CTX *store_ctx, void *arg) {
+    (void)arg;
+    SSL *ssl = X509_STORE_CTX_get_ex_data(store_ctx, SSL_get_ex_data_X509_STORE_CTX_idx());
+    struct handshake_timing *timing = ssl ? SSL_get_app_data(ssl) : NULL;
+
+    double start = get_time();
+    int ok = X509_verify_cert(store_ctx);
+    if (timing)
+        timing->chain_verify_ms = (get_time() - start) * 1000.0;
+    return ok;
+}
+
+// Write one successful handshake's record as a single line of JSON: the handshake time and the bytes the
+// server sent, and in record mode (detailed) the per-phase timings too.
+// tcp_info is the client socket's TCP_INFO straight after the handshake, or NULL if it couldn't be read
+static void print_record(FILE *out, int index, int attempt, double connect_ms, double handshake_ms, int resumed,
+                         const struct handshake_timing *timing, int detailed, const struct tcp_info *tcp_info) {
+    fprintf(out, "{\"index\": %d, \"attempt\": %d, \"status\": \"ok\", \"handshake_ms\": %.6f, "
+                 "\"server_bytes\": %ld",
+            index, attempt, handshake_ms, timing->server_bytes);
+    if (timing->certificate_bytes < 0)
+        fprintf(out, ", \"certificate_bytes\": null, \"certificate_compressed\": null");
+    else
+        fprintf(out, ", \"certificate_bytes\": %ld, \"certificate_compressed\": %d", timing->certificate_bytes,
+                timing->certificate_compressed);
+    if (!detailed) {
+        fprintf(out, "}\n");
+        fflush(out);
+        return;
+    }
+    fprintf(out, ", \"connect_ms\": %.6f, \"resumed\": %d", connect_ms, resumed);
+    for (int p = 0; p < NUM_PHASES; p++) {
+        if (timing->phases[p] < 0)
+            fprintf(out, ", \"%s_ms\": null", phase_names[p]);
+        else
+            fprintf(out, ", \"%s_ms\": %.6f", phase_names[p], timing->phases[p]);
     }
+    if (timing->chain_verify_ms < 0)
+        fprintf(out, ", \"chain_verify_ms\": null");
+    else
+        fprintf(out, ", \"chain_verify_ms\": %.6f", timing->chain_verify_ms);
+    if (tcp_info) {
+        fprintf(out, ", \"segs_in\": %u, \"segs_out\": %u, \"total_retrans\": %u, \"rtt_us\": %u, "
+                     "\"snd_cwnd\": %u, \"bytes_received\": %llu",
+                tcp_info->tcpi_segs_in, tcp_info->tcpi_segs_out, tcp_info->tcpi_total_retrans,
+                tcp_info->tcpi_rtt, tcp_info->tcpi_snd_cwnd, (unsigned long long)tcp_info->tcpi_bytes_received);
+    }
+    fprintf(out, "}\n");
+    fflush(out);
+}
 
-    // Load providers: default and oqsprovider
-    OSSL_PROVIDER *defaultprov = OSSL_PROVIDER_load(libctx, "default");
-    if (!defaultprov) {
-        fprintf(stderr, "Failed to load default provider\n");
-        ERR_print_errors_fp(stderr);
-        OSSL_LIB_CTX_free(libctx);
-        return 1;
+// Write one failed handshake attempt's record as a single line of JSON
+static void print_failure(FILE *out, int index, int attempt, const struct attempt_error *error) {
+    fprintf(out, "{\"index\": %d, \"attempt\": %d, \"status\": \"error\", \"stage\": \"%s\", "
+                 "\"error_code\": %lu, \"error\": \"",
+            index, attempt, error->stage, error->code);
+    // Escape the message for JSON (OpenSSL error strings are plain ASCII, but may hold quotes)
+    for (const char *c = error->message; *c; c++) {
+        if (*c == '"' || *c == '\\')
+            fputc('\\', out);
+        if ((unsigned char)*c >= 0x20)
+            fputc(*c, out);
     }
-    OSSL_PROVIDER *oqsprov = OSSL_PROVIDER_load(libctx, "oqsprovider");
-    if (!oqsprov) {
-        fprintf(stderr, "Failed to load OQS provider\n");
-        ERR_print_errors_fp(stderr);
-        OSSL_PROVIDER_unload(defaultprov);
-        OSSL_LIB_CTX_free(libctx);
-        return 1;
+    fprintf(out, "\"}\n");
+    fflush(out);
+}
+
+// Fill in an attempt error from errno, reporting socket timeouts (EAGAIN, or EINPROGRESS from a timed out
+// connect) as ETIMEDOUT
+static void set_errno_error(struct attempt_error *error, const char *stage, int err) {
+    if (err == EAGAIN || err == EWOULDBLOCK || err == EINPROGRESS)
+        err = ETIMEDOUT;
+    error->stage = stage;
+    error->code = err;
+    snprintf(error->message, MAX_ERROR_LEN, "%s", strerror(err));
+}
+
+// Fill in an attempt error from a failed OpenSSL call, clearing the error queue for the next attempt.
+// A failure with nothing on the queue (e.g. the connection was reset or timed out) is reported by errno
+static void set_ssl_error(struct attempt_error *error, const char *stage, int ssl_error, int err) {
+    unsigned long code = ERR_peek_last_error();
+    if (code) {
+        error->stage = stage;
+        error->code = code;
+        ERR_error_string_n(code, error->message, MAX_ERROR_LEN);
+    } else if (ssl_error == SSL_ERROR_WANT_READ || ssl_error == SSL_ERROR_WANT_WRITE) {
+        set_errno_error(error, stage, ETIMEDOUT);
+    } else {
+        set_errno_error(error, stage, err ? err : ECONNRESET);
     }
+    ERR_clear_error();
+}
+
+static void usage(const char *prog) {
+    fprintf(stderr, "Usage: %s [-r] [-z] [-s ratio] [-g groups] [-t tries] [-T timeout] [-m max_failures] "
+                    "[-a server_ip] [-p server_port] <sig_alg> <measurements>\n", prog);
+    fprintf(stderr, "       %s -w [-r] [-z] [-s ratio] [-g groups] [-t tries] [-T timeout] [-m max_failures] "
+                    "[-a server_ip] [-p server_port]\n", prog);
+    fprintf(stderr, "       %s -l <seconds> [-z] [-g groups] [-a server_ip] [-p server_port] "
+                    "<sig_alg> <concurrency>[,<concurrency>...]\n", prog);
+    fprintf(stderr, "  One JSON record is printed per handshake attempt as it finishes: its handshake time and the bytes the\n"
+                    "  server sent (TLS records, and the Certificate message alone, and whether that was compressed), or\n"
+                    "  (with status \"error\") the stage it failed at and the error code / message\n");
+    fprintf(stderr, "  -r  record mode: successful handshakes' records also hold TCP connect and per-message timings,\n"
+                    "      and the client socket's TCP_INFO (segments, retransmits, RTT, cwnd, bytes received)\n");
+    fprintf(stderr, "  -z  accept compressed certificates (RFC 8879), needs OpenSSL 3.2+ built with zlib, brotli or zstd\n");
+    fprintf(stderr, "  -s  resumption ratio (0-1): resume the latest session for that fraction of handshakes\n"
+                    "      (records say whether each handshake was resumed)\n");
+    fprintf(stderr, "  -g  key exchange groups to offer, e.g. mlkem768 or X25519MLKEM768 (default: OpenSSL's list)\n");
+    fprintf(stderr, "  -t  attempts per handshake before that measurement is skipped (default: %d)\n", DEFAULT_TRIES);
+    fprintf(stderr, "  -T  socket timeout per attempt in seconds, 0 for none (default: %d)\n", DEFAULT_TIMEOUT_SECS);
+    fprintf(stderr, "  -m  failed attempts in a row before giving up with a nonzero exit status (default: %d)\n",
+            DEFAULT_MAX_FAILURES);
+    fprintf(stderr, "  -w  worker mode: read 'run <sig_alg> <measurements> [<groups>]' / 'quit' commands from stdin\n");
+    fprintf(stderr, "  -l  load mode: for each concurrency level in turn, keep that many handshakes in flight for the given\n"
+                    "      number of seconds and print one JSON line with the handshakes/sec and every handshake's latency\n");
+}
+
+// Create an SSL context for TLS client operations, trusting the root CA of the given sig algorithm
+static SSL_CTX *create_client_ctx(OSSL_LIB_CTX *libctx, const char *sig_alg, int compress) {
+    // Dynamically build CA file path based on the sig algorithm.
+    char ca_file[256];
+    snprintf(ca_file, sizeof(ca_file), "provider_build/nginx/conf/certs/%s_RootCA.crt", sig_alg);
 
-    // Create SSL context for TLS client operations
     SSL_CTX *ctx = SSL_CTX_new_ex(libctx, NULL, TLS_client_method());
     if (!ctx) {
         fprintf(stderr, "Failed to create SSL_CTX\n");
         ERR_print_errors_fp(stderr);
-        goto cleanup;
+        return NULL;
     }
     // Load CA certificate to verify server certificate
     if (!SSL_CTX_load_verify_locations(ctx, ca_file, NULL)) {
         fprintf(stderr, "Failed to load CA file: %s\n", ca_file);
         ERR_print_errors_fp(stderr);
-        goto cleanup;
+        SSL_CTX_free(ctx);
+        return NULL;
+    }
+    SSL_CTX_set_cert_verify_callback(ctx, timed_cert_verify, NULL);
+#ifdef HAVE_CERT_COMPRESSION
+    // Compressed certificates are only accepted when asked for, so the default matches builds without them
+    if (!compress)
+        SSL_CTX_set_options(ctx, SSL_OP_NO_RX_CERTIFICATE_COMPRESSION);
+#else
+    (void)compress;
+#endif
+    return ctx;
+}
+
+// Wait (untimed) for the NewSessionTicket the server sends after a handshake, and return the resulting
+// resumable session (with a reference taken), or NULL if none arrived.
+// In TLS 1.3 tickets are post-handshake messages, so they are only processed when the client reads
+static SSL_SESSION *wait_for_session(SSL *ssl, int sock, const SSL_SESSION *previous) {
+    // Return from SSL_read once a non-application record (the ticket) has been processed, rather than
+    // blocking for application data that will never come
+    SSL_clear_mode(ssl, SSL_MODE_AUTO_RETRY);
+
+    for (int tries = 0; tries < SESSION_TICKET_TRIES; tries++) {
+        // A new ticket replaces the connection's session object (a resumed connection starts with the old one)
+        SSL_SESSION *session = SSL_get_session(ssl);
+        if (session && session != previous && SSL_SESSION_is_resumable(session)) {
+            SSL_SESSION_up_ref(session);
+            return session;
+        }
+
+        struct pollfd pfd = {.fd = sock, .events = POLLIN};
+        if (poll(&pfd, 1, SESSION_TICKET_TIMEOUT_MS) <= 0)
+            break;
+        char buf[1];
+        int ret = SSL_read(ssl, buf, sizeof(buf));
+        if (ret <= 0 && SSL_get_error(ssl, ret) != SSL_ERROR_WANT_READ)
+            break;
+    }
+    return NULL;
+}
+
+// Make one handshake attempt, printing its record (in record mode with the per-phase timings and TCP_INFO)
+// if it succeeds. resume is the session to resume, or NULL for a full handshake.
+// Returns 1 if the handshake was resumed, 0 if it was a full handshake, or -1 (with error filled in) if it failed
+static int attempt_handshake(struct ctx_entry *entry, const struct target *target, const struct client_opts *opts,
+                             SSL_SESSION *resume, int index, int attempt, FILE *out, struct attempt_error *error) {
+    // Create a new TCP socket
+    int sock = socket(AF_INET, SOCK_STREAM, 0);
+    if (sock < 0) {
+        set_errno_error(error, "socket", errno);
+        return -1;
+    }
+
+    // Bound every blocking connect / read / write, so a handshake stalled by loss fails rather than hangs
+    if (opts->timeout > 0) {
+        struct timeval tv = {.tv_sec = (time_t)opts->timeout,
+                             .tv_usec = (suseconds_t)((opts->timeout - (time_t)opts->timeout) * 1000000)};
+        setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+        setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+    }
+
+    // Set up server address
+    struct sockaddr_in addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons(target->port);
+    addr.sin_addr = target->addr;
+
+    // Connect to server
+    double connect_start = get_time();
+    if (connect(sock, (struct sockaddr*)&addr, sizeof(addr)) != 0) {
+        set_errno_error(error, "connect", errno);
+        close(sock);
+        return -1;
     }
+    double connect_ms = (get_time() - connect_start) * 1000.0;
+
+    // Create new SSL obj
+    SSL *ssl = SSL_new(entry->ctx);
+    if (!ssl) {
+        set_ssl_error(error, "setup", SSL_ERROR_SSL, 0);
+        close(sock);
+        return -1;
+    }
+    SSL_set_fd(ssl, sock);
+    SSL_set_tlsext_host_name(ssl, entry->sig_alg);
+    if (opts->groups && !SSL_set1_groups_list(ssl, opts->groups)) {
+        set_ssl_error(error, "setup", SSL_ERROR_SSL, 0);
+        SSL_free(ssl);
+        close(sock);
+        return -1;
+    }
+    if (resume)
+        SSL_set_session(ssl, resume);
+
+    struct handshake_timing timing;
+    for (int p = 0; p < NUM_PHASES; p++)
+        timing.phases[p] = -1;
+    timing.chain_verify_ms = -1;
+    timing.server_bytes = 0;
+    timing.certificate_bytes = -1;
+    timing.certificate_compressed = 0;
+    SSL_set_app_data(ssl, &timing);
+    SSL_set_msg_callback(ssl, msg_callback);
+    SSL_set_msg_callback_arg(ssl, &timing);
+
+    // Measure the time taken for SSL_connect (the  TLS handshake)
+    double start = get_time();
+    timing.start = start;
+    errno = 0;
+    int ret = SSL_connect(ssl);
+    double end = get_time();
+
+    if (ret != 1) {
+        set_ssl_error(error, "handshake", SSL_get_error(ssl, ret), errno);
+        SSL_free(ssl);
+        close(sock);
+        return -1;
+    }
+
+    int resumed = SSL_session_reused(ssl);
+
+    // Output the handshake time in ms
+    double handshake_time_ms = (end - start) * 1000.0;
+    if (opts->records) {
+        // Segment / retransmission counts and RTT as seen by the client socket
+        struct tcp_info tcp_info;
+        socklen_t tcp_info_len = sizeof(tcp_info);
+        int have_tcp_info = getsockopt(sock, IPPROTO_TCP, TCP_INFO, &tcp_info, &tcp_info_len) == 0;
+        if (!have_tcp_info)
+            perror("getsockopt(TCP_INFO)");
+        print_record(out, index, attempt, connect_ms, handshake_time_ms, resumed, &timing, 1,
+                     have_tcp_info ? &tcp_info : NULL);
+    } else {
+        print_record(out, index, attempt, connect_ms, handshake_time_ms, resumed, &timing, 0, NULL);
+    }
+
+    // Keep the newest ticket for the next resumed handshake
+    if (opts->resumption > 0) {
+        SSL_SESSION *latest = wait_for_session(ssl, sock, entry->session);
+        if (latest) {
+            SSL_SESSION_free(entry->session);
+            entry->session = latest;
+        }
+    }
+
+    // Cleanup
+    SSL_shutdown(ssl);
+    SSL_free(ssl);
+    close(sock);
+    return resumed;
+}
+
+// Time the given number of handshakes, streaming one JSON record per attempt to out as it finishes: the
+// timings of each successful handshake (with the per-phase timings in record mode), or why an attempt failed.
+// A failed attempt is retried up to opts->tries times in all before that measurement is given up on.
+// With a resumption ratio, that fraction of handshakes resume entry->session (the latest session ticket from
+// the server, refreshed after every handshake) instead of doing a full handshake.
+// Returns 0 on success, or -1 if opts->max_failures attempts in a row failed (the batch is abandoned)
+static int time_handshakes(struct ctx_entry *entry, const struct target *target, const struct client_opts *opts,
+                           int measurements, FILE *out) {
+    int resumed_count = 0;
+    int consecutive_failures = 0;
 
     // Loop for the specified number of handshake measurements
     for (int i = 0; i < measurements; i++) {
-        // Create a new TCP socket
-        int sock = socket(AF_INET, SOCK_STREAM, 0);
-        if (sock < 0) {
-            perror("socket");
-            goto cleanup;
+        for (int attempt = 1; attempt <= opts->tries; attempt++) {
+            // Resume just often enough to keep the running share of resumed handshakes at the ratio
+            SSL_SESSION *resume = NULL;
+            if (entry->session && resumed_count < opts->resumption * (i + 1))
+                resume = entry->session;
+
+            struct attempt_error error;
+            int resumed = attempt_handshake(entry, target, opts, resume, i, attempt, out, &error);
+            if (resumed >= 0) {
+                resumed_count += resumed;
+                consecutive_failures = 0;
+                break;
+            }
+
+            print_failure(out, i, attempt, &error);
+            if (++consecutive_failures >= opts->max_failures) {
+                fprintf(stderr, "Giving up after %d failed handshakes in a row (last: %s: %s)\n",
+                        consecutive_failures, error.stage, error.message);
+                return -1;
+            }
         }
+    }
+    return 0;
+}
 
-        // Set up server address
-        struct sockaddr_in addr;
-        memset(&addr, 0, sizeof(addr));
-        addr.sin_family = AF_INET;
-        addr.sin_port = htons(SERVER_PORT);
-        addr.sin_addr.s_addr = inet_addr(SERVER_IP);
-
-        // Connect to server
-        if (connect(sock, (struct sockaddr*)&addr, sizeof(addr)) != 0) {
-            perror("connect");
-            close(sock);
-            goto cleanup;
+// Load mode: open a non-blocking connection to the server and register it with epoll.
+// Returns 0 on success, or -1 if the connection couldn't be started
+static int start_load_conn(const struct ctx_entry *entry, const struct target *target, int epfd,
+                           struct load_conn *conn) {
+    conn->fd = socket(AF_INET, SOCK_STREAM | SOCK_NONBLOCK, 0);
+    if (conn->fd < 0) {
+        perror("socket");
+        return -1;
+    }
+
+    // NOTE: connections are reset rather than closed, otherwise at thousands of handshakes/sec the
+    // client runs out of ephemeral ports to TIME_WAIT sockets
+    struct linger linger = {1, 0};
+    setsockopt(conn->fd, SOL_SOCKET, SO_LINGER, &linger, sizeof(linger));
+
+    struct sockaddr_in addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons(target->port);
+    addr.sin_addr = target->addr;
+
+    conn->start = get_time();
+    conn->connecting = 1;
+    conn->ssl = NULL;
+    if (connect(conn->fd, (struct sockaddr*)&addr, sizeof(addr)) != 0 && errno != EINPROGRESS) {
+        perror("connect");
+        close(conn->fd);
+        conn->fd = -1;
+        return -1;
+    }
+
+    conn->ssl = SSL_new(entry->ctx);
+    if (!conn->ssl) {
+        ERR_print_errors_fp(stderr);
+        close(conn->fd);
+        conn->fd = -1;
+        return -1;
+    }
+    SSL_set_fd(conn->ssl, conn->fd);
+    SSL_set_tlsext_host_name(conn->ssl, entry->sig_alg);
+    SSL_set_connect_state(conn->ssl);
+
+    struct epoll_event event = {.events = EPOLLOUT, .data.ptr = conn};
+    if (epoll_ctl(epfd, EPOLL_CTL_ADD, conn->fd, &event) != 0) {
+        perror("epoll_ctl");
+        SSL_free(conn->ssl);
+        close(conn->fd);
+        conn->fd = -1;
+        return -1;
+    }
+    return 0;
+}
+
+static void end_load_conn(struct load_conn *conn) {
+    SSL_free(conn->ssl);
+    close(conn->fd); // also removes it from the epoll set
+    conn->fd = -1;
+}
+
+// Load mode: advance a connection's handshake after an epoll event.
+// Returns 1 if the handshake completed, 0 if it is still in progress, or -1 if it failed
+static int drive_load_conn(int epfd, struct load_conn *conn) {
+    if (conn->connecting) {
+        int err = 0;
+        socklen_t err_len = sizeof(err);
+        if (getsockopt(conn->fd, SOL_SOCKET, SO_ERROR, &err, &err_len) != 0 || err != 0)
+            return -1;
+        conn->connecting = 0;
+    }
+
+    int ret = SSL_do_handshake(conn->ssl);
+    if (ret == 1)
+        return 1;
+
+    struct epoll_event event = {.data.ptr = conn};
+    switch (SSL_get_error(conn->ssl, ret)) {
+    case SSL_ERROR_WANT_READ:
+        event.events = EPOLLIN;
+        break;
+    case SSL_ERROR_WANT_WRITE:
+        event.events = EPOLLOUT;
+        break;
+    default:
+        ERR_print_errors_fp(stderr);
+        return -1;
+    }
+    return epoll_ctl(epfd, EPOLL_CTL_MOD, conn->fd, &event) == 0 ? 0 : -1;
+}
+
+// Load mode: keep `concurrency` handshakes in flight for duration seconds (after a warmup), starting a new
+// connection whenever one finishes. Prints one JSON line with the sustained handshake rate and the latency
+// (TCP connect + TLS handshake, in ms) of every handshake completed after the warmup.
+// Returns 0 on success, or -1 if the load couldn't be generated at all
+static int run_load_level(const struct ctx_entry *entry, const struct target *target, int concurrency,
+                          double duration, FILE *out) {
+    int epfd = epoll_create1(0);
+    if (epfd < 0) {
+        perror("epoll_create1");
+        return -1;
+    }
+
+    struct load_conn *conns = calloc(concurrency, sizeof(*conns));
+    struct epoll_event *events = calloc(concurrency, sizeof(*events));
+    size_t latencies_cap = 1024;
+    size_t completed = 0;
+    double *latencies = malloc(latencies_cap * sizeof(*latencies));
+    long errors = 0;
+    int ret = -1;
+    if (!conns || !events || !latencies)
+        goto done;
+    for (int i = 0; i < concurrency; i++)
+        conns[i].fd = -1;
+
+    for (int i = 0; i < concurrency; i++) {
+        if (start_load_conn(entry, target, epfd, &conns[i]) != 0)
+            goto done;
+    }
+
+    double measure_start = get_time() + LOAD_WARMUP_SECS;
+    double measure_end = measure_start + duration;
+    double now;
+    while ((now = get_time()) < measure_end) {
+        int ready = epoll_wait(epfd, events, concurrency, (int)((measure_end - now) * 1000.0) + 1);
+        if (ready < 0 && errno != EINTR) {
+            perror("epoll_wait");
+            goto done;
         }
 
-        // Create new SSL obj
-        SSL *ssl = SSL_new(ctx);
-        if (!ssl) {
-            fprintf(stderr, "Failed to create SSL object\n");
-            ERR_print_errors_fp(stderr);
-            close(sock);
-            goto cleanup;
+        for (int e = 0; e < ready; e++) {
+            struct load_conn *conn = events[e].data.ptr;
+            int status = drive_load_conn(epfd, conn);
+            if (status == 0)
+                continue;
+
+            double end = get_time();
+            if (end >= measure_start && end < measure_end) {
+                if (status < 0) {
+                    errors++;
+                } else {
+                    if (completed == latencies_cap) {
+                        double *grown = realloc(latencies, 2 * latencies_cap * sizeof(*latencies));
+                        if (!grown)
+                            goto done;
+                        latencies = grown;
+                        latencies_cap *= 2;
+                    }
+                    latencies[completed++] = (end - conn->start) * 1000.0;
+                }
+            }
+
+            // Replace the finished connection to keep the concurrency level constant
+            end_load_conn(conn);
+            if (start_load_conn(entry, target, epfd, conn) != 0)
+                goto done;
+        }
+    }
+
+    fprintf(out, "{\"concurrency\": %d, \"duration_s\": %.3f, \"handshakes\": %zu, \"errors\": %ld, "
+                 "\"handshakes_per_sec\": %.3f, \"latencies_ms\": [",
+            concurrency, duration, completed, errors, completed / duration);
+    for (size_t i = 0; i < completed; i++)
+        fprintf(out, "%s%.6f", i > 0 ? ", " : "", latencies[i]);
+    fprintf(out, "]}\n");
+    fflush(out);
+    ret = 0;
+
+done:
+    if (conns) {
+        for (int i = 0; i < concurrency; i++) {
+            if (conns[i].fd >= 0)
+                end_load_conn(&conns[i]);
+        }
+    }
+    free(conns);
+    free(events);
+    free(latencies);
+    close(epfd);
+    return ret;
+}
+
+// Look up (or create and cache) the SSL context for a sig algorithm
+static struct ctx_entry *get_cached_ctx(struct ctx_entry *cache, int *cached, OSSL_LIB_CTX *libctx,
+                                        const char *sig_alg, int compress) {
+    for (int i = 0; i < *cached; i++) {
+        if (strcmp(cache[i].sig_alg, sig_alg) == 0)
+            return &cache[i];
+    }
+    if (*cached == MAX_CTXS) {
+        fprintf(stderr, "Too many algorithms for worker context cache\n");
+        return NULL;
+    }
+
+    SSL_CTX *ctx = create_client_ctx(libctx, sig_alg, compress);
+    if (!ctx)
+        return NULL;
+    snprintf(cache[*cached].sig_alg, MAX_ALG_LEN, "%s", sig_alg);
+    cache[*cached].ctx = ctx;
+    cache[*cached].session = NULL;
+    return &cache[(*cached)++];
+}
+
+// Worker mode: keep the providers and one SSL_CTX per algorithm loaded, and serve commands from stdin.
+// Each 'run <sig_alg> <measurements> [<groups>]' command streams its records to stdout, one per line as each
+// attempt finishes, followed by a bare 'ok' line (or 'error' if the batch was abandoned).
+static int worker_loop(OSSL_LIB_CTX *libctx, const struct target *target, const struct client_opts *opts) {
+    struct ctx_entry cache[MAX_CTXS];
+    int cached = 0;
+    char line[MAX_CMD_LEN];
+
+    while (fgets(line, sizeof(line), stdin)) {
+        char cmd[16];
+        char sig_alg[MAX_ALG_LEN];
+        char groups[MAX_ALG_LEN];
+        int measurements;
+
+        if (sscanf(line, "%15s", cmd) != 1)
+            continue;
+        if (strcmp(cmd, "quit") == 0)
+            break;
+        int fields = sscanf(line, "%*s %63s %d %63s", sig_alg, &measurements, groups);
+        if (strcmp(cmd, "run") != 0 || fields < 2) {
+            fprintf(stderr, "Unknown command: %s", line);
+            printf("error\n");
+            fflush(stdout);
+            continue;
+        }
+        if (measurements <= 0)
+            measurements = 1;
+
+        struct ctx_entry *entry = get_cached_ctx(cache, &cached, libctx, sig_alg, opts->compress);
+        if (!entry) {
+            printf("error\n");
+            fflush(stdout);
+            continue;
+        }
+
+        // The group list given with the command overrides -g for this batch
+        struct client_opts run_opts = *opts;
+        if (fields == 3)
+            run_opts.groups = groups;
+
+        int ret = time_handshakes(entry, target, &run_opts, measurements, stdout);
+        printf("%s\n", ret == 0 ? "ok" : "error");
+        fflush(stdout);
+    }
+
+    for (int i = 0; i < cached; i++) {
+        SSL_SESSION_free(cache[i].session);
+        SSL_CTX_free(cache[i].ctx);
+    }
+    return 0;
+}
+
+int main(int argc, char *argv[]) {
+    const char *server_ip = SERVER_IP;
+    int server_port = SERVER_PORT;
+    int worker = 0;
+    double load_duration = 0;
+    struct client_opts opts = {0};
+    opts.tries = DEFAULT_TRIES;
+    opts.timeout = DEFAULT_TIMEOUT_SECS;
+    opts.max_failures = DEFAULT_MAX_FAILURES;
+    int status = 1;
+
+    int opt;
+    while ((opt = getopt(argc, argv, "a:g:l:m:p:rs:t:T:wz")) != -1) {
+        switch (opt) {
+        case 'a':
+            server_ip = optarg;
+            break;
+        case 'g':
+            opts.groups = optarg;
+            break;
+        case 'l':
+            load_duration = atof(optarg);
+            if (load_duration <= 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 'm':
+            opts.max_failures = atoi(optarg);
+            if (opts.max_failures <= 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 'p':
+            server_port = atoi(optarg);
+            break;
+        case 'r':
+            opts.records = 1;
+            break;
+        case 's':
+            opts.resumption = atof(optarg);
+            if (opts.resumption < 0 || opts.resumption > 1) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 't':
+            opts.tries = atoi(optarg);
+            if (opts.tries <= 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 'T':
+            opts.timeout = atof(optarg);
+            if (opts.timeout < 0) {
+                usage(argv[0]);
+                return 1;
+            }
+            break;
+        case 'w':
+            worker = 1;
+            break;
+        case 'z':
+#ifdef HAVE_CERT_COMPRESSION
+            opts.compress = 1;
+            break;
+#else
+            fprintf(stderr, "Certificate compression needs OpenSSL 3.2+ built with zlib, brotli or zstd\n");
+            return 1;
+#endif
+        default:
+            usage(argv[0]);
+            return 1;
         }
-        SSL_set_fd(ssl, sock);
+    }
+
+    if (!worker && argc - optind < 2) {
+        usage(argv[0]);
+        return 1;
+    }
 
-        // Measure the time taken for SSL_connect (the  TLS handshake)
-        double start = get_time();
-        int ret = SSL_connect(ssl);
-        double end = get_time();
+    // Validate the server address up front rather than on every connect
+    struct target target;
+    target.port = server_port;
+    if (inet_pton(AF_INET, server_ip, &target.addr) != 1) {
+        fprintf(stderr, "Invalid server address: %s\n", server_ip);
+        return 1;
+    }
 
-        if (ret != 1) {
-            fprintf(stderr, "Handshake failed on measurement %d\n", i);
+    // Initialisations
+    SSL_library_init();
+    SSL_load_error_strings();
+    OpenSSL_add_ssl_algorithms();
+
+    struct providers providers;
+    if (load_providers(&providers) != 0)
+        return 1;
+    OSSL_LIB_CTX *libctx = providers.libctx;
+
+    if (worker) {
+        status = worker_loop(libctx, &target, &opts);
+        goto cleanup;
+    }
+
+    struct ctx_entry entry = {0};
+    snprintf(entry.sig_alg, MAX_ALG_LEN, "%s", argv[optind]);
+    entry.ctx = create_client_ctx(libctx, entry.sig_alg, opts.compress);
+    if (!entry.ctx)
+        goto cleanup;
+
+    if (load_duration > 0) {
+        if (opts.groups && !SSL_CTX_set1_groups_list(entry.ctx, opts.groups)) {
+            fprintf(stderr, "Unsupported key exchange group list: %s\n", opts.groups);
             ERR_print_errors_fp(stderr);
-            SSL_free(ssl);
-            close(sock);
+            SSL_CTX_free(entry.ctx);
             goto cleanup;
         }
 
-        // Output the handshake time in ms
-        // If this is not the first measurement, prepend a comma first to build up a string of 
-        // lots of measuremnets
-        double handshake_time_ms = (end - start) * 1000.0;
-        if (i > 0)
-            printf(",");
-        printf("%.6f", handshake_time_ms);
-
-        // Cleanup
-        SSL_shutdown(ssl);
-        SSL_free(ssl);
-        close(sock);
+        // Concurrency levels are run in the order given, e.g. ramping up with 1,2,4,8
+        status = 0;
+        char *levels = argv[optind + 1];
+        for (char *level = strtok(levels, ","); level; level = strtok(NULL, ",")) {
+            int concurrency = atoi(level);
+            if (concurrency <= 0)
+                continue;
+            if (run_load_level(&entry, &target, concurrency, load_duration, stdout) != 0) {
+                fprintf(stderr, "Load generation failed at concurrency %d\n", concurrency);
+                status = 1;
+                break;
+            }
+        }
+        SSL_CTX_free(entry.ctx);
+        goto cleanup;
     }
-    printf("\n");
+
+    int measurements = atoi(argv[optind + 1]);
+    if (measurements <= 0)
+        measurements = 1;
+
+    // Exit with a nonzero status if the batch was abandoned, so it isn't mistaken for a short but complete one
+    status = time_handshakes(&entry, &target, &opts, measurements, stdout) == 0 ? 0 : 1;
+    SSL_SESSION_free(entry.session);
+    SSL_CTX_free(entry.ctx);
 
 cleanup:
-    if (ctx)
-        SSL_CTX_free(ctx);
-    OSSL_PROVIDER_unload(oqsprov);
-    OSSL_PROVIDER_unload(defaultprov);
-    OSSL_LIB_CTX_free(libctx);
+    unload_providers(&providers);
     EVP_cleanup();
-    return 0;
+    return status;
 }